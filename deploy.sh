@@ -17,6 +17,13 @@ PASSWORD=${4:-$DEFAULT_PASSWORD}
 # パッケージファイルのパス
 PACKAGE_FILE="${PACKAGE_NAME}.pyxapp"
 
+# パッケージの作成用ディレクトリ（ソースのコピーにバイトコードを追加してからパッケージにする）
+BUILD_DIR="build"
+STAGE_DIR="${BUILD_DIR}/$(basename "$PACKAGE_NAME")"
+
+# バイトコードを作成するPython（空白区切りで複数指定可。実機のPythonと同じバージョンのものだけが使われる）
+BYTECODE_PYTHONS=${BYTECODE_PYTHONS:-python3}
+
 # 色付きの出力関数
 print_info() {
     echo -e "\033[1;34m[INFO]\033[0m $1"
@@ -58,7 +65,33 @@ create_package() {
         exit 1
     fi
 
-    pyxel package "$PACKAGE_NAME" "$PYTHON_FILE"
+    # ソースをコピーし、起動を速くするためにコンパイル済みのバイトコードを同梱する
+    # （pyxel packageは__pycache__を含めないため、bytecode/<キャッシュタグ>/に置いてprecompiled.pyで読み込ませる）
+    rm -rf "$STAGE_DIR"
+    mkdir -p "$BUILD_DIR"
+    cp -R "$PACKAGE_NAME" "$STAGE_DIR"
+    find "$STAGE_DIR" -name "__pycache__" -prune -exec rm -rf {} +
+    for python in $BYTECODE_PYTHONS; do
+        if ! "$python" - "$STAGE_DIR" "$(basename "$PYTHON_FILE")" <<'PYTHON'; then
+import os
+import py_compile
+import sys
+
+stage_dir, startup_file = sys.argv[1], sys.argv[2]
+bytecode_dir = os.path.join(stage_dir, "bytecode", sys.implementation.cache_tag)
+os.makedirs(bytecode_dir, exist_ok=True)
+for name in sorted(os.listdir(stage_dir)):
+    # 起動スクリプトとバイトコードを読み込ませるモジュールはソースのまま使う
+    if name.endswith(".py") and name not in (startup_file, "precompiled.py", "__init__.py"):
+        py_compile.compile(os.path.join(stage_dir, name), os.path.join(bytecode_dir, name + "c"), doraise=True, optimize=2)
+print(f"compiled: {bytecode_dir}")
+PYTHON
+            print_error "バイトコードの作成に失敗しました: ${python}"
+            exit 1
+        fi
+    done
+
+    pyxel package "$STAGE_DIR" "${STAGE_DIR}/${PYTHON_FILE#"${PACKAGE_NAME}"/}"
 
     if [ ! -f "$PACKAGE_FILE" ]; then
         print_error "パッケージの作成に失敗しました。"
@@ -0,0 +1,449 @@
+"""
+バックエンドモジュール - 音声・描画・入力の呼び出し先を切り替える
+
+PyxelBackendは実際のPyxelを呼び出し、HeadlessBackendはウィンドウやオーディオデバイスなしで
+フレーム数・入力・再生を同じプロセス内で再現して記録する（ベンチマークやテスト用）
+"""
+
+import pyxel
+
+
+class PyxelBackend:
+    """
+    Pyxelをそのまま呼び出すバックエンド
+    """
+
+    @property
+    def frame_count(self):
+        """現在のフレーム数"""
+        return pyxel.frame_count
+
+    def init(self, width, height, title, fps):
+        """
+        ウィンドウを初期化する
+
+        Args:
+            width: 画面幅
+            height: 画面高さ
+            title: ウィンドウタイトル
+            fps: フレームレート
+        """
+        pyxel.init(width, height, title=title, fps=fps)
+
+    def run(self, update, draw):
+        """
+        メインループを実行する
+
+        Args:
+            update: 毎フレームの更新関数
+            draw: 毎フレームの描画関数
+        """
+        pyxel.run(update, draw)
+
+    def quit(self):
+        """アプリケーションを終了する"""
+        pyxel.quit()
+
+    # 入力
+
+    def btn(self, key):
+        """
+        キー・ボタンが押されているかを返す
+
+        Args:
+            key: キー・ボタンのコード
+
+        Returns:
+            bool: 押されていればTrue
+        """
+        return pyxel.btn(key)
+
+    def btnp(self, key):
+        """
+        キー・ボタンがこのフレームで押されたかを返す
+
+        Args:
+            key: キー・ボタンのコード
+
+        Returns:
+            bool: 押されたフレームならTrue
+        """
+        return pyxel.btnp(key)
+
+    def btnv(self, axis):
+        """
+        アナログ軸の値を返す
+
+        Args:
+            axis: 軸のコード
+
+        Returns:
+            int: 軸の値
+        """
+        return pyxel.btnv(axis)
+
+    # 音声
+
+    def set_sound(self, slot, notes, tones, volumes, effects, speed):
+        """
+        サウンドスロットに音を設定する
+
+        Args:
+            slot: サウンドスロット番号
+            notes: ノート文字列
+            tones: 音色文字列
+            volumes: 音量文字列
+            effects: エフェクト文字列
+            speed: 再生速度
+        """
+        pyxel.sounds[slot].set(notes, tones, volumes, effects, speed)
+
+    def set_music(self, music_idx, seqs):
+        """
+        ミュージックにチャンネルごとのサウンドの並びを設定する
+
+        Args:
+            music_idx: ミュージック番号
+            seqs: チャンネルごとのサウンドスロット番号のリスト
+        """
+        pyxel.musics[music_idx].set(*seqs)
+
+    def play(self, ch, snd, sec=0, loop=False):
+        """
+        チャンネルでサウンドを再生する
+
+        Args:
+            ch: チャンネル番号
+            snd: サウンドスロット番号またはそのリスト
+            sec: 再生開始位置（秒）
+            loop: ループ再生するかどうか
+        """
+        pyxel.play(ch, snd, sec=sec, loop=loop)
+
+    def playm(self, music_idx, sec=0, loop=False):
+        """
+        ミュージックを再生する
+
+        Args:
+            music_idx: ミュージック番号
+            sec: 再生開始位置（秒）
+            loop: ループ再生するかどうか
+        """
+        pyxel.playm(music_idx, sec=sec, loop=loop)
+
+    def stop(self, ch=None):
+        """
+        再生を停止する
+
+        Args:
+            ch: チャンネル番号。Noneの場合は全チャンネル
+        """
+        if ch is None:
+            pyxel.stop()
+        else:
+            pyxel.stop(ch)
+
+    def play_pos(self, ch):
+        """
+        チャンネルの再生位置を返す
+
+        Args:
+            ch: チャンネル番号
+
+        Returns:
+            tuple: (サウンドの並びの中の位置, サウンド先頭からの秒数)。停止中はNone
+        """
+        return pyxel.play_pos(ch)
+
+    def preview_channel(self):
+        """
+        試聴専用のチャンネルを用意する（Pyxelの4チャンネルの後ろに1つ追加し、ミュージックやトラックの音と重ならない）
+
+        Returns:
+            int: チャンネル番号
+        """
+        if len(pyxel.channels) <= pyxel.NUM_CHANNELS:
+            pyxel.channels.append(pyxel.Channel())
+        return pyxel.NUM_CHANNELS
+
+    # 描画
+
+    def image(self, image_idx):
+        """
+        イメージバンクを返す
+
+        Args:
+            image_idx: イメージバンク番号
+
+        Returns:
+            pyxel.Image: イメージバンク
+        """
+        return pyxel.images[image_idx]
+
+    def cls(self, col):
+        """画面を塗りつぶす"""
+        pyxel.cls(col)
+
+    def text(self, x, y, s, col):
+        """文字列を描画する"""
+        pyxel.text(x, y, s, col)
+
+    def rect(self, x, y, w, h, col):
+        """矩形を描画する"""
+        pyxel.rect(x, y, w, h, col)
+
+    def rectb(self, x, y, w, h, col):
+        """矩形の枠を描画する"""
+        pyxel.rectb(x, y, w, h, col)
+
+    def blt(self, x, y, img, u, v, w, h):
+        """イメージバンクから画面に転送する"""
+        pyxel.blt(x, y, img, u, v, w, h)
+
+
+class HeadlessImage:
+    """
+    HeadlessBackend用のイメージバンク（描画命令の回数だけを数える）
+    """
+
+    def __init__(self, backend):
+        """
+        イメージの初期化
+
+        Args:
+            backend: 描画回数を記録するHeadlessBackend
+        """
+        self.backend = backend
+
+    def cls(self, col):
+        self.backend.draw_calls += 1
+
+    def text(self, x, y, s, col):
+        self.backend.draw_calls += 1
+
+    def rect(self, x, y, w, h, col):
+        self.backend.draw_calls += 1
+
+    def rectb(self, x, y, w, h, col):
+        self.backend.draw_calls += 1
+
+    def pget(self, x, y):
+        return 0
+
+
+class HeadlessBackend:
+    """
+    ウィンドウやオーディオデバイスを使わないバックエンド
+    フレーム数は手動で進め、入力はフレームごとに指定した状態を返し、音声の呼び出しはplay_logに記録する
+    ミュージックやサウンドの再生位置は設定済みの音の長さとフレーム数から計算する
+    """
+
+    def __init__(self, fps=30, max_frames=0):
+        """
+        ヘッドレスバックエンドの初期化
+
+        Args:
+            fps: フレームレート（再生位置の計算に使用）
+            max_frames: run()で実行するフレーム数
+        """
+        self.fps = fps
+        self.max_frames = max_frames
+        self.frame_count = 0
+        self.size = None
+        self.quit_requested = False
+        self._update = None
+        self._draw = None
+
+        # 入力：押されているキー・ボタン、前フレームの状態、軸の値、フレーム番号 -> (キー・ボタン, 軸の値)
+        self.held = set()
+        self._prev_held = set()
+        self.axes = {}
+        self.input_script = {}
+
+        # 音声：サウンドスロット -> 設定内容、ミュージック番号 -> チャンネルごとの並び
+        self.sounds = {}
+        self.musics = {}
+        # チャンネル番号 -> (各サウンドの秒数, 開始フレーム, 開始位置の秒数, ループするかどうか)
+        self.channels = {}
+        # (フレーム数, 命令名, 引数...)の記録
+        self.play_log = []
+
+        # 描画命令の回数
+        self.draw_calls = 0
+        self._images = {}
+
+    def init(self, width, height, title, fps):
+        """
+        画面サイズとフレームレートを記録する
+
+        Args:
+            width: 画面幅
+            height: 画面高さ
+            title: ウィンドウタイトル
+            fps: フレームレート
+        """
+        self.size = (width, height)
+        self.fps = fps
+
+    def run(self, update, draw):
+        """
+        更新・描画関数を登録し、max_framesフレーム分だけ実行する
+
+        Args:
+            update: 毎フレームの更新関数
+            draw: 毎フレームの描画関数
+        """
+        self._update = update
+        self._draw = draw
+        self.step(self.max_frames)
+
+    def step(self, frames=1):
+        """
+        登録した更新・描画関数を指定フレーム数だけ実行する（quit()が呼ばれたら止める）
+
+        Args:
+            frames: 実行するフレーム数
+        """
+        for _ in range(frames):
+            if self.quit_requested:
+                break
+            self._update()
+            self._draw()
+            self.advance()
+
+    def advance(self, frames=1):
+        """
+        フレーム数を進め、そのフレームに指定された入力を反映する
+
+        Args:
+            frames: 進めるフレーム数
+        """
+        for _ in range(frames):
+            self._prev_held = set(self.held)
+            self.frame_count += 1
+            self._apply_input_script()
+
+    def quit(self):
+        """終了要求を記録する"""
+        self.quit_requested = True
+
+    # 入力
+
+    def script_input(self, frame, keys=(), axes=None):
+        """
+        指定フレーム以降の入力状態を設定する
+
+        Args:
+            frame: 入力を反映するフレーム数
+            keys: 押されているキー・ボタンのコード
+            axes: 軸のコード -> 値
+        """
+        self.input_script[frame] = (set(keys), dict(axes or {}))
+        if frame == self.frame_count:
+            self._apply_input_script()
+
+    def _apply_input_script(self):
+        """現在のフレームに指定された入力状態を反映する"""
+        script = self.input_script.pop(self.frame_count, None)
+        if script is not None:
+            self.held, self.axes = script
+
+    def btn(self, key):
+        return key in self.held
+
+    def btnp(self, key):
+        return key in self.held and key not in self._prev_held
+
+    def btnv(self, axis):
+        return self.axes.get(axis, 0)
+
+    # 音声
+
+    def set_sound(self, slot, notes, tones, volumes, effects, speed):
+        self.sounds[slot] = (notes, tones, volumes, effects, speed)
+
+    def set_music(self, music_idx, seqs):
+        self.musics[music_idx] = [list(seq) for seq in seqs]
+
+    def play(self, ch, snd, sec=0, loop=False):
+        self.play_log.append((self.frame_count, "play", ch, snd))
+        sounds = snd if isinstance(snd, (list, tuple)) else [snd]
+        self.channels[ch] = ([self.sound_seconds(slot) for slot in sounds], self.frame_count, sec, loop)
+
+    def playm(self, music_idx, sec=0, loop=False):
+        self.play_log.append((self.frame_count, "playm", music_idx, sec, loop))
+        for ch, seq in enumerate(self.musics.get(music_idx, [])):
+            if seq:
+                self.channels[ch] = ([self.sound_seconds(slot) for slot in seq], self.frame_count, sec, loop)
+
+    def stop(self, ch=None):
+        self.play_log.append((self.frame_count, "stop", ch))
+        if ch is None:
+            self.channels.clear()
+        else:
+            self.channels.pop(ch, None)
+
+    def sound_seconds(self, slot):
+        """
+        設定済みのサウンドの長さを返す
+
+        Args:
+            slot: サウンドスロット番号
+
+        Returns:
+            float: 秒数（未設定のスロットは0）
+        """
+        sound = self.sounds.get(slot)
+        if sound is None:
+            return 0.0
+        notes, _, _, _, speed = sound
+        # ノート名（a-g）と休符（r）の数が音の数
+        note_count = sum(c in "abcdefgr" for c in notes.lower())
+        return note_count * speed / 120
+
+    def play_pos(self, ch):
+        channel = self.channels.get(ch)
+        if channel is None:
+            return None
+        durations, start_frame, start_sec, loop = channel
+        total = sum(durations)
+        elapsed = start_sec + (self.frame_count - start_frame) / self.fps
+        if total <= 0:
+            return None
+        if elapsed >= total:
+            if not loop:
+                del self.channels[ch]
+                return None
+            elapsed %= total
+        for sound_index, duration in enumerate(durations):
+            if elapsed < duration:
+                return sound_index, elapsed
+            elapsed -= duration
+        return None
+
+    def preview_channel(self):
+        # Pyxelと同じく4チャンネルの後ろに試聴専用のチャンネルを追加したものとする
+        return 4
+
+    # 描画
+
+    def image(self, image_idx):
+        image = self._images.get(image_idx)
+        if image is None:
+            image = self._images[image_idx] = HeadlessImage(self)
+        return image
+
+    def cls(self, col):
+        self.draw_calls += 1
+
+    def text(self, x, y, s, col):
+        self.draw_calls += 1
+
+    def rect(self, x, y, w, h, col):
+        self.draw_calls += 1
+
+    def rectb(self, x, y, w, h, col):
+        self.draw_calls += 1
+
+    def blt(self, x, y, img, u, v, w, h):
+        self.draw_calls += 1
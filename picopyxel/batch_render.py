@@ -0,0 +1,214 @@
+"""
+一括レンダリングモジュール - プロジェクトのディレクトリをまとめてWAVに書き出すコマンドラインツール
+
+使い方:
+    python picopyxel/batch_render.py <プロジェクトディレクトリ> [-o 出力ディレクトリ] [-j 並列数] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from offline_renderer import OfflineRenderer
+from project_io import PROJECT_EXTENSIONS, load_project
+
+# キャッシュファイル名（出力ディレクトリに作成）
+CACHE_FILENAME = ".render_cache.json"
+
+# レンダラーの出力が変わる変更を入れたら上げる（キャッシュを無効化するため）
+RENDER_VERSION = 1
+
+
+def content_hash(filename):
+    """
+    プロジェクトファイルの内容のハッシュを計算する
+
+    Args:
+        filename: プロジェクトファイル名
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    digest = hashlib.sha256(str(RENDER_VERSION).encode())
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_projects(project_dir):
+    """
+    ディレクトリ内のプロジェクトファイルを列挙する
+
+    Args:
+        project_dir: プロジェクトディレクトリ
+
+    Returns:
+        list: プロジェクトファイルのパス（名前順）
+    """
+    return sorted(
+        os.path.join(project_dir, name)
+        for name in os.listdir(project_dir)
+        if name.endswith(PROJECT_EXTENSIONS) and not name.startswith(".")
+    )
+
+
+def output_path(project_path, output_dir):
+    """
+    プロジェクトに対応するWAVファイルのパスを返す
+
+    Args:
+        project_path: プロジェクトファイルのパス
+        output_dir: 出力ディレクトリ
+
+    Returns:
+        str: WAVファイルのパス
+    """
+    name = os.path.basename(project_path)
+    for extension in PROJECT_EXTENSIONS:
+        if name.endswith(extension):
+            name = name[: -len(extension)]
+            break
+    return os.path.join(output_dir, name + ".wav")
+
+
+def render_project(project_path, wav_path):
+    """
+    1プロジェクトをレンダリングする（ワーカープロセスで実行）
+
+    Args:
+        project_path: プロジェクトファイルのパス
+        wav_path: 出力WAVファイルのパス
+
+    Returns:
+        tuple: (プロジェクトのパス, 内容のハッシュ, 書き出した秒数, エラーメッセージまたはNone)
+    """
+    try:
+        digest = content_hash(project_path)
+        duration = OfflineRenderer(load_project(project_path)).write_wav(wav_path)
+        return project_path, digest, duration, None
+    except Exception as e:  # 1件の失敗で全体を止めない
+        return project_path, None, 0.0, str(e)
+
+
+def load_cache(cache_path):
+    """
+    前回成功したレンダリングのハッシュを読み込む
+
+    Args:
+        cache_path: キャッシュファイルのパス
+
+    Returns:
+        dict: プロジェクト名 -> ハッシュ
+    """
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache_path, cache):
+    """
+    レンダリングに成功したプロジェクトのハッシュを保存する
+
+    Args:
+        cache_path: キャッシュファイルのパス
+        cache: プロジェクト名 -> ハッシュ
+    """
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+
+
+def batch_render(project_dir, output_dir=None, jobs=None, force=False):
+    """
+    ディレクトリ内の全プロジェクトを並列にレンダリングする
+
+    Args:
+        project_dir: プロジェクトディレクトリ
+        output_dir: 出力ディレクトリ。Noneの場合はプロジェクトディレクトリ
+        jobs: ワーカープロセス数。Noneの場合はCPUコア数
+        force: Trueの場合はキャッシュを無視して全件レンダリングする
+
+    Returns:
+        dict: 集計結果（rendered, skipped, failed, audio_seconds, elapsed）
+    """
+    output_dir = output_dir or project_dir
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, CACHE_FILENAME)
+    cache = {} if force else load_cache(cache_path)
+
+    start = time.perf_counter()
+    pending = []
+    skipped = 0
+    for project_path in find_projects(project_dir):
+        wav_path = output_path(project_path, output_dir)
+        name = os.path.basename(project_path)
+        if name in cache and os.path.exists(wav_path) and cache[name] == content_hash(project_path):
+            skipped += 1
+            continue
+        pending.append((project_path, wav_path))
+
+    rendered = 0
+    failed = 0
+    audio_seconds = 0.0
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # 1件ずつ送ると通信が多くなるため、ワーカー数に応じてまとめて渡す
+            chunksize = max(1, len(pending) // ((jobs or os.cpu_count() or 1) * 4))
+            results = executor.map(render_project, *zip(*pending), chunksize=chunksize)
+            for project_path, digest, duration, error in results:
+                name = os.path.basename(project_path)
+                if error is not None:
+                    failed += 1
+                    cache.pop(name, None)
+                    print(f"FAILED {name}: {error}", file=sys.stderr)
+                    continue
+                rendered += 1
+                audio_seconds += duration
+                cache[name] = digest
+        save_cache(cache_path, cache)
+
+    return {
+        "rendered": rendered,
+        "skipped": skipped,
+        "failed": failed,
+        "audio_seconds": audio_seconds,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    """
+    コマンドラインのエントリーポイント
+
+    Args:
+        argv: コマンドライン引数。Noneの場合はsys.argvを使用
+
+    Returns:
+        int: 終了コード（失敗したプロジェクトがあれば1）
+    """
+    parser = argparse.ArgumentParser(description="picopyxelのプロジェクトをまとめてWAVに書き出す")
+    parser.add_argument("project_dir", help="プロジェクトファイルのディレクトリ")
+    parser.add_argument("-o", "--output-dir", help="WAVの出力先（省略時はプロジェクトディレクトリ）")
+    parser.add_argument("-j", "--jobs", type=int, help="ワーカープロセス数（省略時はCPUコア数）")
+    parser.add_argument("--force", action="store_true", help="変更のないプロジェクトも再レンダリングする")
+    args = parser.parse_args(argv)
+
+    result = batch_render(args.project_dir, args.output_dir, args.jobs, args.force)
+    elapsed = result["elapsed"]
+    print(f"rendered: {result['rendered']}, skipped: {result['skipped']}, failed: {result['failed']}, elapsed: {elapsed:.2f}s")
+    if result["rendered"] and elapsed > 0:
+        print(
+            f"throughput: {result['rendered'] / elapsed:.1f} projects/s, "
+            f"{result['audio_seconds'] / elapsed:.1f}x realtime ({result['audio_seconds']:.1f}s of audio)"
+        )
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
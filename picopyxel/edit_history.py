@@ -0,0 +1,241 @@
+"""
+編集履歴モジュール - 編集の差分だけを記録し、元に戻す・やり直すを行う
+"""
+
+from array import array
+from collections import deque
+
+from pattern_store import EMPTY
+
+
+class HistoryEntry:
+    """
+    1回の編集操作の差分（変更された順の操作のリスト）
+    """
+
+    __slots__ = ("label", "pattern_idx", "ops", "size")
+
+    def __init__(self, label, pattern_idx, ops, size):
+        """
+        履歴項目の初期化
+
+        Args:
+            label: 操作名
+            pattern_idx: 操作したときに編集中だったパターン番号
+            ops: 操作のリスト
+            size: 記録に使うバイト数の見積もり
+        """
+        self.label = label
+        self.pattern_idx = pattern_idx
+        self.ops = ops
+        self.size = size
+
+
+class EditHistory:
+    """
+    パターンとソングの編集履歴を管理するクラス
+    全体のコピーは取らず、変更されたセル（1セル4バイト）、パターンの長さ、ソングの変更だけを記録する
+    元に戻す・やり直すは記録した差分だけを適用するため、時間はプロジェクトの大きさによらず編集の大きさだけで決まる
+    記録の合計がmax_bytesを超えたら古い履歴から捨てる
+    """
+
+    # 履歴に使う最大バイト数の既定値
+    DEFAULT_MAX_BYTES = 64 * 1024
+
+    # 1項目・1操作あたりの見積もりバイト数（セル以外）
+    ENTRY_BYTES = 64
+    OP_BYTES = 16
+
+    # 操作の種類
+    OP_CELLS = 0  # セルの変更（(パターン8bit, トラック4bit, ステップ6bit, 変更前7bit, 変更後7bit)を4バイトに詰めた配列）
+    OP_LENGTH = 1  # パターンの長さの変更（パターン, 変更前, 変更後）
+    OP_SONG_INSERT = 2  # ソングへの挿入（位置, パターン, 繰り返し回数）
+    OP_SONG_REMOVE = 3  # ソングからの削除（位置, パターン, 繰り返し回数）
+    OP_SONG_REPEAT = 4  # 繰り返し回数の変更（位置, 変更前, 変更後）
+    OP_SONG_REPLACE = 5  # ソング全体の置き換え（変更前の並び, 変更前の繰り返し, 変更後の並び, 変更後の繰り返し）
+
+    def __init__(self, sequencer, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        編集履歴の初期化（PatternStoreの変更を記録するよう登録する）
+
+        Args:
+            sequencer: 記録対象のSequencerインスタンス
+            max_bytes: 履歴に使う最大バイト数
+        """
+        self.sequencer = sequencer
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        # 履歴全体の見積もりバイト数
+        self.bytes = 0
+        # まだ履歴項目にまとめていない操作
+        self._ops = []
+        self._size = 0
+        # 元に戻す・やり直す処理中は記録しない
+        self._applying = False
+        sequencer.patterns.recorder = self
+
+    # 記録
+
+    def record_cell(self, pattern_idx, track_idx, step_idx, old_pitch, new_pitch):
+        """
+        セルの変更を記録する
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+            step_idx: ステップ位置
+            old_pitch: 変更前の音高
+            new_pitch: 変更後の音高
+        """
+        if self._applying:
+            return
+        if not self._ops or self._ops[-1][0] != self.OP_CELLS:
+            self._ops.append((self.OP_CELLS, array("I")))
+            self._size += self.OP_BYTES
+        self._ops[-1][1].append(
+            pattern_idx << 24 | track_idx << 20 | step_idx << 14 | (old_pitch - EMPTY) << 7 | (new_pitch - EMPTY)
+        )
+        self._size += 4
+
+    def record_length(self, pattern_idx, old_length, new_length):
+        """
+        パターンの長さの変更を記録する
+
+        Args:
+            pattern_idx: パターン番号
+            old_length: 変更前のステップ数
+            new_length: 変更後のステップ数
+        """
+        self.record(self.OP_LENGTH, pattern_idx, old_length, new_length)
+
+    def record(self, op, *args):
+        """
+        セル以外の変更を記録する
+
+        Args:
+            op: 操作の種類（OP_LENGTH、OP_SONG_*）
+            *args: 操作の内容
+        """
+        if self._applying:
+            return
+        self._ops.append((op,) + args)
+        self._size += self.OP_BYTES
+        if op == self.OP_SONG_REPLACE:
+            self._size += 3 * (len(args[0]) + len(args[2]))
+
+    def commit(self, label):
+        """
+        記録した変更を1回の操作として履歴に追加する（やり直しの履歴は消える）
+
+        Args:
+            label: 操作名
+        """
+        if not self._ops:
+            return
+        entry = HistoryEntry(label, self.sequencer.current_pattern, self._ops, self._size + self.ENTRY_BYTES)
+        self._ops = []
+        self._size = 0
+        for redo_entry in self.redo_stack:
+            self.bytes -= redo_entry.size
+        self.redo_stack.clear()
+        self.undo_stack.append(entry)
+        self.bytes += entry.size
+        # 上限を超えた分は古い履歴から捨てる
+        while self.bytes > self.max_bytes and self.undo_stack:
+            self.bytes -= self.undo_stack.popleft().size
+
+    def reset(self):
+        """履歴と未確定の記録をすべて消す（プロジェクトの読み込み時など）"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.bytes = 0
+        self._ops = []
+        self._size = 0
+
+    # 元に戻す・やり直す
+
+    def can_undo(self):
+        """元に戻せる操作があればTrue"""
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        """やり直せる操作があればTrue"""
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """
+        直前の操作を元に戻す
+
+        Returns:
+            str: 元に戻した操作名。履歴がなければNone
+        """
+        # 確定していない変更があれば先に1回の操作としてまとめる
+        self.commit("edit")
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self._apply(entry, undo=True)
+        self.redo_stack.append(entry)
+        return entry.label
+
+    def redo(self):
+        """
+        元に戻した操作をやり直す
+
+        Returns:
+            str: やり直した操作名。履歴がなければNone
+        """
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self._apply(entry, undo=False)
+        self.undo_stack.append(entry)
+        return entry.label
+
+    def _apply(self, entry, undo):
+        """
+        履歴項目の変更を適用する
+
+        Args:
+            entry: 適用する履歴項目
+            undo: Trueの場合は逆順に変更前の状態へ戻す
+        """
+        seq = self.sequencer
+        store = seq.patterns
+        touched = set()
+        self._applying = True
+        try:
+            for op in reversed(entry.ops) if undo else entry.ops:
+                kind = op[0]
+                if kind == self.OP_CELLS:
+                    shift = 7 if undo else 0
+                    for packed in reversed(op[1]) if undo else op[1]:
+                        pattern_idx = packed >> 24
+                        pitch = ((packed >> shift) & 0x7F) + EMPTY
+                        store.set_pitch(pattern_idx, packed >> 20 & 0xF, packed >> 14 & 0x3F, pitch)
+                        touched.add(pattern_idx)
+                elif kind == self.OP_LENGTH:
+                    _, pattern_idx, old_length, new_length = op
+                    store.set_length(pattern_idx, old_length if undo else new_length)
+                    touched.add(pattern_idx)
+                elif kind == self.OP_SONG_REPEAT:
+                    _, position, old_repeat, new_repeat = op
+                    seq._set_song_repeat(position, old_repeat if undo else new_repeat)
+                elif kind == self.OP_SONG_REPLACE:
+                    _, old_seq, old_repeats, new_seq, new_repeats = op
+                    if undo:
+                        seq._replace_song(old_seq, old_repeats)
+                    else:
+                        seq._replace_song(new_seq, new_repeats)
+                elif (kind == self.OP_SONG_INSERT) != undo:
+                    _, position, pattern_idx, repeat = op
+                    seq._insert_song_entry(position, pattern_idx, repeat)
+                else:
+                    seq._remove_song_entry(op[1])
+        finally:
+            self._applying = False
+
+        for pattern_idx in touched:
+            seq.compiler.mark_dirty(pattern_idx)
+        seq.current_pattern = entry.pattern_idx
@@ -0,0 +1,145 @@
+"""
+イベントログモジュール - 操作の記録を固定長のリングバッファに溜め、書き出すときにだけ文字列にする
+"""
+
+from time import perf_counter
+
+
+class EventLog:
+    """
+    レベル付きのイベントを記録するクラス
+    記録はフォーマット文字列と引数のタプルのまま、作成時に確保したリストを上書きする（古いものから消える）
+    文字列への変換は書き出すとき（lines()、dump()）にだけ行う
+    記録しないレベルの呼び出しは比較1回で戻る。レベルは実行中にlevelへ代入して切り替えられる
+    """
+
+    # レベル（大きいほど重要。level未満のイベントは記録しない）
+    DEBUG = 10  # 音階・テンポ・トラックなど、操作のたびに発生する変更
+    INFO = 20  # モード切り替えや編集など
+    WARNING = 30  # 処理を続けられる失敗
+    OFF = 100  # 何も記録しない
+
+    LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", OFF: "OFF"}
+
+    # 書き出し先を指定しない場合のファイル名
+    DEFAULT_FILENAME = "picopyxel_events.log"
+
+    def __init__(self, capacity=256, level=INFO):
+        """
+        イベントログの初期化
+
+        Args:
+            capacity: 記録するイベント数
+            level: 記録する最低のレベル
+        """
+        self.capacity = capacity
+        self.level = level
+        # 記録領域（(時刻, レベル, フォーマット文字列, 引数)のタプル）
+        self.entries = [None] * capacity
+        # 記録したイベント数（累計）と、時刻の基準（作成時）
+        self.count = 0
+        self.start = perf_counter()
+
+    @classmethod
+    def parse_level(cls, name):
+        """
+        レベル名（大文字小文字は問わない）または数値の文字列をレベルに変換する
+
+        Args:
+            name: レベル名（"debug"、"info"、"warning"、"off"）または数値
+
+        Returns:
+            int: レベル
+
+        Raises:
+            ValueError: 不明なレベル名の場合
+        """
+        for level, level_name in cls.LEVEL_NAMES.items():
+            if level_name == name.upper():
+                return level
+        try:
+            return int(name)
+        except ValueError:
+            raise ValueError(f"unknown log level: {name}") from None
+
+    def log(self, level, message, *args):
+        """
+        イベントを記録する
+
+        Args:
+            level: レベル
+            message: str.formatのフォーマット文字列
+            *args: フォーマットの引数（書き出すときまで文字列にしない）
+        """
+        if level < self.level:
+            return
+        self.entries[self.count % self.capacity] = (perf_counter(), level, message, args)
+        self.count += 1
+
+    def debug(self, message, *args):
+        """DEBUGレベルのイベントを記録する"""
+        if self.level > self.DEBUG:
+            return
+        self.entries[self.count % self.capacity] = (perf_counter(), self.DEBUG, message, args)
+        self.count += 1
+
+    def info(self, message, *args):
+        """INFOレベルのイベントを記録する"""
+        if self.level > self.INFO:
+            return
+        self.entries[self.count % self.capacity] = (perf_counter(), self.INFO, message, args)
+        self.count += 1
+
+    def warning(self, message, *args):
+        """WARNINGレベルのイベントを記録する"""
+        if self.level > self.WARNING:
+            return
+        self.entries[self.count % self.capacity] = (perf_counter(), self.WARNING, message, args)
+        self.count += 1
+
+    def clear(self):
+        """記録を消す（記録領域は残す）"""
+        self.entries = [None] * self.capacity
+        self.count = 0
+
+    def records(self):
+        """
+        記録済みのイベントを古い順に返す
+
+        Returns:
+            list: (時刻, レベル, フォーマット文字列, 引数)のリスト
+        """
+        if self.count <= self.capacity:
+            return self.entries[: self.count]
+        start = self.count % self.capacity
+        return self.entries[start:] + self.entries[:start]
+
+    def lines(self):
+        """
+        記録済みのイベントを文字列にする
+
+        Returns:
+            list: 「作成からの時刻（秒） レベル名 メッセージ」の文字列のリスト（古い順）
+        """
+        return [
+            f"{timestamp - self.start:10.4f} {self.LEVEL_NAMES.get(level, level):<7} {message.format(*args)}"
+            for timestamp, level, message, args in self.records()
+        ]
+
+    def dump(self, filename=None):
+        """
+        記録済みのイベントをファイルに書き出す（記録は残す）
+
+        Args:
+            filename: 出力ファイル名。Noneの場合はDEFAULT_FILENAME
+
+        Returns:
+            str: 書き出したファイル名
+        """
+        filename = filename or self.DEFAULT_FILENAME
+        with open(filename, "w", encoding="utf-8") as f:
+            if self.count > self.capacity:
+                f.write(f"# {self.count - self.capacity} older events dropped\n")
+            for line in self.lines():
+                f.write(line + "\n")
+        return filename
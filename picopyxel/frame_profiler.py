@@ -0,0 +1,148 @@
+"""
+フレームプロファイラーモジュール - フレームごとの処理時間を固定長のリングバッファに記録する
+"""
+
+from array import array
+from time import perf_counter
+
+
+class FrameProfiler:
+    """
+    1フレーム内の区間ごとの処理時間を記録するクラス
+    記録領域は有効化したときに1度だけ確保し、以降は同じ配列を上書きする（古いフレームから消える）
+    lap()は前回の区切りからの経過時間を区間に加算するため、同じ区間を1フレームに何度も計測できる
+    無効時の各メソッドはフラグを確認して戻るだけ
+    """
+
+    # 区間名（列の順番）
+    SECTIONS = ("input", "sequencer", "sound", "draw_grid", "draw_song", "draw_track", "draw_other")
+
+    # 区間番号
+    INPUT = 0  # 入力処理
+    SEQUENCER = 1  # シーケンサー更新（音の設定を除く）
+    SOUND = 2  # サウンド・ミュージックの設定と発音
+    DRAW_GRID = 3  # パターン編集画面のグリッド
+    DRAW_SONG = 4  # ソング編集画面
+    DRAW_TRACK = 5  # トラック設定画面
+    DRAW_OTHER = 6  # 共通部分の描画
+
+    # 1フレームの時間（30fps）
+    FRAME_BUDGET = 1 / 30
+
+    def __init__(self, capacity=300):
+        """
+        プロファイラーの初期化
+
+        Args:
+            capacity: 記録するフレーム数
+        """
+        self.capacity = capacity
+        # 1フレームの列数（区間ごとの時間とフレーム全体の時間）
+        self.width = len(self.SECTIONS) + 1
+        self.enabled = False
+        # 記録領域（capacity × width秒、有効化時に確保）
+        self.buffer = None
+        self._empty_row = array("d", [0.0]) * self.width
+        # 記録したフレーム数（累計）
+        self.frames = 0
+        # 現在のフレームの行の先頭、フレーム開始時刻、前回の区切りの時刻
+        self._row = 0
+        self._frame_start = 0.0
+        self._last = 0.0
+
+    def enable(self):
+        """計測を開始する（初回のみ記録領域を確保する）"""
+        if self.buffer is None:
+            self.buffer = array("d", [0.0]) * (self.capacity * self.width)
+        self.enabled = True
+        self._start_row()
+
+    def disable(self):
+        """計測を止める（記録済みの内容は残す）"""
+        self.enabled = False
+
+    def _start_row(self):
+        """現在のフレームの行を空にして時刻の基準を設定する"""
+        self._row = (self.frames % self.capacity) * self.width
+        self.buffer[self._row : self._row + self.width] = self._empty_row
+        self._frame_start = self._last = perf_counter()
+
+    def begin_frame(self):
+        """フレームの計測を始める"""
+        if self.enabled:
+            self._start_row()
+
+    def lap(self, section):
+        """
+        前回の区切りからの経過時間を区間に加算する
+
+        Args:
+            section: 区間番号
+        """
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.buffer[self._row + section] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        """フレーム全体の時間を記録して次のフレームに進む"""
+        if not self.enabled:
+            return
+        self.buffer[self._row + self.width - 1] = perf_counter() - self._frame_start
+        self.frames += 1
+
+    def rows(self):
+        """
+        記録済みのフレームを古い順に返す
+
+        Returns:
+            list: フレームごとの区間時間とフレーム全体の時間（秒）のリスト
+        """
+        if self.buffer is None:
+            return []
+        count = min(self.frames, self.capacity)
+        first = self.frames - count
+        return [
+            self.buffer[(frame % self.capacity) * self.width : (frame % self.capacity + 1) * self.width].tolist()
+            for frame in range(first, first + count)
+        ]
+
+    def stats(self):
+        """
+        記録済みのフレームの平均・最大を計算する
+
+        Returns:
+            list: 区間ごと（最後はフレーム全体"total"）の(区間名, 平均秒, 最大秒)のリスト。記録がなければ空
+        """
+        rows = self.rows()
+        if not rows:
+            return []
+        names = self.SECTIONS + ("total",)
+        return [(name, sum(column) / len(column), max(column)) for name, column in zip(names, zip(*rows))]
+
+    def budget_usage(self):
+        """
+        フレーム全体の平均時間がフレーム予算に占める割合を返す
+
+        Returns:
+            float: 割合（1.0で予算いっぱい）
+        """
+        stats = self.stats()
+        return stats[-1][1] / self.FRAME_BUDGET if stats else 0.0
+
+    def dump_csv(self, filename):
+        """
+        記録済みのフレームをCSVに書き出す（ミリ秒単位）
+
+        Args:
+            filename: 出力ファイル名
+        """
+        import csv  # 起動を速くするため、書き出すときだけ読み込む
+
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame",) + self.SECTIONS + ("total",))
+            first = self.frames - min(self.frames, self.capacity)
+            for frame, row in enumerate(self.rows(), first):
+                writer.writerow([frame] + [f"{seconds * 1000:.4f}" for seconds in row])
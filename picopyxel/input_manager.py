@@ -3,6 +3,8 @@
 """
 
 import pyxel
+from event_log import EventLog
+from input_snapshot import AXIS_NEGATIVE, AXIS_POSITIVE, InputSnapshot
 
 
 class InputManager:
@@ -14,123 +16,169 @@ class InputManager:
     # アナログ入力の閾値
     ANALOG_THRESHOLD = 16000
 
+    # ソング編集でCtrl+左右キーで移動する位置の数（ソング画面に表示する数）
+    SONG_PAGE_SIZE = 16
+
     # モード定数
     MODE_PATTERN_EDIT = 0  # パターン編集モード
     MODE_SONG_EDIT = 1  # ソング編集モード
     MODE_TRACK_SETTINGS = 2  # トラック設定モード
-
-    def __init__(self, sequencer):
+    MODE_LIBRARY = 3  # ライブラリモード（ライブラリがある場合のみ）
+
+    # アクションと入力の対応表（キー・ボタンのコード、またはアナログ軸の(軸, 向き)）
+    BINDINGS = {
+        "mode": (pyxel.KEY_TAB, pyxel.GAMEPAD1_BUTTON_START),
+        "play": (pyxel.KEY_SPACE, pyxel.GAMEPAD1_BUTTON_A),
+        "up": (pyxel.KEY_UP, pyxel.GAMEPAD1_BUTTON_DPAD_UP),
+        "down": (pyxel.KEY_DOWN, pyxel.GAMEPAD1_BUTTON_DPAD_DOWN),
+        "octave_up": (pyxel.KEY_PAGEUP, pyxel.GAMEPAD1_BUTTON_RIGHTSHOULDER),
+        "octave_down": (pyxel.KEY_PAGEDOWN, pyxel.GAMEPAD1_BUTTON_LEFTSHOULDER),
+        "tempo_up": (pyxel.KEY_L, (pyxel.GAMEPAD1_AXIS_RIGHTX, AXIS_POSITIVE)),
+        "tempo_down": (pyxel.KEY_H, (pyxel.GAMEPAD1_AXIS_RIGHTX, AXIS_NEGATIVE)),
+        "track_next": (pyxel.KEY_RIGHTBRACKET, (pyxel.GAMEPAD1_AXIS_TRIGGERRIGHT, AXIS_POSITIVE)),
+        "track_prev": (pyxel.KEY_LEFTBRACKET, (pyxel.GAMEPAD1_AXIS_TRIGGERLEFT, AXIS_POSITIVE)),
+        "pattern_next": (pyxel.KEY_PERIOD, (pyxel.GAMEPAD1_AXIS_RIGHTY, AXIS_NEGATIVE)),
+        "pattern_prev": (pyxel.KEY_COMMA, (pyxel.GAMEPAD1_AXIS_RIGHTY, AXIS_POSITIVE)),
+        "song_mode": (pyxel.KEY_S, pyxel.GAMEPAD1_BUTTON_Y),
+        "step_left": (pyxel.KEY_LEFT, pyxel.GAMEPAD1_BUTTON_DPAD_LEFT, (pyxel.GAMEPAD1_AXIS_LEFTX, AXIS_NEGATIVE)),
+        "step_right": (pyxel.KEY_RIGHT, pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT, (pyxel.GAMEPAD1_AXIS_LEFTX, AXIS_POSITIVE)),
+        "song_left": (pyxel.KEY_LEFT, pyxel.GAMEPAD1_BUTTON_DPAD_LEFT),
+        "song_right": (pyxel.KEY_RIGHT, pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT),
+        "song_first": (pyxel.KEY_HOME,),
+        "song_last": (pyxel.KEY_END,),
+        "enter": (pyxel.KEY_RETURN, pyxel.GAMEPAD1_BUTTON_B),
+        "clear_step": (pyxel.KEY_DELETE, pyxel.KEY_BACKSPACE, pyxel.GAMEPAD1_BUTTON_BACK),
+        "remove_pattern": (pyxel.KEY_DELETE, pyxel.KEY_BACKSPACE, pyxel.GAMEPAD1_BUTTON_X),
+        "ctrl": (pyxel.KEY_CTRL,),
+        "clear": (pyxel.KEY_D,),
+        "copy": (pyxel.KEY_C,),
+        "undo": (pyxel.KEY_Z,),
+        "redo": (pyxel.KEY_Y,),
+        "guide": (pyxel.GAMEPAD1_BUTTON_GUIDE,),
+        "back": (pyxel.GAMEPAD1_BUTTON_BACK,),
+        "profiler": (pyxel.KEY_F3,),
+        "log_dump": (pyxel.KEY_F4,),
+    }
+
+    def __init__(self, sequencer, backend=None):
         """
         入力マネージャーの初期化
 
         Args:
             sequencer: 操作対象のSequencerインスタンス
+            backend: 入力を読み取るバックエンド。Noneの場合はSequencerと同じバックエンド
         """
         self.sequencer = sequencer
+        self.backend = backend or sequencer.backend
         # 現在選択中のステップ
         self.selected_step = 0
-        # キー入力の前回状態（連続入力防止用）
-        self.prev_keys = {}
-        self.prev_gamepad_buttons = {}
-        self.prev_gamepad_axes = {}
-        # 操作モード（0: パターン編集、1: ソング編集、2: トラック設定）
+        # 1フレームに1回だけ読み取った入力状態（連続入力防止は前フレームとの比較で行う）
+        self.input = InputSnapshot(self.BINDINGS, self.ANALOG_THRESHOLD, self.backend.btn, self.backend.btnv)
+        # 操作モード（0: パターン編集、1: ソング編集、2: トラック設定、3: ライブラリ）
         self.mode = self.MODE_PATTERN_EDIT
         # ゲームパッド使用フラグ
         self.using_gamepad = False
         # ソング編集時の位置
         self.song_edit_position = 0
+        # プロジェクトライブラリ（ProjectLibrary。Noneの場合はライブラリモードなし）と選択中の位置
+        self.library = None
+        self.library_position = 0
+        # パターン編集モードで入力・選択した音を試聴するか
+        self.audition = True
+        # 操作のイベントログ（文字列にするのは書き出すときだけ）
+        self.log = EventLog()
+
+    def _audition(self):
+        """選択中の音を入力と同じフレームで試聴する（パターン編集モードのみ）"""
+        if self.audition and self.mode == self.MODE_PATTERN_EDIT:
+            self.sequencer.audition(input_time=self.input.poll_time)
 
     def update(self):
         """
         入力状態を更新する
         毎フレーム呼び出される
         """
+        # 割り当てた入力をまとめて読み取る
+        self.input.poll()
+        pressed = self.input.is_pressed
+
         # モード切替（Tabキーまたはゲームパッドのスタートボタン）
-        if self._is_key_pressed(pyxel.KEY_TAB) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_START):
-            self.mode = (self.mode + 1) % 3
-            print(f"モード変更: {self.mode}")
+        if pressed("mode"):
+            self.mode = (self.mode + 1) % (4 if self.library is not None else 3)
+            self.log.info("モード変更: {}", self.mode)
 
         # 再生/停止切り替え（スペースキーまたはAボタン）
-        if self._is_key_pressed(pyxel.KEY_SPACE) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_A):
-            self.sequencer.toggle_play()
+        if pressed("play"):
+            sequencer = self.sequencer
+            if self.mode == self.MODE_SONG_EDIT and sequencer.song_mode and sequencer.song_sequence and not sequencer.playing:
+                # ソング編集モードでは選択中のソング位置から再生する
+                sequencer.play_from_position(self.song_edit_position)
+            else:
+                sequencer.toggle_play()
 
         # 共通操作
         # 音階選択（上下キーまたはゲームパッド十字キー上下）- パターン編集モードのみ
         if self.mode == self.MODE_PATTERN_EDIT:
-            if self._is_key_pressed(pyxel.KEY_UP) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_UP):
+            if pressed("up"):
                 new_note = self.sequencer.change_note(1)
-                print(f"音階上げ: {new_note}")
+                self._audition()
+                self.log.debug("音階上げ: {}", new_note)
 
-            if self._is_key_pressed(pyxel.KEY_DOWN) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_DOWN):
+            if pressed("down"):
                 new_note = self.sequencer.change_note(-1)
-                print(f"音階下げ: {new_note}")
+                self._audition()
+                self.log.debug("音階下げ: {}", new_note)
 
         # オクターブ変更（PageUp/PageDownキーまたはゲームパッドLRボタン）
-        if self._is_key_pressed(pyxel.KEY_PAGEUP) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_RIGHTSHOULDER):
+        if pressed("octave_up"):
             new_octave = self.sequencer.change_octave(1)
-            print(f"オクターブ上げ: {new_octave}")
+            self._audition()
+            self.log.debug("オクターブ上げ: {}", new_octave)
 
-        if self._is_key_pressed(pyxel.KEY_PAGEDOWN) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_LEFTSHOULDER):
+        if pressed("octave_down"):
             new_octave = self.sequencer.change_octave(-1)
-            print(f"オクターブ下げ: {new_octave}")
-
-        # 音色タイプはトラックごとに固定されるため、この機能は不要になります
+            self._audition()
+            self.log.debug("オクターブ下げ: {}", new_octave)
 
         # テンポ変更（hとlキーまたはゲームパッド右スティック左右）
-        if self._is_key_pressed(pyxel.KEY_L):
+        if pressed("tempo_up"):
             new_tempo = self.sequencer.change_tempo(1)
-            print(f"テンポ上げ: {new_tempo} BPM")
+            self.log.debug("テンポ上げ: {} BPM", new_tempo)
 
-        if self._is_key_pressed(pyxel.KEY_H):
+        if pressed("tempo_down"):
             new_tempo = self.sequencer.change_tempo(-1)
-            print(f"テンポ下げ: {new_tempo} BPM")
-
-        # テンポ変更 - ゲームパッド右スティック左右
-        right_x = pyxel.btnv(pyxel.GAMEPAD1_AXIS_RIGHTX)
-        if self._is_analog_triggered(pyxel.GAMEPAD1_AXIS_RIGHTX, right_x, self.ANALOG_THRESHOLD):
-            if right_x > 0:  # 右
-                new_tempo = self.sequencer.change_tempo(1)
-                print(f"テンポ上げ: {new_tempo} BPM")
-            else:  # 左
-                new_tempo = self.sequencer.change_tempo(-1)
-                print(f"テンポ下げ: {new_tempo} BPM")
+            self.log.debug("テンポ下げ: {} BPM", new_tempo)
 
         # トラック切り替え（[と]キー、またはゲームパッドのトリガー）
-        if self._is_key_pressed(pyxel.KEY_RIGHTBRACKET) or self._is_analog_triggered(
-            pyxel.GAMEPAD1_AXIS_TRIGGERRIGHT, pyxel.btnv(pyxel.GAMEPAD1_AXIS_TRIGGERRIGHT), self.ANALOG_THRESHOLD
-        ):
+        if pressed("track_next"):
             new_track = self.sequencer.change_track(1)
-            print(f"トラック変更: {new_track}")
+            self.log.debug("トラック変更: {}", new_track)
 
-        if self._is_key_pressed(pyxel.KEY_LEFTBRACKET) or self._is_analog_triggered(
-            pyxel.GAMEPAD1_AXIS_TRIGGERLEFT, pyxel.btnv(pyxel.GAMEPAD1_AXIS_TRIGGERLEFT), self.ANALOG_THRESHOLD
-        ):
+        if pressed("track_prev"):
             new_track = self.sequencer.change_track(-1)
-            print(f"トラック変更: {new_track}")
+            self.log.debug("トラック変更: {}", new_track)
 
         # パターン切り替え（,と.キー、またはゲームパッド右スティック上下）
-        if self._is_key_pressed(pyxel.KEY_PERIOD):
+        if pressed("pattern_next"):
             new_pattern = self.sequencer.change_pattern(1)
-            print(f"パターン変更: {new_pattern}")
+            self.log.debug("パターン変更: {}", new_pattern)
 
-        if self._is_key_pressed(pyxel.KEY_COMMA):
+        if pressed("pattern_prev"):
             new_pattern = self.sequencer.change_pattern(-1)
-            print(f"パターン変更: {new_pattern}")
-
-        # パターン切り替え - ゲームパッド右スティック上下
-        right_y = pyxel.btnv(pyxel.GAMEPAD1_AXIS_RIGHTY)
-        if self._is_analog_triggered(pyxel.GAMEPAD1_AXIS_RIGHTY, right_y, self.ANALOG_THRESHOLD):
-            if right_y > 0:  # 下
-                new_pattern = self.sequencer.change_pattern(-1)
-                print(f"パターン変更: {new_pattern}")
-            else:  # 上
-                new_pattern = self.sequencer.change_pattern(1)
-                print(f"パターン変更: {new_pattern}")
+            self.log.debug("パターン変更: {}", new_pattern)
 
         # ソングモード切り替え（SキーまたはゲームパッドのYボタン）
-        if self._is_key_pressed(pyxel.KEY_S) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_Y):
+        if pressed("song_mode"):
             song_mode = self.sequencer.toggle_song_mode()
-            print(f"ソングモード: {'ON' if song_mode else 'OFF'}")
+            self.log.info("ソングモード: {}", "ON" if song_mode else "OFF")
+
+        # 元に戻す・やり直す（Ctrl+Z / Ctrl+Y）
+        if self.input.is_held("ctrl") and (pressed("undo") or pressed("redo")):
+            history = self.sequencer.history
+            label = history.undo() if pressed("undo") else history.redo()
+            if label is not None:
+                self.log.info("{}: {}", "元に戻す" if pressed("undo") else "やり直し", label)
+            self.song_edit_position = max(0, min(self.song_edit_position, len(self.sequencer.song_sequence) - 1))
 
         # 各モードの操作
         if self.mode == self.MODE_PATTERN_EDIT:
@@ -139,90 +187,87 @@ class InputManager:
             self._handle_song_edit_mode()
         elif self.mode == self.MODE_TRACK_SETTINGS:
             self._handle_track_settings_mode()
-
-        # 前回の入力状態を保存
-        self._update_prev_inputs()
+        elif self.mode == self.MODE_LIBRARY:
+            self._handle_library_mode()
 
     def _handle_pattern_edit_mode(self):
         """パターン編集モードの入力処理"""
-        # ステップ選択（左右移動）- キーボード
-        if self._is_key_pressed(pyxel.KEY_LEFT):
-            self.selected_step = (self.selected_step - 1) % 16
-
-        if self._is_key_pressed(pyxel.KEY_RIGHT):
-            self.selected_step = (self.selected_step + 1) % 16
-
-        # ステップ選択（左右移動）- ゲームパッド左スティックまたは十字キー左右
-        left_x = pyxel.btnv(pyxel.GAMEPAD1_AXIS_LEFTX)
-        if self._is_analog_triggered(pyxel.GAMEPAD1_AXIS_LEFTX, left_x, self.ANALOG_THRESHOLD):
-            if left_x > 0:  # 右
-                self.selected_step = (self.selected_step + 1) % 16
-            else:  # 左
-                self.selected_step = (self.selected_step - 1) % 16
-
-        # ステップ選択（左右移動）- ゲームパッド十字キー左右
-        if self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_LEFT):
-            self.selected_step = (self.selected_step - 1) % 16
-
-        if self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT):
-            self.selected_step = (self.selected_step + 1) % 16
-
-        # 音階入力 - キーボード（Enterキー）
-        if self._is_key_pressed(pyxel.KEY_RETURN):
-            self.sequencer.input_note(self.selected_step)
-            print(f"音階入力: {self.sequencer.current_note} (オクターブ: {self.sequencer.current_octave})")
+        pressed = self.input.is_pressed
+        held = self.input.is_held
+
+        # ステップ選択（左右移動）- キーボード、ゲームパッド左スティックまたは十字キー左右
+        length = self.sequencer.pattern_length()
+        self.selected_step = min(self.selected_step, length - 1)
+        if pressed("step_left"):
+            self.selected_step = (self.selected_step - 1) % length
+
+        if pressed("step_right"):
+            self.selected_step = (self.selected_step + 1) % length
 
-        # 音階入力 - ゲームパッド（Bボタン）
-        if self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_B):
+        # 音階入力（Enterキーまたはゲームパッドのボタン）
+        if pressed("enter"):
             self.sequencer.input_note(self.selected_step)
-            print(f"音階入力: {self.sequencer.current_note} (オクターブ: {self.sequencer.current_octave})")
+            self._audition()
+            self.log.debug("音階入力: {} (オクターブ: {})", self.sequencer.current_note, self.sequencer.current_octave)
 
         # 音消去（DELキー または ゲームパッドのBACKボタン）
-        if (
-            self._is_key_pressed(pyxel.KEY_DELETE)
-            or self._is_key_pressed(pyxel.KEY_BACKSPACE)
-            or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_BACK)
-        ):
+        if pressed("clear_step"):
             self.sequencer.clear_step(self.selected_step)
 
         # 全消去（Ctrl+Dキー または ゲームパッドのGUIDEボタン長押し）
-        if (pyxel.btn(pyxel.KEY_CTRL) and self._is_key_pressed(pyxel.KEY_D)) or (
-            pyxel.btn(pyxel.GAMEPAD1_BUTTON_GUIDE) and pyxel.btn(pyxel.GAMEPAD1_BUTTON_BACK)
-        ):
+        if (held("ctrl") and pressed("clear")) or (held("guide") and held("back")):
             self.sequencer.clear_all()
 
         # パターンコピー（Ctrl+Cキー）
-        if pyxel.btn(pyxel.KEY_CTRL) and self._is_key_pressed(pyxel.KEY_C):
+        if held("ctrl") and pressed("copy"):
             # 次のパターンにコピー
             next_pattern = (self.sequencer.current_pattern + 1) % self.sequencer.PATTERN_COUNT
             self.sequencer.copy_pattern(self.sequencer.current_pattern, next_pattern)
-            print(f"パターンコピー: {self.sequencer.current_pattern} -> {next_pattern}")
+            self.log.info("パターンコピー: {} -> {}", self.sequencer.current_pattern, next_pattern)
 
     def _handle_song_edit_mode(self):
         """ソング編集モードの入力処理"""
-        # ソング位置選択（左右移動）
-        if self._is_key_pressed(pyxel.KEY_LEFT):
-            if len(self.sequencer.song_sequence) > 0:
-                self.song_edit_position = (self.song_edit_position - 1) % len(self.sequencer.song_sequence)
-
-        if self._is_key_pressed(pyxel.KEY_RIGHT):
-            if len(self.sequencer.song_sequence) > 0:
-                self.song_edit_position = (self.song_edit_position + 1) % len(self.sequencer.song_sequence)
+        pressed = self.input.is_pressed
+
+        # ソング位置選択（左右移動。Ctrlを押しながらの場合は1ページ分移動し、端で止まる）
+        song_length = len(self.sequencer.song_sequence)
+        if song_length > 0:
+            if self.input.is_held("ctrl"):
+                if pressed("song_left"):
+                    self.song_edit_position = max(0, self.song_edit_position - self.SONG_PAGE_SIZE)
+                if pressed("song_right"):
+                    self.song_edit_position = min(song_length - 1, self.song_edit_position + self.SONG_PAGE_SIZE)
+            else:
+                if pressed("song_left"):
+                    self.song_edit_position = (self.song_edit_position - 1) % song_length
+                if pressed("song_right"):
+                    self.song_edit_position = (self.song_edit_position + 1) % song_length
+
+            # 先頭・末尾へ移動（Home/Endキー）
+            if pressed("song_first"):
+                self.song_edit_position = 0
+            if pressed("song_last"):
+                self.song_edit_position = song_length - 1
+
+        # 繰り返し回数の変更（上下キーまたはゲームパッド十字キー上下）
+        if pressed("up"):
+            repeat = self.sequencer.change_song_repeat(self.song_edit_position, 1)
+            self.log.info("繰り返し回数: 位置 {} x{}", self.song_edit_position, repeat)
+
+        if pressed("down"):
+            repeat = self.sequencer.change_song_repeat(self.song_edit_position, -1)
+            self.log.info("繰り返し回数: 位置 {} x{}", self.song_edit_position, repeat)
 
         # パターン追加（EnterキーまたはゲームパッドのBボタン）
-        if self._is_key_pressed(pyxel.KEY_RETURN) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_B):
+        if pressed("enter"):
             self.sequencer.add_pattern_to_song(self.sequencer.current_pattern)
-            print(f"パターン追加: {self.sequencer.current_pattern}")
+            self.log.info("パターン追加: {}", self.sequencer.current_pattern)
 
         # パターン削除（DELキーまたはゲームパッドのXボタン）
-        if (
-            self._is_key_pressed(pyxel.KEY_DELETE)
-            or self._is_key_pressed(pyxel.KEY_BACKSPACE)
-            or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_X)
-        ):
+        if pressed("remove_pattern"):
             if len(self.sequencer.song_sequence) > 0:
                 self.sequencer.remove_pattern_from_song(self.song_edit_position)
-                print(f"パターン削除: 位置 {self.song_edit_position}")
+                self.log.info("パターン削除: 位置 {}", self.song_edit_position)
                 # 位置調整
                 if len(self.sequencer.song_sequence) > 0:
                     self.song_edit_position = min(self.song_edit_position, len(self.sequencer.song_sequence) - 1)
@@ -230,133 +275,67 @@ class InputManager:
                     self.song_edit_position = 0
 
         # ソングクリア（Ctrl+Dキー）
-        if pyxel.btn(pyxel.KEY_CTRL) and self._is_key_pressed(pyxel.KEY_D):
-            self.sequencer.song_sequence = []
+        if self.input.is_held("ctrl") and pressed("clear"):
+            self.sequencer.clear_song()
             self.song_edit_position = 0
-            print("ソングクリア")
+            self.log.info("ソングクリア")
 
     def _handle_track_settings_mode(self):
         """トラック設定モードの入力処理"""
-        # 音量調整（上下キー）
-        if self._is_key_pressed(pyxel.KEY_UP) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_UP):
-            new_volume = self.sequencer.change_track_volume(1)
-            print(f"トラック{self.sequencer.current_track}の音量上げ: {new_volume}")
-
-        if self._is_key_pressed(pyxel.KEY_DOWN) or self._is_gamepad_button_pressed(pyxel.GAMEPAD1_BUTTON_DPAD_DOWN):
-            new_volume = self.sequencer.change_track_volume(-1)
-            print(f"トラック{self.sequencer.current_track}の音量下げ: {new_volume}")
-
-    def _is_key_pressed(self, key):
-        """
-        キーが押されたかどうかを判定（前回の状態と比較して一度だけ反応）
-
-        Args:
-            key: チェックするキーコード
-
-        Returns:
-            bool: キーが新たに押されたらTrue
-        """
-        # 現在押されていて、前回は押されていなかった場合にTrue
-        return pyxel.btnp(key) or (pyxel.btn(key) and key not in self.prev_keys)
-
-    def _is_gamepad_button_pressed(self, button):
-        """
-        ゲームパッドボタンが押されたかどうかを判定
-
-        Args:
-            button: チェックするボタンコード
-
-        Returns:
-            bool: ボタンが新たに押されたらTrue
-        """
-        return pyxel.btnp(button) or (pyxel.btn(button) and button not in self.prev_gamepad_buttons)
-
-    def _is_analog_triggered(self, axis, value, threshold):
-        """
-        アナログ入力が閾値を超えて変化したかを判定
-
-        Args:
-            axis: チェックする軸
-            value: 現在の値
-            threshold: 閾値
-
-        Returns:
-            bool: 閾値を超えて変化した場合True
-        """
-        # 閾値を超えていない場合はFalse
-        if abs(value) < threshold:
-            return False
-
-        # 前回の値を取得
-        prev_value = self.prev_gamepad_axes.get(axis, 0)
-
-        # 前回も閾値を超えていた場合はFalse（連続入力防止）
-        if abs(prev_value) >= threshold and (value > 0) == (prev_value > 0):
-            return False
-
-        return True
-
-    def _update_prev_inputs(self):
-        """前回の入力状態を更新"""
-        # キーボード
-        self.prev_keys = {}
-
-        # 操作キーも記録
-        for key in [
-            pyxel.KEY_LEFT,
-            pyxel.KEY_RIGHT,
-            pyxel.KEY_UP,
-            pyxel.KEY_DOWN,
-            pyxel.KEY_SPACE,
-            pyxel.KEY_DELETE,
-            pyxel.KEY_BACKSPACE,
-            pyxel.KEY_D,
-            pyxel.KEY_PAGEUP,
-            pyxel.KEY_PAGEDOWN,
-            pyxel.KEY_RETURN,
-            pyxel.KEY_J,
-            pyxel.KEY_K,
-            pyxel.KEY_H,
-            pyxel.KEY_L,
-            pyxel.KEY_TAB,
-            pyxel.KEY_S,
-            pyxel.KEY_C,
-            pyxel.KEY_LEFTBRACKET,
-            pyxel.KEY_RIGHTBRACKET,
-            pyxel.KEY_COMMA,
-            pyxel.KEY_PERIOD,
-        ]:
-            if pyxel.btn(key):
-                self.prev_keys[key] = True
-
-        # ゲームパッドボタン
-        self.prev_gamepad_buttons = {}
-
-        # 操作ボタンも記録
-        for button in [
-            pyxel.GAMEPAD1_BUTTON_START,
-            pyxel.GAMEPAD1_BUTTON_BACK,
-            pyxel.GAMEPAD1_BUTTON_GUIDE,
-            pyxel.GAMEPAD1_BUTTON_DPAD_UP,
-            pyxel.GAMEPAD1_BUTTON_DPAD_DOWN,
-            pyxel.GAMEPAD1_BUTTON_DPAD_LEFT,
-            pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT,
-            pyxel.GAMEPAD1_BUTTON_A,
-            pyxel.GAMEPAD1_BUTTON_B,
-            pyxel.GAMEPAD1_BUTTON_X,
-            pyxel.GAMEPAD1_BUTTON_Y,
-            pyxel.GAMEPAD1_BUTTON_LEFTSHOULDER,
-            pyxel.GAMEPAD1_BUTTON_RIGHTSHOULDER,
-        ]:
-            if pyxel.btn(button):
-                self.prev_gamepad_buttons[button] = True
-
-        # アナログ入力
-        self.prev_gamepad_axes = {
-            pyxel.GAMEPAD1_AXIS_LEFTX: pyxel.btnv(pyxel.GAMEPAD1_AXIS_LEFTX),
-            pyxel.GAMEPAD1_AXIS_LEFTY: pyxel.btnv(pyxel.GAMEPAD1_AXIS_LEFTY),
-            pyxel.GAMEPAD1_AXIS_RIGHTX: pyxel.btnv(pyxel.GAMEPAD1_AXIS_RIGHTX),
-            pyxel.GAMEPAD1_AXIS_RIGHTY: pyxel.btnv(pyxel.GAMEPAD1_AXIS_RIGHTY),
-            pyxel.GAMEPAD1_AXIS_TRIGGERLEFT: pyxel.btnv(pyxel.GAMEPAD1_AXIS_TRIGGERLEFT),
-            pyxel.GAMEPAD1_AXIS_TRIGGERRIGHT: pyxel.btnv(pyxel.GAMEPAD1_AXIS_TRIGGERRIGHT),
-        }
+        pressed = self.input.is_pressed
+        ctrl = self.input.is_held("ctrl")
+
+        # 音量調整（上下キー）、Ctrlを押しながらの場合は優先度の変更
+        for name, delta in (("up", 1), ("down", -1)):
+            if not pressed(name):
+                continue
+            if ctrl:
+                new_priority = self.sequencer.change_track_priority(delta)
+                self.log.debug("トラック{}の優先度: {}", self.sequencer.current_track, new_priority)
+            else:
+                new_volume = self.sequencer.change_track_volume(delta)
+                self.log.debug("トラック{}の音量: {}", self.sequencer.current_track, new_volume)
+
+        # パターンの長さ変更（左右キーまたはゲームパッド十字キー左右）、Ctrlを押しながらの場合はトラック数の変更
+        for name, delta in (("step_right", 1), ("step_left", -1)):
+            if not pressed(name):
+                continue
+            if ctrl:
+                track_count = self.sequencer.TRACK_COUNT
+                new_count = self.sequencer.change_track_count(delta)
+                if delta < 0 and new_count == track_count and track_count > 1:
+                    self.log.warning("音のあるトラック{}は削除できません", track_count)
+                else:
+                    self.log.info("トラック数: {}", new_count)
+            else:
+                new_length = self.sequencer.change_pattern_length(delta)
+                self.log.info("パターンの長さ: {}", new_length)
+
+        # 音色の切り替え（Enterキーまたはゲームパッドのボタン）
+        if pressed("enter"):
+            new_tone = self.sequencer.change_track_tone(1)
+            self.log.debug("トラック{}の音色: {}", self.sequencer.current_track, new_tone)
+
+    def _handle_library_mode(self):
+        """ライブラリモードの入力処理"""
+        pressed = self.input.is_pressed
+        names = self.library.names()
+        if not names:
+            return
+
+        # プロジェクト選択（上下キーまたはゲームパッド十字キー上下）
+        if pressed("up"):
+            self.library_position = (self.library_position - 1) % len(names)
+
+        if pressed("down"):
+            self.library_position = (self.library_position + 1) % len(names)
+
+        # プロジェクトを開く（EnterキーまたはゲームパッドのBボタン）
+        if pressed("enter"):
+            name = names[min(self.library_position, len(names) - 1)]
+            if self.sequencer.playing:
+                self.sequencer.toggle_play()
+            self.sequencer = self.library.open(name)
+            self.selected_step = 0
+            self.song_edit_position = 0
+            self.log.info("プロジェクトを開く: {}", name)
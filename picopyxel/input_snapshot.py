@@ -0,0 +1,128 @@
+"""
+入力スナップショットモジュール - 割り当てたキー・ボタン・アナログ軸を1フレームに1回だけ読み取る
+"""
+
+from time import perf_counter
+
+import pyxel
+
+# アナログ軸の向き（バインディングでは(軸, 向き)のタプルで指定する）
+AXIS_POSITIVE = 1
+AXIS_NEGATIVE = -1
+
+
+class InputSnapshot:
+    """
+    アクションに割り当てた入力を毎フレーム1回ずつ読み取り、1つの整数のビット列として保持するクラス
+    各入力（アナログ軸は向きごと）に1ビットを割り当て、押下・解放は前フレームとのビット演算で求める
+    """
+
+    def __init__(self, bindings, analog_threshold, btn=None, btnv=None):
+        """
+        入力スナップショットの初期化
+
+        Args:
+            bindings: アクション名 -> 入力のタプル（キー・ボタンのコード、またはアナログ軸の(軸, 向き)）
+            analog_threshold: アナログ軸を押下とみなす閾値
+            btn: キー・ボタンの状態を返す関数。Noneの場合はpyxel.btn
+            btnv: アナログ軸の値を返す関数。Noneの場合はpyxel.btnv
+        """
+        self.analog_threshold = analog_threshold
+        self._btn = btn or pyxel.btn
+        self._btnv = btnv or pyxel.btnv
+
+        # 入力 -> ビット位置（複数のアクションで共有する入力は1ビットにまとめる）
+        bits = {}
+        self.action_masks = {}
+        for action, sources in bindings.items():
+            mask = 0
+            for source in sources:
+                if source not in bits:
+                    bits[source] = len(bits)
+                mask |= 1 << bits[source]
+            self.action_masks[action] = mask
+
+        # 毎フレーム読み取る入力（キー・ボタンは(コード, ビット)、アナログ軸は(軸, 正方向のビット, 負方向のビット)）
+        self._buttons = [(source, 1 << bit) for source, bit in bits.items() if not isinstance(source, tuple)]
+        axes = {}
+        for source, bit in bits.items():
+            if isinstance(source, tuple):
+                axis, direction = source
+                positive, negative = axes.get(axis, (0, 0))
+                if direction == AXIS_POSITIVE:
+                    positive |= 1 << bit
+                else:
+                    negative |= 1 << bit
+                axes[axis] = (positive, negative)
+        self._axes = [(axis, positive, negative) for axis, (positive, negative) in axes.items()]
+
+        # 1フレームあたりのPyxel呼び出し回数（固定）
+        self.poll_count = len(self._buttons) + len(self._axes)
+
+        # 現在と前フレームの押下状態、押された・離された入力
+        self.held = 0
+        self.prev_held = 0
+        self.pressed = 0
+        self.released = 0
+        # 最後に入力を読み取った時刻（perf_counter。入力から音が鳴るまでの遅延の計測用）
+        self.poll_time = 0.0
+
+    def poll(self):
+        """
+        すべての入力を1回ずつ読み取り、押下・解放の変化を求める
+        毎フレーム1回呼び出す
+        """
+        self.poll_time = perf_counter()
+        btn = self._btn
+        held = 0
+        for code, bit in self._buttons:
+            if btn(code):
+                held |= bit
+        threshold = self.analog_threshold
+        for axis, positive, negative in self._axes:
+            value = self._btnv(axis)
+            if value >= threshold:
+                held |= positive
+            elif value <= -threshold:
+                held |= negative
+
+        self.prev_held = self.held
+        self.held = held
+        self.pressed = held & ~self.prev_held
+        self.released = self.prev_held & ~held
+
+    def is_pressed(self, action):
+        """
+        アクションに割り当てた入力のいずれかがこのフレームで押されたかを判定する
+
+        Args:
+            action: アクション名
+
+        Returns:
+            bool: 新たに押された入力があればTrue
+        """
+        return bool(self.pressed & self.action_masks[action])
+
+    def is_held(self, action):
+        """
+        アクションに割り当てた入力のいずれかが押されているかを判定する
+
+        Args:
+            action: アクション名
+
+        Returns:
+            bool: 押されている入力があればTrue
+        """
+        return bool(self.held & self.action_masks[action])
+
+    def is_released(self, action):
+        """
+        アクションに割り当てた入力のいずれかがこのフレームで離されたかを判定する
+
+        Args:
+            action: アクション名
+
+        Returns:
+            bool: 新たに離された入力があればTrue
+        """
+        return bool(self.released & self.action_masks[action])
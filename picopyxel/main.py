@@ -3,9 +3,16 @@ picopyxel - 8bitスタイルの音楽シーケンサー
 バージョン2.0: 4トラック、パターン管理、ソングモード対応
 """
 
+import os
+
+import precompiled  # noqa: F401  同梱したバイトコードを使うため、他のモジュールより先に読み込む
 import pyxel
 from sequencer import Sequencer
 from input_manager import InputManager
+from backend import PyxelBackend
+from event_log import EventLog
+from frame_profiler import FrameProfiler
+from step_clock import MonotonicClock
 
 
 class PicoPixel:
@@ -13,19 +20,57 @@ class PicoPixel:
     メインアプリケーションクラス
     """
 
-    def __init__(self):
-        """アプリケーションの初期化"""
+    def __init__(self, backend=None, profile_csv=None, library_dir=None, log_file=None, log_level=EventLog.INFO):
+        """
+        アプリケーションの初期化
+
+        Args:
+            backend: 描画・音声・入力のバックエンド。Noneの場合はPyxelBackend（HeadlessBackendならウィンドウなしで動く）
+            profile_csv: 指定した場合は起動時から処理時間を計測し、終了時にこのファイルへCSVで書き出す
+            library_dir: 指定した場合はこのディレクトリのプロジェクトをライブラリモードで切り替えられる
+            log_file: 指定した場合は終了時とF4キーでイベントログをこのファイルへ書き出す（指定しない場合は書き出さない）
+            log_level: イベントログに記録する最低のレベル（EventLog.DEBUGなど）
+        """
+        self.backend = backend or PyxelBackend()
+
         # 画面サイズ設定
         self.WIDTH = 160
         self.HEIGHT = 120
 
         # Pyxel初期化
-        pyxel.init(self.WIDTH, self.HEIGHT, title="PicoPixel v2.0", fps=30)
+        self.backend.init(self.WIDTH, self.HEIGHT, title="PicoPixel v2.0", fps=30)
 
         # シーケンサーとインプットマネージャーの初期化
-        self.sequencer = Sequencer()
+        # フレーム落ちしてもテンポがずれないよう実時間の時計を使う
+        self.sequencer = Sequencer(clock=MonotonicClock(), backend=self.backend)
         self.input_manager = InputManager(self.sequencer)
 
+        # 操作のイベントログ（リングバッファに溜め、終了時かF4キーで書き出す）
+        self.event_log = EventLog(level=log_level)
+        self.input_manager.log = self.event_log
+        self.log_file = log_file
+
+        # フレームごとの処理時間の計測（F3キーでオーバーレイ表示と計測を切り替える）
+        self.profiler = FrameProfiler()
+        self.sequencer.profiler = self.profiler
+        self.profile_csv = profile_csv
+        self.show_profiler = False
+        # オーバーレイに表示する集計結果（毎フレームは集計しない）
+        self._profiler_stats = []
+        if profile_csv:
+            self.profiler.enable()
+
+        # プロジェクトライブラリ（起動時に索引を更新し、変更のあったプロジェクトだけを読み込む）
+        self.library = None
+        if library_dir:
+            # ライブラリを使わない起動を速くするため、使うときだけ読み込む（ファイル入出力のモジュールもまとめて読み込まれる）
+            from project_library import ProjectLibrary
+
+            self.library = ProjectLibrary(library_dir, lambda: Sequencer(clock=MonotonicClock(), backend=self.backend))
+            for name, error in self.library.refresh():
+                self.event_log.warning("library load failed: {} {}", name, error)
+            self.input_manager.library = self.library
+
         # 色の定義
         self.COLOR_BG = 0  # 背景色（黒）
         self.COLOR_TEXT = 7  # テキスト色（白）
@@ -36,223 +81,601 @@ class PicoPixel:
 
         # トラック色
         self.TRACK_COLORS = [10, 9, 8, 12]  # 緑、オレンジ、灰色、青
+        # トラック設定に表示する音色の略称
+        self.TONE_LABELS = {"t": "Tri", "s": "Sqr", "p": "Pls", "n": "Nse"}
 
         # グリッド設定
         self.GRID_X = 10
         self.GRID_Y = 30
         self.CELL_WIDTH = 8
         self.CELL_HEIGHT = 8
-        self.GRID_WIDTH = 16 * self.CELL_WIDTH
+        self.GRID_COLUMNS = 16  # 1画面に表示するステップ数（長いパターンはページを切り替えて表示）
+        self.GRID_WIDTH = self.GRID_COLUMNS * self.CELL_WIDTH
         self.GRID_HEIGHT = 8 * self.CELL_HEIGHT
+        self.ROW_HEIGHT = self.CELL_HEIGHT * 8 / 12  # 12音階分の行の高さ
+
+        # 音階ラベル（上から順）と音色タイプごとの音符色
+        self.ROW_NOTE_NAMES = ["B", "A#", "A", "G#", "G", "F#", "F", "E", "D#", "D", "C#", "C"]
+        self.SOUND_COLORS = [11, 10, 9, 8]  # 水色、緑、オレンジ、灰色
+
+        # グリッドの描画結果を保持するイメージバンク（画面と同じ座標で描画し、毎フレーム転送する）
+        self.GRID_IMAGE = 2
+        self._grid_baked = False
+        # 表示中の(ページ, ページ数)
+        self._grid_page = None
+        # 前回描画した列ごとの状態と音階ラベルの強調状態
+        self._grid_columns = [None] * self.GRID_COLUMNS
+        self._grid_label_note = None
+        # 索引から作った列ごとの音符と、その元になった(パターン, 変更回数, トラック)
+        self._grid_notes = [()] * self.GRID_COLUMNS
+        self._grid_notes_key = None
+        # 描き直したセル数（直近フレームと累計）
+        self.grid_cells_redrawn = 0
+        self.grid_cells_redrawn_total = 0
+
+        # ソングシーケンスの表示（8列 × 2行の範囲だけを描画し、選択位置か再生位置に合わせてスクロールする）
+        self.SONG_VIEW_COLUMNS = 8
+        self.SONG_VIEW_ROWS = 2
+        # 表示している先頭のソング位置と、スクロールの基準にする位置（直前に動いた方）
+        self._song_view_first = 0
+        self._song_view_focus = 0
+        self._song_view_positions = (0, None)
+        # ソング全体のミニマップ（イメージバンクに描いておき、ソングが変わったときだけ描き直す）
+        self.MINIMAP_V = 200
+        self.MINIMAP_HEIGHT = 3
+        self._minimap_key = None
+
+        # オーバーレイの集計間隔（フレーム数）
+        self.PROFILER_REFRESH_FRAMES = 15
 
         # Pyxelアプリ実行
-        pyxel.run(self.update, self.draw)
+        self.backend.run(self.update, self.draw)
 
     def update(self):
         """状態更新（毎フレーム呼び出し）"""
         # 終了判定（ESCキーまたはSTARTボタン長押し）
-        if pyxel.btnp(pyxel.KEY_ESCAPE) or (pyxel.btn(pyxel.GAMEPAD1_BUTTON_START) and pyxel.btn(pyxel.GAMEPAD1_BUTTON_BACK)):
-            pyxel.quit()
+        if self.backend.btnp(pyxel.KEY_ESCAPE) or (
+            self.backend.btn(pyxel.GAMEPAD1_BUTTON_START) and self.backend.btn(pyxel.GAMEPAD1_BUTTON_BACK)
+        ):
+            if self.profile_csv:
+                self.profiler.dump_csv(self.profile_csv)
+            if self.log_file:
+                self.event_log.dump(self.log_file)
+            if self.library is not None:
+                self.library.close()
+            self.backend.quit()
+
+        self.profiler.begin_frame()
 
         # 入力処理
         self.input_manager.update()
+        if self.input_manager.sequencer is not self.sequencer:
+            # ライブラリから別のプロジェクトを開いた
+            self._use_sequencer(self.input_manager.sequencer)
+        self.profiler.lap(FrameProfiler.INPUT)
+
+        # プロファイラー表示の切り替え（F3キー）
+        if self.input_manager.input.is_pressed("profiler"):
+            self.show_profiler = not self.show_profiler
+            if self.show_profiler:
+                self.profiler.enable()
+            elif not self.profile_csv:
+                self.profiler.disable()
+
+        # イベントログの書き出し（F4キー。書き出し先を指定したときだけ書き、作業ディレクトリには勝手に書かない）
+        if self.input_manager.input.is_pressed("log_dump"):
+            if self.log_file:
+                self.event_log.info("event log dump: {}", os.path.abspath(self.log_file))
+                self.event_log.dump(self.log_file)
+            else:
+                self.event_log.warning("event log dump skipped: no log file (set PICOPYXEL_LOG)")
 
         # シーケンサー更新
         self.sequencer.update()
+        self.profiler.lap(FrameProfiler.SEQUENCER)
+
+    def _use_sequencer(self, sequencer):
+        """
+        表示・再生するSequencerを切り替える
+
+        Args:
+            sequencer: 切り替え先のSequencerインスタンス
+        """
+        self.sequencer = sequencer
+        sequencer.profiler = self.profiler
+        # サウンドスロットは他のSequencerが上書きしているため、割り当てを破棄して設定し直させる
+        sequencer.sound_bank.clear()
+        sequencer.compiler.sound_bank.clear()
+        # グリッドの描画結果を作り直させる
+        self._grid_page = None
+        self._grid_columns = [None] * self.GRID_COLUMNS
+        self._grid_label_note = None
+        self._grid_notes_key = None
+        self._minimap_key = None
 
     def draw(self):
         """描画処理（毎フレーム呼び出し）"""
         # 画面クリア
-        pyxel.cls(self.COLOR_BG)
+        self.backend.cls(self.COLOR_BG)
 
         # タイトル描画
-        pyxel.text(5, 5, "PicoPixel v2.0 - 8bit Music Sequencer", self.COLOR_TEXT)
+        self.backend.text(5, 5, "PicoPixel v2.0 - 8bit Music Sequencer", self.COLOR_TEXT)
 
         # 現在のモードを表示
-        mode_names = ["Pattern Edit", "Song Edit", "Track Settings"]
+        mode_names = ["Pattern Edit", "Song Edit", "Track Settings", "Library"]
         mode_name = mode_names[self.input_manager.mode]
-        pyxel.text(5, 15, f"Mode: {mode_name}", self.COLOR_TEXT)
+        self.backend.text(5, 15, f"Mode: {mode_name}", self.COLOR_TEXT)
 
         # 現在のパターン番号を表示
-        pyxel.text(80, 15, f"Pattern: {self.sequencer.current_pattern + 1}", self.COLOR_TEXT)
+        self.backend.text(80, 15, f"Pattern:{self.sequencer.current_pattern + 1}", self.COLOR_TEXT)
 
         # 現在のトラック番号を表示
-        track_color = self.TRACK_COLORS[self.sequencer.current_track]
-        pyxel.text(125, 15, f"Track: {self.sequencer.current_track + 1}", track_color)
+        track_color = self.TRACK_COLORS[self.sequencer.current_track % len(self.TRACK_COLORS)]
+        self.backend.text(125, 15, f"Track: {self.sequencer.current_track + 1}", track_color)
 
         # モードに応じた描画
+        self.profiler.lap(FrameProfiler.DRAW_OTHER)
         if self.input_manager.mode == self.input_manager.MODE_PATTERN_EDIT:
             # シーケンサーグリッド描画
             self._draw_sequencer_grid()
+            self.profiler.lap(FrameProfiler.DRAW_GRID)
         elif self.input_manager.mode == self.input_manager.MODE_SONG_EDIT:
             # ソングシーケンス描画
             self._draw_song_sequence()
+            self.profiler.lap(FrameProfiler.DRAW_SONG)
         elif self.input_manager.mode == self.input_manager.MODE_TRACK_SETTINGS:
             # トラック設定描画
             self._draw_track_settings()
+            self.profiler.lap(FrameProfiler.DRAW_TRACK)
+        elif self.input_manager.mode == self.input_manager.MODE_LIBRARY:
+            # ライブラリ描画（処理時間は共通部分に含める）
+            self._draw_library()
 
         # 共通情報表示
         # 再生状態表示
         status = "PLAYING" if self.sequencer.playing else "STOPPED"
         song_mode = " (SONG)" if self.sequencer.song_mode else " (PATTERN)"
-        pyxel.text(5, self.GRID_Y + self.GRID_HEIGHT + 4, f"Status: {status}{song_mode}", self.COLOR_TEXT)
+        self.backend.text(5, self.GRID_Y + self.GRID_HEIGHT + 4, f"Status: {status}{song_mode}", self.COLOR_TEXT)
 
         # 選択中のステップ表示（パターン編集モードのみ）
         if self.input_manager.mode == self.input_manager.MODE_PATTERN_EDIT:
-            pyxel.text(
+            self.backend.text(
                 5, self.GRID_Y + self.GRID_HEIGHT + 12, f"Step: {self.input_manager.selected_step + 1}", self.COLOR_TEXT
             )
             # 現在選択中の音階表示
-            pyxel.text(45, self.GRID_Y + self.GRID_HEIGHT + 12, f"Note: {self.sequencer.current_note}", self.COLOR_TEXT)
+            self.backend.text(45, self.GRID_Y + self.GRID_HEIGHT + 12, f"Note: {self.sequencer.current_note}", self.COLOR_TEXT)
             # オクターブ表示
-            pyxel.text(5, self.GRID_Y + self.GRID_HEIGHT + 20, f"Oct: {self.sequencer.current_octave}", self.COLOR_TEXT)
+            self.backend.text(5, self.GRID_Y + self.GRID_HEIGHT + 20, f"Oct: {self.sequencer.current_octave}", self.COLOR_TEXT)
 
         # テンポ表示
-        pyxel.text(45, self.GRID_Y + self.GRID_HEIGHT + 20, f"Tempo: {self.sequencer.tempo}", self.COLOR_TEXT)
+        self.backend.text(45, self.GRID_Y + self.GRID_HEIGHT + 20, f"Tempo: {self.sequencer.tempo}", self.COLOR_TEXT)
 
         # トラックごとの音色タイプ表示
-        sound_types = ["Triangle", "Square", "Pulse", "Noise"]
-        sound_type = sound_types[self.sequencer.current_track]
-        sound_color = self.TRACK_COLORS[self.sequencer.current_track]
-        pyxel.text(90, self.GRID_Y + self.GRID_HEIGHT + 20, f"Sound: {sound_type}", sound_color)
+        sound_types = {"t": "Triangle", "s": "Square", "p": "Pulse", "n": "Noise"}
+        sound_type = sound_types[self.sequencer.track_tones[self.sequencer.current_track]]
+        sound_color = self.TRACK_COLORS[self.sequencer.current_track % len(self.TRACK_COLORS)]
+        self.backend.text(90, self.GRID_Y + self.GRID_HEIGHT + 20, f"Sound: {sound_type}", sound_color)
+        self.profiler.lap(FrameProfiler.DRAW_OTHER)
+
+        # プロファイラーのオーバーレイ
+        if self.show_profiler:
+            self._draw_profiler_overlay()
+        self.profiler.end_frame()
+
+    def _draw_profiler_overlay(self):
+        """
+        区間ごとの処理時間（平均・最大、ミリ秒）、フレーム予算の使用率、試聴の最大遅延（ミリ秒）を表示する
+        トラック数がチャンネル数を超える場合は、ボイス割り当てで奪った音と鳴らせなかった音の数も表示する
+        """
+        if not self._profiler_stats or self.profiler.frames % self.PROFILER_REFRESH_FRAMES == 0:
+            self._profiler_stats = self.profiler.stats()
+
+        x = 60
+        y = 22
+        voice_line = self.sequencer.TRACK_COUNT > self.sequencer.CHANNEL_COUNT
+        height = 8 + 7 * (len(self._profiler_stats) + 1 + voice_line)
+        self.backend.rect(x, y, 100, height, self.COLOR_BG)
+        self.backend.rectb(x, y, 100, height, self.COLOR_GRID)
+        self.backend.text(x + 3, y + 3, "section    avg   max", self.COLOR_TEXT)
+        for i, (name, average, maximum) in enumerate(self._profiler_stats):
+            self.backend.text(
+                x + 3, y + 10 + i * 7, f"{name[:10]:<10}{average * 1000:>5.2f}{maximum * 1000:>6.2f}", self.COLOR_TEXT
+            )
+        if self._profiler_stats:
+            usage = self._profiler_stats[-1][1] / FrameProfiler.FRAME_BUDGET
+            latency = self.sequencer.audition_latency_max
+            color = self.COLOR_ACTIVE if usage < 1 else self.COLOR_STEP
+            self.backend.text(
+                x + 3, y + 10 + len(self._profiler_stats) * 7, f"budget {usage:.1%} aud {latency * 1000:.2f}", color
+            )
+        # チャンネル数より多いトラックを鳴らす場合は、奪った音と鳴らせなかった音の数を表示
+        if voice_line:
+            voices = self.sequencer.voices
+            self.backend.text(
+                x + 3,
+                y + 10 + (len(self._profiler_stats) + 1) * 7,
+                f"stolen {voices.stolen} dropped {voices.dropped}",
+                self.COLOR_TEXT,
+            )
 
     def _draw_sequencer_grid(self):
-        """シーケンサーグリッドの描画"""
-        # グリッド背景
-        pyxel.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, self.GRID_HEIGHT + 2, self.COLOR_GRID)
+        """
+        シーケンサーグリッドの描画
+        イメージバンク上のグリッドのうち変化した列だけを描き直し、まとめて画面に転送する
+        """
+        image = self.backend.image(self.GRID_IMAGE)
+        length = self.sequencer.pattern_length()
+        page = min(self.input_manager.selected_step, length - 1) // self.GRID_COLUMNS
+        page_count = (length + self.GRID_COLUMNS - 1) // self.GRID_COLUMNS
+        if not self._grid_baked or self._grid_page != (page, page_count):
+            self._bake_grid_static(image, page, page_count)
+
+        # 音階ラベル描画（現在選択中の音階が変わったときのみ）
+        if self._grid_label_note != self.sequencer.current_note:
+            self._grid_label_note = self.sequencer.current_note
+            image.rect(0, self.GRID_Y, self.GRID_X - 1, self.GRID_HEIGHT, self.COLOR_BG)
+            for i, note in enumerate(self.ROW_NOTE_NAMES):
+                # 現在選択中の音階は強調表示
+                color = self.COLOR_ACTIVE if note == self.sequencer.current_note else self.COLOR_TEXT
+                image.text(self.GRID_X - 9, self.GRID_Y + i * self.ROW_HEIGHT + 1, note, color)
+
+        # 列ごとの音符は音符位置の索引から作り、パターンが変更されたときだけ作り直す
+        patterns = self.sequencer.patterns
+        pattern_idx = self.sequencer.current_pattern
+        current_track = self.sequencer.current_track
+        positions = self.sequencer.note_positions(pattern_idx)
+        notes_key = (pattern_idx, patterns.version(pattern_idx), current_track)
+        if self._grid_notes_key != notes_key:
+            self._grid_notes_key = notes_key
+            self._grid_notes = self._collect_grid_notes(positions, pattern_idx, current_track)
+
+        # 各列の状態（背景色、音符、現在のトラック）が変わった列だけ描き直す
+        playing_step = self.sequencer.current_step if self.sequencer.playing else -1
+        first_step = page * self.GRID_COLUMNS
+        redrawn = 0
+        for x in range(self.GRID_COLUMNS):
+            step_idx = first_step + x
+            notes = ()
+            if step_idx >= length:
+                # パターンの長さを超えた部分
+                cell_color = self.COLOR_GRID
+            elif step_idx == playing_step:
+                # 現在再生中のステップ
+                cell_color = self.COLOR_ACTIVE
+            elif step_idx == self.input_manager.selected_step:
+                # 選択中のステップ
+                cell_color = self.COLOR_STEP
+            else:
+                # 通常のセル
+                cell_color = self.COLOR_BG
+            if step_idx < length:
+                notes = self._grid_notes[step_idx]
+
+            state = (cell_color, notes, current_track)
+            if self._grid_columns[x] != state:
+                self._grid_columns[x] = state
+                self._draw_grid_column(image, x, cell_color, notes, current_track)
+                redrawn += 12
+
+        self.grid_cells_redrawn = redrawn
+        self.grid_cells_redrawn_total += redrawn
+
+        # ラベル・ステップ番号・グリッドをまとめて転送
+        top = self.GRID_Y - 8
+        self.backend.blt(0, top, self.GRID_IMAGE, 0, top, self.GRID_X + self.GRID_WIDTH + 1, self.GRID_HEIGHT + 10)
+
+    def _bake_grid_static(self, image, page=0, page_count=1):
+        """
+        グリッドの変化しない部分（枠、ステップ番号、ページ番号）をイメージバンクに描画する
+
+        Args:
+            image: 描画先のイメージ
+            page: 表示するページ
+            page_count: パターンのページ数
+        """
+        image.cls(self.COLOR_BG)
+        # 同じイメージバンクのミニマップも消えるため描き直させる
+        self._minimap_key = None
 
-        # 音階ラベル描画（全12音階）
-        note_names = ["B", "A#", "A", "G#", "G", "F#", "F", "E", "D#", "D", "C#", "C"]
-        for i, note in enumerate(note_names):
-            # 現在選択中の音階は強調表示
-            color = self.COLOR_ACTIVE if note == self.sequencer.current_note else self.COLOR_TEXT
-            pyxel.text(self.GRID_X - 9, self.GRID_Y + i * (self.CELL_HEIGHT * 8 / 12) + 1, note, color)
+        # グリッド背景
+        image.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, self.GRID_HEIGHT + 2, self.COLOR_GRID)
 
         # ステップ番号描画
-        for i in range(16):
+        for i in range(self.GRID_COLUMNS):
             if i % 4 == 0:  # 4拍子の区切りを強調
-                pyxel.text(self.GRID_X + i * self.CELL_WIDTH, self.GRID_Y - 8, str(i + 1), self.COLOR_TEXT)
-
-        # 各セル描画
-        for x in range(16):
-            for y in range(12):  # 12音階に対応
-                cell_x = self.GRID_X + x * self.CELL_WIDTH
-                cell_y = self.GRID_Y + y * (self.CELL_HEIGHT * 8 / 12)  # 高さを調整
-
-                # セルの背景色決定
-                if x == self.sequencer.current_step and self.sequencer.playing:
-                    # 現在再生中のステップ
-                    cell_color = self.COLOR_ACTIVE
-                elif x == self.input_manager.selected_step:
-                    # 選択中のステップ
-                    cell_color = self.COLOR_STEP
+                step_number = page * self.GRID_COLUMNS + i + 1
+                image.text(self.GRID_X + i * self.CELL_WIDTH, self.GRID_Y - 8, str(step_number), self.COLOR_TEXT)
+
+        # ページ番号描画（複数ページの場合のみ）
+        if page_count > 1:
+            image.text(self.GRID_X + self.GRID_WIDTH - 11, self.GRID_Y - 8, f"{page + 1}/{page_count}", self.COLOR_NOTE)
+
+        self._grid_baked = True
+        self._grid_page = (page, page_count)
+        self._grid_columns = [None] * self.GRID_COLUMNS
+        self._grid_label_note = None
+
+    def _collect_grid_notes(self, positions, pattern_idx, current_track):
+        """
+        音符位置の索引を列ごとの音符に振り分ける
+
+        Args:
+            positions: (ステップ, 音階インデックス) -> トラックのビットマスク
+            pattern_idx: パターン番号
+            current_track: 現在のトラック番号
+
+        Returns:
+            list: 列ごとの(行, トラックのビットマスク, 現在のトラックのオクターブ)のタプル
+        """
+        columns = [[] for _ in range(self.sequencer.pattern_length(pattern_idx))]
+        for (step_idx, note_idx), mask in positions.items():
+            octave = None
+            if mask >> current_track & 1:
+                octave = self.sequencer.patterns.get_pitch(pattern_idx, current_track, step_idx) // 12
+            columns[step_idx].append((11 - note_idx, mask, octave))
+        return [tuple(sorted(notes)) for notes in columns]
+
+    def _draw_grid_column(self, image, x, cell_color, notes, current_track):
+        """
+        グリッドの1列（12音階分のセル）をイメージバンクに描画する
+        セルは縦に重なっているため、上から順に列単位で描き直す
+
+        Args:
+            image: 描画先のイメージ
+            x: ステップ位置
+            cell_color: セルの背景色
+            notes: (行, トラックのビットマスク, 現在のトラックのオクターブ)のタプル
+            current_track: 現在のトラック番号
+        """
+        cell_x = self.GRID_X + x * self.CELL_WIDTH
+        rows = {y: (mask, octave) for y, mask, octave in notes}
+        for y in range(12):  # 12音階に対応
+            cell_y = self.GRID_Y + y * self.ROW_HEIGHT  # 高さを調整
+
+            # セル描画
+            image.rect(cell_x, cell_y, self.CELL_WIDTH - 1, self.CELL_HEIGHT - 1, cell_color)
+
+            # 音符があれば描画（全トラック、オクターブは考慮しない）
+            if y not in rows:
+                continue
+            mask, octave = rows[y]
+            for track_idx in range(self.sequencer.TRACK_COUNT):
+                if not mask >> track_idx & 1:
+                    continue
+
+                # 音色タイプ（トラック番号）に応じた色を使用
+                note_color = self.SOUND_COLORS[track_idx % len(self.SOUND_COLORS)]
+
+                # 現在のトラックの音符は少し大きく表示
+                if track_idx == current_track:
+                    image.rect(cell_x + 1, cell_y + 1, self.CELL_WIDTH - 3, self.ROW_HEIGHT - 3, note_color)
+                    # オクターブ表示（小さい数字）
+                    image.text(cell_x + 2, cell_y + 2, str(octave), self.COLOR_TEXT)
                 else:
-                    # 通常のセル
-                    cell_color = self.COLOR_BG
-
-                # セル描画
-                pyxel.rect(cell_x, cell_y, self.CELL_WIDTH - 1, self.CELL_HEIGHT - 1, cell_color)
-
-                # 音符があれば描画（全トラック）
-                for track_idx in range(self.sequencer.TRACK_COUNT):
-                    step_data = self.sequencer.patterns[self.sequencer.current_pattern][track_idx][x]
-                    if step_data is not None:
-                        note, octave, sound_type = step_data
-                        note_names = ["B", "A#", "A", "G#", "G", "F#", "F", "E", "D#", "D", "C#", "C"]
-
-                        # 音階が一致するか確認（オクターブは考慮しない）
-                        if note == note_names[y]:
-                            # 音色タイプに応じた色を使用
-                            sound_colors = [11, 10, 9, 8]  # 水色、緑、オレンジ、灰色
-                            note_color = sound_colors[sound_type]
-
-                            # 現在のトラックの音符は少し大きく表示
-                            if track_idx == self.sequencer.current_track:
-                                pyxel.rect(
-                                    cell_x + 1, cell_y + 1, self.CELL_WIDTH - 3, self.CELL_HEIGHT * 8 / 12 - 3, note_color
-                                )
-                                # オクターブ表示（小さい数字）
-                                pyxel.text(cell_x + 2, cell_y + 2, str(octave), self.COLOR_TEXT)
-                            else:
-                                # 他のトラックの音符は小さく表示
-                                pyxel.rect(
-                                    cell_x + 2, cell_y + 2, self.CELL_WIDTH - 5, self.CELL_HEIGHT * 8 / 12 - 5, note_color
-                                )
+                    # 他のトラックの音符は小さく表示
+                    image.rect(cell_x + 2, cell_y + 2, self.CELL_WIDTH - 5, self.ROW_HEIGHT - 5, note_color)
 
     def _draw_song_sequence(self):
-        """ソングシーケンスの描画"""
+        """
+        ソングシーケンスの描画
+        表示範囲のソング位置だけを描画し、ソング全体はミニマップで表示する（ソングの長さによらず描画量は一定）
+        """
         # ソングシーケンスの背景
-        pyxel.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, 20, self.COLOR_GRID)
+        self.backend.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, 20, self.COLOR_GRID)
 
         # ソングシーケンスのタイトル
-        pyxel.text(self.GRID_X, self.GRID_Y - 8, "Song Sequence", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X, self.GRID_Y - 8, "Song Sequence", self.COLOR_TEXT)
 
         # ソングシーケンスの内容
-        if not self.sequencer.song_sequence:
-            pyxel.text(self.GRID_X + 5, self.GRID_Y + 5, "No patterns in song", self.COLOR_TEXT)
+        song_sequence = self.sequencer.song_sequence
+        if not song_sequence:
+            self.backend.text(self.GRID_X + 5, self.GRID_Y + 5, "No patterns in song", self.COLOR_TEXT)
         else:
-            # 最大16パターンまで表示
-            display_count = min(16, len(self.sequencer.song_sequence))
-            for i in range(display_count):
-                pattern_idx = self.sequencer.song_sequence[i]
+            first = self._song_view_window()
+            visible = self.SONG_VIEW_COLUMNS * self.SONG_VIEW_ROWS
+            last = min(first + visible, len(song_sequence))
+            playing_position = self.sequencer.song_position if self.sequencer.playing and self.sequencer.song_mode else -1
+            self.backend.text(self.GRID_X + 60, self.GRID_Y - 8, f"{first + 1}-{last}/{len(song_sequence)}", self.COLOR_NOTE)
+            for i in range(first, last):
+                pattern_idx = song_sequence[i]
 
                 # 位置計算
-                pos_x = self.GRID_X + (i % 8) * 18
-                pos_y = self.GRID_Y + (i // 8) * 10
+                pos_x = self.GRID_X + (i % self.SONG_VIEW_COLUMNS) * 18
+                pos_y = self.GRID_Y + (i - first) // self.SONG_VIEW_COLUMNS * 10
 
                 # 背景色（選択中の位置は強調）
                 bg_color = self.COLOR_ACTIVE if i == self.input_manager.song_edit_position else self.COLOR_BG
-                pyxel.rect(pos_x, pos_y, 16, 8, bg_color)
+                self.backend.rect(pos_x, pos_y, 16, 8, bg_color)
 
-                # パターン番号表示
-                pyxel.text(pos_x + 2, pos_y + 1, f"P{pattern_idx + 1}", self.COLOR_TEXT)
+                # パターン番号表示（繰り返す位置は枠の色を変える）
+                self.backend.text(pos_x + 2, pos_y + 1, f"P{pattern_idx + 1}", self.COLOR_TEXT)
+                if self.sequencer.song_repeat(i) > 1:
+                    self.backend.rectb(pos_x, pos_y, 16, 8, self.COLOR_STEP)
 
                 # 現在再生中のパターンをマーク
-                if self.sequencer.playing and self.sequencer.song_mode and i == self.sequencer.song_position:
-                    pyxel.rectb(pos_x - 1, pos_y - 1, 18, 10, self.COLOR_NOTE)
+                if i == playing_position:
+                    self.backend.rectb(pos_x - 1, pos_y - 1, 18, 10, self.COLOR_NOTE)
+
+            self._draw_song_minimap(first, last, playing_position)
 
         # 操作ガイド
-        pyxel.text(self.GRID_X, self.GRID_Y + 25, "Enter: Add pattern", self.COLOR_TEXT)
-        pyxel.text(self.GRID_X, self.GRID_Y + 35, "Del: Remove pattern", self.COLOR_TEXT)
-        pyxel.text(self.GRID_X, self.GRID_Y + 45, "Ctrl+D: Clear all", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X, self.GRID_Y + 25, "Enter: Add pattern", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X, self.GRID_Y + 35, "Del: Remove  Ctrl+L/R: Page", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X, self.GRID_Y + 45, "Ctrl+D: Clear all", self.COLOR_TEXT)
+        if song_sequence:
+            repeat = self.sequencer.song_repeat(self.input_manager.song_edit_position)
+            self.backend.text(self.GRID_X, self.GRID_Y + 55, f"Up/Down: Repeat x{repeat}  Space: Play here", self.COLOR_TEXT)
+
+    def _song_view_window(self):
+        """
+        ソングシーケンスの表示範囲を決める
+        選択位置と再生位置のうち直前に動いた方が見えるよう、行単位で最小限だけスクロールする
+
+        Returns:
+            int: 表示する先頭のソング位置
+        """
+        edit_position = self.input_manager.song_edit_position
+        playing_position = self.sequencer.song_position if self.sequencer.playing and self.sequencer.song_mode else None
+        last_edit, last_playing = self._song_view_positions
+        if edit_position != last_edit:
+            self._song_view_focus = edit_position
+        elif playing_position is not None and playing_position != last_playing:
+            self._song_view_focus = playing_position
+        self._song_view_positions = (edit_position, playing_position)
+
+        columns = self.SONG_VIEW_COLUMNS
+        row = self._song_view_focus // columns
+        first_row = self._song_view_first // columns
+        if row < first_row:
+            first_row = row
+        elif row >= first_row + self.SONG_VIEW_ROWS:
+            first_row = row - self.SONG_VIEW_ROWS + 1
+        # ソングの末尾より先はスクロールしない
+        last_row = (len(self.sequencer.song_sequence) - 1) // columns
+        first_row = max(0, min(first_row, last_row - self.SONG_VIEW_ROWS + 1))
+        self._song_view_first = first_row * columns
+        return self._song_view_first
+
+    def _draw_song_minimap(self, first, last, playing_position):
+        """
+        ソング全体のミニマップ（パターン番号ごとの色）と表示範囲・再生位置を描画する
+        ミニマップはソングが変わったときだけイメージバンクに描き直し、毎フレームは転送するだけにする
+
+        Args:
+            first: 表示範囲の先頭のソング位置
+            last: 表示範囲の末尾の次のソング位置
+            playing_position: 再生中のソング位置（再生していなければ-1）
+        """
+        song_sequence = self.sequencer.song_sequence
+        count = len(song_sequence)
+        width = self.GRID_WIDTH
+        key = (self.sequencer.song_version, count)
+        if self._minimap_key != key:
+            self._minimap_key = key
+            # 1列に入るソング位置のうち先頭のパターンの色で描き、同じ色が続く列はまとめる
+            image = self.backend.image(self.GRID_IMAGE)
+            image.rect(0, self.MINIMAP_V, width, self.MINIMAP_HEIGHT, self.COLOR_BG)
+            run_start = 0
+            run_color = None
+            for x in range(width + 1):
+                color = song_sequence[x * count // width] % 15 + 1 if x < width else None
+                if color != run_color:
+                    if run_color is not None:
+                        image.rect(run_start, self.MINIMAP_V, x - run_start, self.MINIMAP_HEIGHT, run_color)
+                    run_start, run_color = x, color
+
+        y = self.GRID_Y + 20
+        self.backend.blt(self.GRID_X, y, self.GRID_IMAGE, 0, self.MINIMAP_V, width, self.MINIMAP_HEIGHT)
+        # 表示範囲の枠と再生位置
+        view_x = first * width // count
+        view_width = max(2, last * width // count - view_x)
+        self.backend.rectb(self.GRID_X + view_x, y - 1, view_width, self.MINIMAP_HEIGHT + 2, self.COLOR_TEXT)
+        if playing_position >= 0:
+            self.backend.rect(
+                self.GRID_X + playing_position * width // count, y - 1, 1, self.MINIMAP_HEIGHT + 2, self.COLOR_NOTE
+            )
 
     def _draw_track_settings(self):
         """トラック設定の描画"""
         # トラック設定の背景
-        pyxel.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, 50, self.COLOR_GRID)
+        self.backend.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, 46, self.COLOR_GRID)
 
         # トラック設定のタイトル
-        pyxel.text(self.GRID_X, self.GRID_Y - 8, "Track Settings", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X, self.GRID_Y - 8, "Track Settings", self.COLOR_TEXT)
 
-        # 各トラックの設定を表示
-        for i in range(self.sequencer.TRACK_COUNT):
+        # 各トラックの設定を表示（5トラック以上の場合は現在のトラックが見える範囲の4トラック）
+        first = max(0, min(self.sequencer.current_track - 1, self.sequencer.TRACK_COUNT - 4))
+        for row, i in enumerate(range(first, min(first + 4, self.sequencer.TRACK_COUNT))):
             # 位置計算
             pos_x = self.GRID_X + 5
-            pos_y = self.GRID_Y + i * 10 + 5
+            pos_y = self.GRID_Y + row * 10 + 5
 
             # トラック番号と色
-            track_color = self.TRACK_COLORS[i]
+            track_color = self.TRACK_COLORS[i % len(self.TRACK_COLORS)]
 
             # 背景色（現在選択中のトラックは強調）
             bg_color = self.COLOR_ACTIVE if i == self.sequencer.current_track else self.COLOR_BG
-            pyxel.rect(pos_x - 2, pos_y - 2, self.GRID_WIDTH - 6, 10, bg_color)
+            self.backend.rect(pos_x - 2, pos_y - 2, self.GRID_WIDTH - 6, 10, bg_color)
 
-            # トラック情報表示
-            pyxel.text(pos_x, pos_y, f"Track {i + 1}", track_color)
+            # トラック情報表示（番号、音色、優先度）
+            self.backend.text(pos_x, pos_y, f"Track {i + 1}", track_color)
+            self.backend.text(pos_x + 36, pos_y, self.TONE_LABELS[self.sequencer.track_tones[i]], self.COLOR_TEXT)
+            self.backend.text(pos_x + 52, pos_y, f"P{self.sequencer.track_priorities[i]}", self.COLOR_TEXT)
 
             # 音量バー
             volume = self.sequencer.track_volumes[i]
-            pyxel.text(pos_x + 50, pos_y, f"Volume: {volume}", self.COLOR_TEXT)
+            self.backend.text(pos_x + 64, pos_y, f"Vol {volume}", self.COLOR_TEXT)
 
             # 音量バーの描画
-            bar_x = pos_x + 100
+            bar_x = pos_x + 88
             bar_width = volume * 5  # 0-7の音量を視覚化
-            pyxel.rect(bar_x, pos_y, bar_width, 5, track_color)
-            pyxel.rectb(bar_x - 1, pos_y - 1, 36, 7, self.COLOR_GRID)
-
-        # 操作ガイド
-        pyxel.text(self.GRID_X, self.GRID_Y + 45, "Up/Down: Adjust volume", self.COLOR_TEXT)
+            self.backend.rect(bar_x, pos_y, bar_width, 5, track_color)
+            self.backend.rectb(bar_x - 1, pos_y - 1, 36, 7, self.COLOR_GRID)
+
+        # 操作ガイド（ステータス行に重ならないよう3行に収める）
+        self.backend.text(
+            self.GRID_X, self.GRID_Y + 46, f"Up/Down: Volume  L/R: Length {self.sequencer.pattern_length()}", self.COLOR_TEXT
+        )
+        self.backend.text(self.GRID_X, self.GRID_Y + 53, "Ctrl+Up/Down: Priority  Enter: Tone", self.COLOR_TEXT)
+        self.backend.text(
+            self.GRID_X,
+            self.GRID_Y + 60,
+            f"Ctrl+L/R: Tracks {self.sequencer.TRACK_COUNT}/{self.sequencer.MAX_TRACK_COUNT}",
+            self.COLOR_TEXT,
+        )
+
+    def _draw_library(self):
+        """ライブラリ（プロジェクト一覧と選択中のプロジェクトの情報）の描画"""
+        library = self.library
+        self.backend.rectb(self.GRID_X - 1, self.GRID_Y - 1, self.GRID_WIDTH + 2, 42, self.COLOR_GRID)
+        self.backend.text(self.GRID_X, self.GRID_Y - 8, "Library", self.COLOR_TEXT)
+
+        names = library.names()
+        if not names:
+            self.backend.text(self.GRID_X + 5, self.GRID_Y + 5, "No projects", self.COLOR_TEXT)
+            return
+
+        # 選択中の項目が見える範囲の5件を表示する
+        position = min(self.input_manager.library_position, len(names) - 1)
+        first = max(0, min(position - 2, len(names) - 5))
+        for i, name in enumerate(names[first : first + 5]):
+            pos_y = self.GRID_Y + i * 8
+            if first + i == position:
+                self.backend.rect(self.GRID_X, pos_y, self.GRID_WIDTH, 8, self.COLOR_ACTIVE)
+            # 開いているプロジェクトは色を変え、メモリにあるプロジェクトには*を付ける
+            color = self.COLOR_NOTE if name == library.active else self.COLOR_TEXT
+            mark = "*" if library.is_cached(name) else " "
+            self.backend.text(self.GRID_X + 2, pos_y + 1, f"{mark}{library.entries[name]['name'][:29]}", color)
+
+        # 選択中のプロジェクトの情報と先頭パターンのサムネイル
+        entry = library.entries[names[position]]
+        self.backend.text(
+            self.GRID_X,
+            self.GRID_Y + 43,
+            f"Tempo {entry['tempo']}  Pat {entry['pattern_count']}  Song {entry['song_length']}",
+            self.COLOR_TEXT,
+        )
+        for track_idx, pitches in enumerate(entry["thumbnail"]):
+            for step_idx, pitch in enumerate(pitches):
+                if pitch >= 0:
+                    self.backend.rect(
+                        self.GRID_X + step_idx * 3,
+                        self.GRID_Y + 51 + track_idx * 3,
+                        2,
+                        2,
+                        self.TRACK_COLORS[track_idx % len(self.TRACK_COLORS)],
+                    )
+        self.backend.text(self.GRID_X + 54, self.GRID_Y + 51, "Enter: Open", self.COLOR_TEXT)
+        self.backend.text(self.GRID_X + 54, self.GRID_Y + 58, "*: in memory", self.COLOR_TEXT)
 
 
 if __name__ == "__main__":
-    PicoPixel()
+    # PICOPYXEL_PROFILE_CSVを指定すると処理時間を計測し、終了時にCSVへ書き出す
+    # PICOPYXEL_LIBRARYを指定するとそのディレクトリのプロジェクトをライブラリモードで切り替えられる
+    # PICOPYXEL_LOGを指定すると終了時にイベントログを書き出し、PICOPYXEL_LOG_LEVEL（debug/info/warning/off）で記録するレベルを変える
+    PicoPixel(
+        profile_csv=os.environ.get("PICOPYXEL_PROFILE_CSV"),
+        library_dir=os.environ.get("PICOPYXEL_LIBRARY"),
+        log_file=os.environ.get("PICOPYXEL_LOG"),
+        log_level=EventLog.parse_level(os.environ.get("PICOPYXEL_LOG_LEVEL", "info")),
+    )
@@ -0,0 +1,541 @@
+"""
+MIDI入出力モジュール - Standard MIDI File(.mid)をストリームとして読み込み、Sequencerのパターンとソングに変換・書き出しする
+
+読み込みはファイルを固定サイズのバッファ単位で読み進め、イベントを1つずつ16分音符のステップに量子化して
+トラックごとのステップ列（1ステップ1バイト）に書き込む。MIDIデータ全体をメモリに読み込まない
+"""
+
+import struct
+
+from sequencer import Sequencer
+
+# 読み込み時のバッファサイズ（バイト）
+BUFFER_SIZE = 64 * 1024
+
+# 書き出し時の4分音符あたりのティック数（1ステップ = 16分音符）
+EXPORT_DIVISION = 96
+
+# ドラム（ノイズトラック）に使うMIDIチャンネル（0始まり）
+DRUM_CHANNEL = 9
+
+# MIDIノート番号とSequencerの音高（オクターブ × 12 + 音階）の差（音高33 = A2 = 440Hz = MIDIノート69）
+NOTE_OFFSET = 36
+
+# 1イベントの先頭（デルタタイム、ステータス、データ、メタイベントの種類と長さ）の最大バイト数
+_EVENT_HEADER_SIZE = 16
+
+# 音色ごとのトラック名
+_TONE_NAMES = {"t": b"Triangle", "s": b"Square", "p": b"Pulse", "n": b"Noise"}
+
+
+class _ChunkReader:
+    """
+    チャンクの内容をバッファ単位で読み進めるクラス
+    """
+
+    def __init__(self, f, size):
+        """
+        リーダーの初期化
+
+        Args:
+            f: 読み込み中のファイル（チャンクの内容の先頭に位置していること）
+            size: チャンクの長さ
+        """
+        self.f = f
+        self.remaining = size
+        self.buf = b""
+        self.pos = 0
+
+    def fill(self, count):
+        """
+        バッファに未読のバイトがcount以上あるようにする（チャンクの末尾ではそれより少ないことがある）
+
+        Args:
+            count: 必要なバイト数
+        """
+        available = len(self.buf) - self.pos
+        if available >= count or not self.remaining:
+            return
+        data = self.f.read(min(self.remaining, max(BUFFER_SIZE, count - available)))
+        if not data:
+            self.remaining = 0
+            return
+        self.remaining -= len(data)
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+
+    def read(self, count):
+        """
+        指定バイト数を読む
+
+        Args:
+            count: バイト数
+
+        Returns:
+            bytes: 読んだデータ
+        """
+        self.fill(count)
+        data = self.buf[self.pos : self.pos + count]
+        self.pos += len(data)
+        return data
+
+    def skip(self, count):
+        """
+        指定バイト数を読み飛ばす（バッファに入っていない分はファイル上で飛ばす）
+
+        Args:
+            count: バイト数
+        """
+        available = len(self.buf) - self.pos
+        if count <= available:
+            self.pos += count
+            return
+        count = min(count - available, self.remaining)
+        self.f.seek(count, 1)
+        self.remaining -= count
+        self.buf = b""
+        self.pos = 0
+
+    def skip_rest(self):
+        """チャンクの残りを読み飛ばし、ファイルを次のチャンクの先頭に位置させる"""
+        if self.remaining:
+            self.f.seek(self.remaining, 1)
+            self.remaining = 0
+        self.buf = b""
+        self.pos = 0
+
+
+def iter_midi_events(filename):
+    """
+    Standard MIDI Fileのイベントを1つずつ返す（ファイル全体は読み込まない）
+
+    Args:
+        filename: MIDIファイル名
+
+    Yields:
+        tuple: ("header", 形式, トラック数, 4分音符あたりのティック数)を最初に1回、
+            以降は(トラック番号, 絶対ティック, ステータス, データ)。データはチャンネルメッセージなら(データ1, データ2)、
+            メタイベントなら(種類, 内容のbytes)、SysExならNone
+
+    Raises:
+        ValueError: MIDIファイルでない場合、またはSMPTE形式の時間単位の場合
+    """
+    with open(filename, "rb") as f:
+        chunk_type, size = struct.unpack(">4sI", f.read(8))
+        if chunk_type != b"MThd" or size < 6:
+            raise ValueError(f"not a standard MIDI file: {filename}")
+        midi_format, track_count, division = struct.unpack(">HHH", f.read(6))
+        f.seek(size - 6, 1)
+        if division & 0x8000:
+            raise ValueError(f"SMPTE time division is not supported: {filename}")
+        yield ("header", midi_format, track_count, division)
+
+        track_idx = 0
+        while track_idx < track_count:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk_type, size = struct.unpack(">4sI", header)
+            if chunk_type != b"MTrk":
+                # 未知のチャンクは読み飛ばす
+                f.seek(size, 1)
+                continue
+            reader = _ChunkReader(f, size)
+            yield from _iter_track_events(reader, track_idx)
+            # トラックの終わりより後ろにデータがあるチャンクでも、次のチャンクから読む
+            reader.skip_rest()
+            track_idx += 1
+
+
+def _iter_track_events(reader, track_idx):
+    """
+    1トラック分のイベントを返す
+    ノートなどのチャンネルメッセージはバッファを直接読み、長さが大きくなりうるメタイベントとSysExだけリーダー経由で読む
+
+    Args:
+        reader: トラックチャンクの_ChunkReader
+        track_idx: トラック番号
+
+    Yields:
+        tuple: (トラック番号, 絶対ティック, ステータス, データ)
+    """
+    tick = 0
+    running_status = 0
+    buf = reader.buf
+    pos = reader.pos
+    while True:
+        if len(buf) - pos < _EVENT_HEADER_SIZE:
+            reader.pos = pos
+            reader.fill(_EVENT_HEADER_SIZE)
+            buf = reader.buf
+            pos = reader.pos
+            if pos >= len(buf):
+                break
+        try:
+            # デルタタイム（可変長数値）
+            byte = buf[pos]
+            pos += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = buf[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            status = buf[pos]
+            if status < 0x80:
+                # ランニングステータス（直前のチャンネルメッセージのステータスを使う）
+                status = running_status
+            else:
+                pos += 1
+
+            if 0x80 <= status < 0xF0:
+                running_status = status
+                if 0xC0 <= status < 0xE0:
+                    data = (buf[pos], 0)
+                    pos += 1
+                else:
+                    data = (buf[pos], buf[pos + 1])
+                    pos += 2
+                yield (track_idx, tick, status, data)
+                continue
+
+            if status == 0xFF:
+                meta_type = buf[pos]
+                pos += 1
+            elif status not in (0xF0, 0xF7):
+                # ランニングステータスがないデータバイトは読み飛ばす
+                pos += 1
+                continue
+            length = 0
+            byte = 0x80
+            while byte & 0x80:
+                byte = buf[pos]
+                pos += 1
+                length = (length << 7) | (byte & 0x7F)
+        except IndexError:
+            # 途中で切れたトラックはそこまでで終える
+            break
+
+        reader.pos = pos
+        if status == 0xFF:
+            yield (track_idx, tick, status, (meta_type, reader.read(length)))
+        else:
+            running_status = 0
+            reader.skip(length)
+            yield (track_idx, tick, status, None)
+        buf = reader.buf
+        pos = reader.pos
+        if status == 0xFF and meta_type == 0x2F:
+            # トラックの終わり
+            break
+
+
+def midi_note_to_pitch(note):
+    """
+    MIDIノート番号をSequencerの音高に変換する（範囲外はオクターブを移して収める）
+
+    Args:
+        note: MIDIノート番号（0-127）
+
+    Returns:
+        int: 音高（0-59）
+    """
+    pitch = note - NOTE_OFFSET
+    while pitch < 0:
+        pitch += 12
+    while pitch >= (Sequencer.MAX_OCTAVE + 1) * 12:
+        pitch -= 12
+    return pitch
+
+
+# MIDIノート番号ごとの音高 + 1（ステップ列に書き込む値）
+_NOTE_VALUES = bytes(midi_note_to_pitch(note) + 1 for note in range(128))
+
+
+def import_midi(filename, sequencer=None):
+    """
+    MIDIファイルを読み込み、16分音符のステップに量子化してパターンとソングに変換する
+    チャンネル10（ドラム）はノイズトラック、それ以外のチャンネルは出てきた順にノイズ以外のトラックに割り当てる
+    同じステップ・トラックに複数の音がある場合は最も高い音を残す。ノートオフと音の長さは使わない
+    ソングの長さはトラックの終わり（End of Track）までとし、末尾の休符だけのパターンも残す
+    パターンは既定の長さごとに区切り、同じ内容のパターンは1つにまとめ、続けて同じパターンが並ぶ部分は繰り返し回数にする
+    異なるパターンの数がパターン数を超えた場合は、そこから先をソングに含めない
+
+    Args:
+        filename: MIDIファイル名
+        sequencer: 読み込み先のSequencerインスタンス。Noneの場合は新規作成
+
+    Returns:
+        Sequencer: 読み込んだSequencerインスタンス
+
+    Raises:
+        ValueError: MIDIファイルでない場合
+    """
+    if sequencer is None:
+        sequencer = Sequencer()
+    track_count = sequencer.TRACK_COUNT
+    # ドラムはノイズ音色のトラック（なければ最後のトラック）、それ以外のチャンネルはノイズ以外のトラックに割り当てる
+    tones = sequencer.track_tones
+    drum_track = tones.index("n") if "n" in tones else track_count - 1
+    melodic_tracks = [track_idx for track_idx, tone in enumerate(tones) if tone != "n"] or [drum_track]
+
+    # トラックごとのステップ列（音高 + 1、0は空）
+    grids = [bytearray() for _ in range(track_count)]
+    channel_tracks = {}
+    ticks_per_step = 1
+    tempo = None
+    # トラックの終わりの最も遅いティック
+    end_tick = 0
+
+    for event in iter_midi_events(filename):
+        if event[0] == "header":
+            ticks_per_step = max(1, event[3] // 4)
+            continue
+        _, tick, status, data = event
+        if status == 0xFF:
+            if data[0] == 0x51 and tempo is None and len(data[1]) == 3:
+                # 最初のテンポ指定（4分音符あたりのマイクロ秒）
+                tempo = 60_000_000 / int.from_bytes(data[1], "big")
+            elif data[0] == 0x2F:
+                end_tick = max(end_tick, tick)
+            continue
+        if status & 0xF0 != 0x90 or not data[1]:
+            # ノートオン以外（ベロシティ0のノートオンはノートオフ）
+            continue
+
+        channel = status & 0x0F
+        track_idx = channel_tracks.get(channel)
+        if track_idx is None:
+            if channel == DRUM_CHANNEL:
+                track_idx = drum_track
+            else:
+                melodic_count = sum(1 for other in channel_tracks if other != DRUM_CHANNEL)
+                track_idx = melodic_tracks[melodic_count % len(melodic_tracks)]
+            channel_tracks[channel] = track_idx
+
+        # 最も近い16分音符に量子化する
+        step = (tick + ticks_per_step // 2) // ticks_per_step
+        grid = grids[track_idx]
+        if step >= len(grid):
+            grid.extend(bytes(step + 1 - len(grid)))
+        value = _NOTE_VALUES[data[0]]
+        if value > grid[step]:
+            grid[step] = value
+
+    _grids_to_song(sequencer, grids, (end_tick + ticks_per_step // 2) // ticks_per_step)
+    if tempo is not None:
+        # Sequencerのテンポは1分あたりのステップ数（16分音符の数）
+        sequencer.tempo = max(sequencer.MIN_TEMPO, min(sequencer.MAX_TEMPO, round(tempo * 4)))
+    return sequencer
+
+
+def _grids_to_song(sequencer, grids, total_steps=0):
+    """
+    トラックごとのステップ列をパターンとソングに変換する
+    読み込んだ音は編集履歴に記録しない（読み込み後に履歴を消すため）
+
+    Args:
+        sequencer: 変換先のSequencerインスタンス
+        grids: トラックごとのステップ列（音高 + 1、0は空）
+        total_steps: ソングのステップ数（音のある最後のステップまでより短い場合は無視する）
+    """
+    store = sequencer.patterns
+    length = store.step_count
+    total_steps = max([total_steps] + [len(grid) for grid in grids])
+    pattern_total = max(1, -(-total_steps // length))
+
+    recorder = store.recorder
+    store.recorder = None
+    try:
+        _fill_patterns(sequencer, grids, pattern_total)
+    finally:
+        store.recorder = recorder
+    sequencer.song_position = 0
+    sequencer.song_step = 0
+    sequencer.current_pattern = 0
+    sequencer.compiler.mark_all_dirty()
+    sequencer.song_version += 1
+    sequencer.history.reset()
+
+
+def _fill_patterns(sequencer, grids, pattern_total):
+    """
+    ステップ列をパターンの長さごとに区切り、パターンとソングシーケンスに書き込む
+
+    Args:
+        sequencer: 変換先のSequencerインスタンス
+        grids: トラックごとのステップ列（音高 + 1、0は空）
+        pattern_total: 区切ったパターンの数
+    """
+    store = sequencer.patterns
+    length = store.step_count
+    store.clear_all()
+    song_sequence = []
+    song_repeats = []
+    patterns = {}
+    for block_idx in range(pattern_total):
+        start = block_idx * length
+        tracks = [grid[start : start + length].ljust(length, b"\0") for grid in grids]
+        key = b"".join(tracks)
+        pattern_idx = patterns.get(key)
+        if pattern_idx is None:
+            pattern_idx = len(patterns)
+            if pattern_idx >= sequencer.PATTERN_COUNT:
+                # パターンが足りない部分は読み込まない
+                break
+            patterns[key] = pattern_idx
+            for track_idx, track in enumerate(tracks):
+                for step_idx, value in enumerate(track):
+                    if value:
+                        store.set_pitch(pattern_idx, track_idx, step_idx, value - 1)
+
+        # 続けて同じパターンが並ぶ部分は繰り返し回数にまとめる
+        if song_sequence and song_sequence[-1] == pattern_idx and song_repeats[-1] < sequencer.MAX_SONG_REPEAT:
+            song_repeats[-1] += 1
+        else:
+            song_sequence.append(pattern_idx)
+            song_repeats.append(1)
+
+    sequencer.song_sequence = song_sequence
+    sequencer.song_repeats = song_repeats
+
+
+def _varlen(value):
+    """
+    可変長数値に変換する
+
+    Args:
+        value: 値
+
+    Returns:
+        bytes: 可変長数値
+    """
+    data = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        data.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(data)
+
+
+def _write_chunk(f, events):
+    """
+    トラックチャンクを書き込む（長さは書き終えてから埋める）
+
+    Args:
+        f: 書き込み先のファイル
+        events: トラックの内容のbytesを順に返すイテラブル（最後はトラックの終わりのイベント）
+    """
+    f.write(b"MTrk\0\0\0\0")
+    start = f.tell()
+    buffer = bytearray()
+    for data in events:
+        buffer += data
+        if len(buffer) >= BUFFER_SIZE:
+            f.write(buffer)
+            buffer.clear()
+    f.write(buffer)
+    end = f.tell()
+    f.seek(start - 4)
+    f.write(struct.pack(">I", end - start))
+    f.seek(end)
+
+
+def _export_channels(sequencer):
+    """
+    トラックごとのMIDIチャンネルを決める（ノイズ音色はチャンネル10、それ以外はチャンネル10を除いて順に割り当てる）
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+
+    Returns:
+        list: トラックごとのMIDIチャンネル（0始まり）
+    """
+    melodic_channels = [channel for channel in range(16) if channel != DRUM_CHANNEL]
+    channels = []
+    for tone in sequencer.track_tones:
+        if tone == "n":
+            channels.append(DRUM_CHANNEL)
+        else:
+            channels.append(melodic_channels[sum(1 for other in channels if other != DRUM_CHANNEL) % len(melodic_channels)])
+    return channels
+
+
+def _end_of_track(delta):
+    """
+    トラックの終わりのイベントを返す
+
+    Args:
+        delta: 直前のイベントからのティック数
+
+    Returns:
+        bytes: イベント
+    """
+    return _varlen(delta) + b"\xff\x2f\x00"
+
+
+def _track_events(sequencer, track_idx, channel, pattern_order, ticks_per_step):
+    """
+    1トラック分のノートイベントを順に返す（1ステップの長さで発音する）
+    末尾の休符はトラックの終わりのイベントまでの時間として残す
+    音量0（ミュート）のトラックも音を失わないよう、ベロシティ1で書き出す
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+        track_idx: トラック番号
+        channel: MIDIチャンネル
+        pattern_order: 書き出すパターンの並び
+        ticks_per_step: 1ステップのティック数
+
+    Yields:
+        bytes: イベント
+    """
+    volume = sequencer.track_volumes[track_idx]
+    name = _TONE_NAMES[sequencer.track_tones[track_idx]]
+    yield b"\x00\xff\x03" + _varlen(len(name)) + name
+    velocity = max(1, round(volume * 127 / sequencer.MAX_VOLUME))
+    note_on = bytes([0x90 | channel])
+    note_off = bytes([0x80 | channel])
+    pitches = {}
+    delta = 0
+    for pattern_idx in pattern_order:
+        track = pitches.get(pattern_idx)
+        if track is None:
+            track = pitches[pattern_idx] = sequencer.patterns.track_pitches(pattern_idx, track_idx)
+        for pitch in track:
+            if pitch < 0:
+                delta += ticks_per_step
+                continue
+            note = pitch + NOTE_OFFSET
+            yield _varlen(delta) + note_on + bytes([note, velocity])
+            yield _varlen(ticks_per_step) + note_off + bytes([note, 0])
+            delta = 0
+    yield _end_of_track(delta)
+
+
+def export_midi(sequencer, filename):
+    """
+    ソング（ソングが空なら現在のパターン）をStandard MIDI File（形式1）に書き出す
+    1ステップを16分音符とし、ノイズ音色のトラックはチャンネル10（ドラム）、それ以外はチャンネル1から順に割り当てる
+    イベントはバッファ単位でファイルに書き込み、ソング全体をメモリに展開しない
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+        filename: 出力ファイル名
+    """
+    if sequencer.song_sequence:
+        pattern_order = sequencer.song_timeline().sound_patterns()
+    else:
+        pattern_order = [sequencer.current_pattern]
+    ticks_per_step = EXPORT_DIVISION // 4
+    # Sequencerのテンポ（1分あたりのステップ数）を4分音符あたりのマイクロ秒にする
+    microseconds = round(60_000_000 * 4 / sequencer.tempo)
+
+    with open(filename, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 1, sequencer.TRACK_COUNT + 1, EXPORT_DIVISION))
+        # テンポトラックもソングの最後で終える
+        total_ticks = sum(sequencer.patterns.length(pattern_idx) for pattern_idx in pattern_order) * ticks_per_step
+        _write_chunk(f, [b"\x00\xff\x51\x03" + microseconds.to_bytes(3, "big"), _end_of_track(total_ticks)])
+        for track_idx, channel in enumerate(_export_channels(sequencer)):
+            _write_chunk(f, _track_events(sequencer, track_idx, channel, pattern_order, ticks_per_step))
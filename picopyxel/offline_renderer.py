@@ -0,0 +1,285 @@
+"""
+オフラインレンダラーモジュール - ウィンドウやオーディオデバイスなしでソングをWAVに書き出す
+"""
+
+import wave
+from array import array
+
+from pattern_store import EMPTY
+from voice_allocator import VoiceAllocator
+
+
+class OfflineRenderer:
+    """
+    Sequencerの内容をPyxelと同じ音色・音量で合成してPCMデータにするクラス
+    どのトラックの音をどのチャンネルで鳴らすかはアプリと同じVoiceAllocatorで決め、チャンネルを奪われた音はそこで止める
+    ステップをまたいで鳴り続ける音は次のステップにも続けて書き込む
+    ステップ単位でバッファを丸ごと生成し、同じ内容のステップは生成済みのバッファを再利用する
+    """
+
+    # 出力サンプリングレート（Pyxelと同じ）
+    SAMPLE_RATE = 22050
+
+    # 1チャンネルあたりの最大振幅（Pyxelのチャンネル既定ゲイン0.125に合わせる）
+    CHANNEL_GAIN = 0.125
+
+    # 波形テーブルの長さ
+    WAVE_LENGTH = 32
+
+    # ノイズの1周期あたりのシフトレジスタ更新回数
+    NOISE_SHIFTS_PER_CYCLE = 4
+
+    # 生成済みのノイズ波形
+    _noise_cache = None
+
+    def __init__(self, sequencer, sample_rate=SAMPLE_RATE):
+        """
+        レンダラーの初期化
+
+        Args:
+            sequencer: 書き出し対象のSequencerインスタンス
+            sample_rate: 出力サンプリングレート
+        """
+        self.sequencer = sequencer
+        self.sample_rate = sample_rate
+        # 音色 -> 波形テーブル（-1.0〜1.0）
+        self.wave_tables = {
+            "t": [1 - 4 * abs(i / self.WAVE_LENGTH - 0.5) for i in range(self.WAVE_LENGTH)],
+            "s": [1.0 if i < self.WAVE_LENGTH // 2 else -1.0 for i in range(self.WAVE_LENGTH)],
+            "p": [1.0 if i < self.WAVE_LENGTH // 4 else -1.0 for i in range(self.WAVE_LENGTH)],
+            "n": self._noise_table(),
+        }
+        # (ステップ内で鳴る音の区間, サンプル数) -> 合成済みのステップバッファ
+        self.step_cache = {}
+
+    @classmethod
+    def _noise_table(cls):
+        """
+        15ビット線形帰還シフトレジスタでノイズ波形を作る（初回のみ生成）
+
+        Returns:
+            list: ノイズ波形（-1.0または1.0）
+        """
+        if cls._noise_cache is None:
+            table = []
+            reg = 1
+            for _ in range(32767):
+                bit = (reg ^ (reg >> 1)) & 1
+                reg = (reg >> 1) | (bit << 14)
+                table.append(1.0 if reg & 1 else -1.0)
+            cls._noise_cache = table
+        return cls._noise_cache
+
+    def _render_voice(self, tone, pitch, volume, note_samples, offset=0):
+        """
+        1音分の波形を生成する
+
+        Args:
+            tone: 音色（"t", "s", "p", "n"）
+            pitch: Pyxelのノート番号（0-59）
+            volume: 音量（0-7）
+            note_samples: 生成するサンプル数
+            offset: 発音開始から何サンプル目から生成するか（前のステップから鳴り続ける音）
+
+        Returns:
+            list: 振幅のリスト
+        """
+        table = self.wave_tables[tone]
+        length = len(table)
+        freq = 440 * 2 ** ((pitch - 33) / 12)
+        if tone == "n":
+            increment = freq * self.NOISE_SHIFTS_PER_CYCLE / self.sample_rate
+        else:
+            increment = freq * length / self.sample_rate
+        amplitude = self.CHANNEL_GAIN * volume / self.sequencer.MAX_VOLUME
+        return [amplitude * table[int(i * increment) % length] for i in range(offset, offset + note_samples)]
+
+    def _render_step(self, segments, step_samples):
+        """
+        1ステップ分のバッファを生成する
+
+        Args:
+            segments: ステップの先頭から鳴る音の区間のタプル（音色, ノート番号, 音量, 発音開始からの位置, サンプル数）
+            step_samples: ステップのサンプル数
+
+        Returns:
+            bytes: 16ビット符号付きPCM
+        """
+        key = (segments, step_samples)
+        buffer = self.step_cache.get(key)
+        if buffer is not None:
+            return buffer
+
+        mixed = [0.0] * step_samples
+        for tone, pitch, volume, offset, count in segments:
+            for i, sample in enumerate(self._render_voice(tone, pitch, volume, count, offset)):
+                mixed[i] += sample
+        buffer = array("h", [max(-32767, min(32767, int(sample * 32767))) for sample in mixed]).tobytes()
+        self.step_cache[key] = buffer
+        return buffer
+
+    def _step_pitches(self, pattern_idx, step_idx):
+        """
+        指定ステップで音のあるトラックを集める（ステップごとの再生と同じく優先度の高い順）
+
+        Args:
+            pattern_idx: パターン番号
+            step_idx: ステップ位置
+
+        Returns:
+            dict: トラック番号 -> ノート番号
+        """
+        seq = self.sequencer
+        pitches = {}
+        for track_idx in seq.track_order():
+            pitch = seq.patterns.get_pitch(pattern_idx, track_idx, step_idx)
+            if pitch != EMPTY:
+                pitches[track_idx] = pitch
+        return pitches
+
+    def timing(self):
+        """
+        アプリの再生と同じステップ長・発音長を返す
+        チャンネル数以下のトラックはミュージック（PatternCompiler）、超える場合はステップごとの単音再生（速度15）で鳴らす
+
+        Returns:
+            tuple: (1ステップの秒数, 1音の秒数, 音が鳴り続けるステップ数)
+        """
+        seq = self.sequencer
+        hold = -(-seq.tempo // 120)
+        if seq.TRACK_COUNT > seq.CHANNEL_COUNT:
+            return 60 / seq.tempo, 15 / 120, hold
+        subdivision, speed = seq.compiler.step_layout(seq.tempo)
+        return subdivision * speed / 120, speed / 120, hold
+
+    def pattern_order(self):
+        """
+        書き出すパターンの順番を返す
+
+        Returns:
+            list: ソングシーケンスが空でなければ繰り返しを展開したソングシーケンス、空なら現在のパターンのみ
+        """
+        if self.sequencer.song_sequence:
+            return self.sequencer.song_timeline().sound_patterns()
+        return [self.sequencer.current_pattern]
+
+    def _start_point(self, start_step):
+        """
+        書き出しを始める位置をpattern_order()の並びの位置に変換する
+
+        Args:
+            start_step: ソング先頭からの絶対ステップ（ソングが空なら現在のパターン内のステップ）
+
+        Returns:
+            tuple: (並びの番号, パターン内のステップ)
+        """
+        seq = self.sequencer
+        if not seq.song_sequence:
+            return 0, start_step % seq.pattern_length()
+        timeline = seq.song_timeline()
+        position, repeat, _, step_idx = timeline.locate(start_step)
+        return timeline.sound_starts[position] + repeat, step_idx
+
+    def _step_segments(self, start_step=0):
+        """
+        ステップごとに鳴る音の区間を求める（アプリと同じボイス割り当てでチャンネルを決める）
+
+        Args:
+            start_step: 書き出しを始めるソング先頭からの絶対ステップ
+
+        Yields:
+            tuple: (ステップのサンプル数, ステップの先頭から鳴る音の区間のタプル)。
+                区間は(音色, ノート番号, 音量, 発音開始からの位置, サンプル数)
+        """
+        seq = self.sequencer
+        step_sec, note_sec, hold = self.timing()
+        note_samples = round(note_sec * self.sample_rate)
+        # 再生開始時と同じく空のチャンネルから割り当てる。チャンネルごとに(音色, ノート番号, 音量, 発音開始のサンプル位置)
+        voices = VoiceAllocator(seq.CHANNEL_COUNT)
+        channels = [None] * seq.CHANNEL_COUNT
+        voice_step = 0
+
+        position = 0
+        order = self.pattern_order()
+        first_sound, first_step = self._start_point(start_step)
+        for sound_index in range(first_sound, len(order)):
+            pattern_idx = order[sound_index]
+            # 空のパターンはセルを読まない（play_current_stepと同じく割り当ても進めない）
+            empty = seq.patterns.is_empty(pattern_idx)
+            for step_idx in range(first_step if sound_index == first_sound else 0, seq.patterns.length(pattern_idx)):
+                # ステップ境界はサンプル単位で丸め、端数は累積させない
+                start = round(position * step_sec * self.sample_rate)
+                end = round((position + 1) * step_sec * self.sample_rate)
+                if not empty:
+                    pitches = self._step_pitches(pattern_idx, step_idx)
+                    # 新しい音は同じチャンネルで鳴っている音を止める
+                    for channel, track_idx in voices.allocate(pitches, seq.track_priorities, voice_step, hold):
+                        channels[channel] = (
+                            seq.track_tones[track_idx],
+                            pitches[track_idx],
+                            seq.track_volumes[track_idx],
+                            start,
+                        )
+                    voice_step += 1
+
+                segments = []
+                for channel, voice in enumerate(channels):
+                    if voice is None:
+                        continue
+                    tone, pitch, volume, note_start = voice
+                    note_end = note_start + note_samples
+                    if note_end <= start:
+                        channels[channel] = None
+                        continue
+                    segments.append((tone, pitch, volume, start - note_start, min(end, note_end) - start))
+                yield end - start, tuple(sorted(segments))
+                position += 1
+
+    def render(self, start_step=0):
+        """
+        ソングをPCMに変換する
+
+        Args:
+            start_step: 書き出しを始めるソング先頭からの絶対ステップ（タイムラインで定数時間でシークする）
+
+        Returns:
+            bytes: 16ビット符号付きモノラルPCM
+        """
+        return b"".join(
+            self._render_step(segments, step_samples) for step_samples, segments in self._step_segments(start_step)
+        )
+
+    def write_wav(self, filename, start_step=0):
+        """
+        ソングをWAVファイルに書き出す
+
+        Args:
+            filename: 出力ファイル名
+            start_step: 書き出しを始めるソング先頭からの絶対ステップ
+
+        Returns:
+            float: 書き出した長さ（秒）
+        """
+        pcm = self.render(start_step)
+        with wave.open(filename, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        return len(pcm) / 2 / self.sample_rate
+
+
+def render_to_wav(sequencer, filename, sample_rate=OfflineRenderer.SAMPLE_RATE, start_step=0):
+    """
+    Sequencerの内容をWAVファイルに書き出す
+
+    Args:
+        sequencer: 書き出し対象のSequencerインスタンス
+        filename: 出力ファイル名
+        sample_rate: 出力サンプリングレート
+        start_step: 書き出しを始めるソング先頭からの絶対ステップ
+
+    Returns:
+        float: 書き出した長さ（秒）
+    """
+    return OfflineRenderer(sequencer, sample_rate).write_wav(filename, start_step)
@@ -0,0 +1,203 @@
+"""
+パターンコンパイラーモジュール - パターンとソングをPyxelのサウンド・ミュージックに変換する
+"""
+
+from pattern_store import EMPTY
+from sound_bank import SoundBank
+
+# 音高（オクターブ × 12 + 音階インデックス）-> Pyxelのノート名
+PYXEL_NOTE_NAMES = [f"{name}{octave}" for octave in range(5) for name in SoundBank.NOTE_NAMES]
+
+
+class PatternCompiler:
+    """
+    パターンをチャンネルごとの複数音サウンドに、ソングシーケンスをPyxelのミュージックに変換するクラス
+    変換結果はパターン単位でキャッシュし、編集されたパターンだけを再変換する
+    再生タイミングはPyxelのオーディオスレッドが管理するため、ゲームループのフレーム揺れの影響を受けない
+    """
+
+    # 使用するミュージック番号
+    SONG_MUSIC = 0  # ソング再生用
+    PATTERN_MUSIC = 1  # パターンループ再生用
+
+    # コンパイル結果に使うサウンドスロット範囲（0-15は単音再生用）
+    FIRST_SLOT = 16
+    SLOT_COUNT = 48
+
+    # 1音の長さの目安（ティック、120ティック = 1秒）。単音再生の速度15と揃える
+    NOTE_TICKS = 15
+
+    # テンポの許容誤差（相対値）
+    MAX_TEMPO_ERROR = 0.01
+
+    # 1ステップを分割する最大数
+    MAX_SUBDIVISION = 16
+
+    def __init__(self, sequencer):
+        """
+        コンパイラーの初期化
+
+        Args:
+            sequencer: 変換対象のSequencerインスタンス
+        """
+        self.sequencer = sequencer
+        self.sound_bank = SoundBank(self.FIRST_SLOT, self.SLOT_COUNT, sequencer.backend)
+        # パターン番号 -> チャンネルごとのサウンド内容のキャッシュ
+        self.compiled = {}
+        # 再変換が必要なパターン番号
+        self.dirty = set()
+        # テンポ -> (1ステップの分割数, 速度) のキャッシュ
+        self._layouts = {}
+
+    def mark_dirty(self, pattern_idx):
+        """
+        パターンが編集されたことを記録する
+
+        Args:
+            pattern_idx: 編集されたパターン番号
+        """
+        self.compiled.pop(pattern_idx, None)
+        self.dirty.add(pattern_idx)
+
+    def mark_all_dirty(self):
+        """テンポや音量の変更など、全パターンの再変換が必要なことを記録する"""
+        self.dirty.update(self.compiled)
+        self.compiled.clear()
+
+    def is_stale(self, pattern_indices):
+        """
+        指定したパターンに未反映の編集があるかを判定する
+
+        Args:
+            pattern_indices: 判定するパターン番号のリスト
+
+        Returns:
+            bool: 再変換が必要ならTrue
+        """
+        return any(pattern_idx in self.dirty for pattern_idx in pattern_indices)
+
+    def step_layout(self, tempo):
+        """
+        1ステップを何音に分割し、どの速度で鳴らすかを決める
+        Pyxelの速度は整数のため、ステップ長との誤差が許容範囲内の組み合わせから音の長さが単音再生に近いものを選ぶ
+
+        Args:
+            tempo: テンポ（BPM）
+
+        Returns:
+            tuple: (1ステップの分割数, 速度)
+        """
+        layout = self._layouts.get(tempo)
+        if layout is None:
+            step_ticks = 7200 / tempo  # 60 / tempo秒 × 120ティック
+            best_key = None
+            for subdivision in range(1, self.MAX_SUBDIVISION + 1):
+                speed = max(1, round(step_ticks / subdivision))
+                error = abs(subdivision * speed - step_ticks) / step_ticks
+                # 許容誤差を超える組み合わせは誤差の小さい順、許容範囲内なら音の長さの近い順
+                key = (0, abs(speed - self.NOTE_TICKS)) if error <= self.MAX_TEMPO_ERROR else (1, error)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    layout = (subdivision, speed)
+            self._layouts[tempo] = layout
+        return layout
+
+    def step_seconds(self, tempo):
+        """
+        コンパイル後の1ステップの実際の長さ
+
+        Args:
+            tempo: テンポ（BPM）
+
+        Returns:
+            float: 1ステップの秒数
+        """
+        subdivision, speed = self.step_layout(tempo)
+        return subdivision * speed / 120
+
+    def compile_pattern(self, pattern_idx):
+        """
+        パターンをチャンネルごとのサウンドに変換する
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            list: チャンネルごとのサウンド内容（notes, tones, volumes, effects, speed）
+        """
+        channels = self.compiled.get(pattern_idx)
+        if channels is not None:
+            return channels
+
+        seq = self.sequencer
+        subdivision, speed = self.step_layout(seq.tempo)
+        rest = " r" * (subdivision - 1)
+        channels = []
+        for track_idx in range(seq.TRACK_COUNT):
+            notes = []
+            for pitch in seq.patterns.track_pitches(pattern_idx, track_idx):
+                notes.append(("r" if pitch == EMPTY else PYXEL_NOTE_NAMES[pitch]) + rest)
+            channels.append(
+                (
+                    " ".join(notes),
+                    seq.track_tones[track_idx],
+                    str(seq.track_volumes[track_idx]),
+                    "n",
+                    speed,
+                )
+            )
+
+        self.compiled[pattern_idx] = channels
+        self.dirty.discard(pattern_idx)
+        return channels
+
+    def compile_music(self, music_idx, pattern_indices):
+        """
+        パターンの並びをミュージックに変換する
+
+        Args:
+            music_idx: 設定するミュージック番号
+            pattern_indices: 再生順のパターン番号のリスト
+
+        Returns:
+            int: 設定したミュージック番号
+
+        Raises:
+            ValueError: 必要なサウンド数が確保できるスロット数を超えた場合、またはトラック数がチャンネル数を超える場合
+        """
+        if self.sequencer.TRACK_COUNT > self.sequencer.CHANNEL_COUNT:
+            # ミュージックはチャンネルごとの並びのため、チャンネルを共有するトラックは表せない
+            raise ValueError(f"too many tracks to compile: {self.sequencer.TRACK_COUNT} > {self.sequencer.CHANNEL_COUNT}")
+        compiled = [self.compile_pattern(pattern_idx) for pattern_idx in dict.fromkeys(pattern_indices)]
+        unique_sounds = {sound for channels in compiled for sound in channels}
+        if len(unique_sounds) > self.SLOT_COUNT:
+            raise ValueError(f"too many sounds to compile: {len(unique_sounds)} > {self.SLOT_COUNT}")
+
+        seqs = [[] for _ in range(self.sequencer.TRACK_COUNT)]
+        for pattern_idx in pattern_indices:
+            for track_idx, sound in enumerate(self.compile_pattern(pattern_idx)):
+                seqs[track_idx].append(self.sound_bank.get_slot(*sound))
+
+        self.sequencer.backend.set_music(music_idx, seqs)
+        return music_idx
+
+    def compile_song(self):
+        """
+        ソングシーケンスを連結したミュージックに変換する
+
+        Returns:
+            int: 設定したミュージック番号
+        """
+        return self.compile_music(self.SONG_MUSIC, self.sequencer.song_sequence)
+
+    def compile_pattern_loop(self, pattern_idx):
+        """
+        1パターンをループ再生用のミュージックに変換する
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            int: 設定したミュージック番号
+        """
+        return self.compile_music(self.PATTERN_MUSIC, [pattern_idx])
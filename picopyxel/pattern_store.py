@@ -0,0 +1,759 @@
+"""
+パターンストアモジュール - パターンデータを必要になったときだけ確保する型付き配列で保持する
+"""
+
+from array import array
+from collections import Counter
+
+# 音階名（音階インデックス順）
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+# 空のセルを表す値
+EMPTY = -1
+
+# 音符がないパターンの索引（共有、書き換えない）
+_NO_NOTES = {}
+
+
+class TrackView:
+    """
+    1パターン1トラック分のステップを従来の(音階名, オクターブ, トラック番号)形式で読み書きするビュー
+    """
+
+    __slots__ = ("store", "pattern_idx", "track_idx")
+
+    def __init__(self, store, pattern_idx, track_idx):
+        """
+        ビューの初期化
+
+        Args:
+            store: 参照するPatternStore
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+        """
+        self.store = store
+        self.pattern_idx = pattern_idx
+        self.track_idx = track_idx
+
+    def __len__(self):
+        return self.store.length(self.pattern_idx)
+
+    def __getitem__(self, step_idx):
+        if not 0 <= step_idx < len(self):
+            raise IndexError(step_idx)
+        return self.store.pitch_to_cell(self.store.get_pitch(self.pattern_idx, self.track_idx, step_idx), self.track_idx)
+
+    def __setitem__(self, step_idx, step_data):
+        if not 0 <= step_idx < len(self):
+            raise IndexError(step_idx)
+        self.store.set_pitch(self.pattern_idx, self.track_idx, step_idx, self.store.cell_to_pitch(step_data))
+
+    def __iter__(self):
+        for pitch in self.store.track_pitches(self.pattern_idx, self.track_idx):
+            yield self.store.pitch_to_cell(pitch, self.track_idx)
+
+
+class PatternView:
+    """
+    1パターン分のトラックを従来のpatterns[パターン][トラック][ステップ]形式で参照するビュー
+    """
+
+    __slots__ = ("store", "pattern_idx")
+
+    def __init__(self, store, pattern_idx):
+        """
+        ビューの初期化
+
+        Args:
+            store: 参照するPatternStore
+            pattern_idx: パターン番号
+        """
+        self.store = store
+        self.pattern_idx = pattern_idx
+
+    def __len__(self):
+        return self.store.track_count
+
+    def __getitem__(self, track_idx):
+        if not 0 <= track_idx < self.store.track_count:
+            raise IndexError(track_idx)
+        return TrackView(self.store, self.pattern_idx, track_idx)
+
+    def __iter__(self):
+        for track_idx in range(self.store.track_count):
+            yield TrackView(self.store, self.pattern_idx, track_idx)
+
+
+class PatternStore:
+    """
+    パターンごとのセルをsigned char配列（トラック × ステップの順）で保持するクラス
+    セルの値は音高（オクターブ × 12 + 音階インデックス）、空のセルはEMPTY
+    配列は最初に音が書き込まれたときに確保し、音がなくなったら解放する（空のパターンはメモリを使わない）
+    パターンごとに長さ（ステップ数）を変えられる
+    読み込み元を設定した場合、各パターンは最初に参照されたときに読み込む
+    パターンごとに音符の位置の索引（(ステップ, 音階インデックス) -> トラックのビットマスク）を更新し続ける
+    内容が同じパターンは配列と索引を共有する（コピーは参照の代入だけで、共有中のパターンは最初の書き込みで複製する）
+    """
+
+    def __init__(self, pattern_count, track_count, step_count=16, max_step_count=64):
+        """
+        パターンストアの初期化
+
+        Args:
+            pattern_count: パターン数
+            track_count: トラック数
+            step_count: パターンの既定の長さ（ステップ数）
+            max_step_count: パターンの長さの上限
+        """
+        self.pattern_count = pattern_count
+        self.track_count = track_count
+        self.step_count = step_count
+        self.max_step_count = max_step_count
+        # パターン番号 -> セルの配列（音のあるパターンのみ。内容が同じパターンは同じ配列を共有する）
+        self.blocks = {}
+        # 共有中の配列のid -> 共有しているパターン数（2以上のもののみ）
+        self._refs = {}
+        # パターン番号 -> 長さ（既定の長さ以外のパターンのみ）と、いずれかの長さが変わるたびに増える値
+        self.lengths = {}
+        self.length_version = 0
+        # 前回の保存以降に変更されたパターン番号
+        self.dirty = set()
+        # まだ読み込んでいないパターン番号と読み込み関数、読み込んだデータ -> パターン番号（同じデータは共有する）
+        self._pending = set()
+        self._loader = None
+        self._loaded = {}
+        # パターン番号 -> 音符位置の索引（音のあるパターンのみ）と変更回数
+        self.note_index = {}
+        self.versions = {}
+        # 変更を通知する記録係（EditHistoryなど、record_cellとrecord_lengthを持つもの）
+        self.recorder = None
+
+    def attach_loader(self, loader, pattern_indices):
+        """
+        パターンを最初に参照したときに読み込むよう設定する
+
+        Args:
+            loader: パターン番号を受け取り、(長さ, トラック数 × 長さバイトのデータ)を返す関数
+            pattern_indices: 遅延読み込みするパターン番号
+        """
+        self._loader = loader
+        self._pending = set(pattern_indices)
+        self._loaded = {}
+
+    def ensure_loaded(self, pattern_idx):
+        """
+        パターンが未読み込みなら読み込む
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        if pattern_idx in self._pending:
+            self._pending.discard(pattern_idx)
+            length, data = self._loader(pattern_idx)
+            self._set_length_value(pattern_idx, length)
+            source = self._loaded.get(data)
+            if source is not None and source in self.blocks and self.blocks[source].tobytes() == data:
+                # 読み込み済みのパターンと同じデータは配列を共有する
+                self._share(source, pattern_idx)
+                self.versions[pattern_idx] = self.versions.get(pattern_idx, 0) + 1
+            else:
+                self.blocks[pattern_idx] = array("b", data)
+                self._rebuild_index(pattern_idx)
+                if data:
+                    self._loaded[data] = pattern_idx
+            if not self._pending:
+                self._loader = None
+                self._loaded = {}
+
+    def load_all(self):
+        """未読み込みのパターンをすべて読み込む"""
+        for pattern_idx in list(self._pending):
+            self.ensure_loaded(pattern_idx)
+
+    def _record_block(self, pattern_idx, removed, first_step=0, source=None):
+        """
+        記録係にパターンの音のあるセルを通知する
+
+        Args:
+            pattern_idx: パターン番号
+            removed: Trueなら音を消す変更、Falseなら音を入れる変更として通知する
+            first_step: 通知する最初のステップ
+            source: セルを読むパターン番号（Noneの場合はpattern_idx）
+        """
+        if self.recorder is None:
+            return
+        if source is None:
+            source = pattern_idx
+        length = self.length(source)
+        for i, pitch in enumerate(self.blocks.get(source, ())):
+            if pitch != EMPTY:
+                track_idx, step_idx = divmod(i, length)
+                if step_idx >= first_step:
+                    old_pitch, new_pitch = (pitch, EMPTY) if removed else (EMPTY, pitch)
+                    self.recorder.record_cell(pattern_idx, track_idx, step_idx, old_pitch, new_pitch)
+
+    def _record_copy(self, source, destination):
+        """
+        記録係にパターンのコピーによる変更を通知する（同じ長さなら変わるセルだけ）
+
+        Args:
+            source: コピー元パターン番号
+            destination: コピー先パターン番号
+        """
+        if self.recorder is None:
+            return
+        self.ensure_loaded(destination)
+        length = self.length(source)
+        old_block = self.blocks.get(destination)
+        new_block = self.blocks.get(source)
+        if self.length(destination) == length and old_block is not None and new_block is not None:
+            if old_block == new_block:
+                return
+            for i, (old_pitch, new_pitch) in enumerate(zip(old_block, new_block)):
+                if old_pitch != new_pitch:
+                    track_idx, step_idx = divmod(i, length)
+                    self.recorder.record_cell(destination, track_idx, step_idx, old_pitch, new_pitch)
+            return
+        self._record_block(destination, True)
+        self._record_length(destination, length)
+        self._record_block(destination, False, source=source)
+
+    def _record_length(self, pattern_idx, length):
+        """
+        記録係にパターンの長さの変更を通知する
+
+        Args:
+            pattern_idx: パターン番号
+            length: 変更後のステップ数
+        """
+        old_length = self.length(pattern_idx)
+        if self.recorder is not None and old_length != length:
+            self.recorder.record_length(pattern_idx, old_length, length)
+
+    def _touch(self, pattern_idx):
+        """
+        パターンの変更を記録する
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        self.versions[pattern_idx] = self.versions.get(pattern_idx, 0) + 1
+        self.dirty.add(pattern_idx)
+
+    def _release_if_empty(self, pattern_idx):
+        """
+        音がなくなったパターンの配列と索引を解放する
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        if not self.note_index.get(pattern_idx):
+            self._drop_block(pattern_idx)
+
+    def _drop_block(self, pattern_idx):
+        """
+        パターンの配列と索引を外す（共有中の配列は共有数を減らすだけ）
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        block = self.blocks.pop(pattern_idx, None)
+        self.note_index.pop(pattern_idx, None)
+        if block is not None:
+            count = self._refs.get(id(block))
+            if count is not None:
+                if count > 2:
+                    self._refs[id(block)] = count - 1
+                else:
+                    del self._refs[id(block)]
+
+    def _share(self, source, destination):
+        """
+        コピー元パターンの配列と索引をコピー先と共有する
+
+        Args:
+            source: コピー元パターン番号（音があること）
+            destination: コピー先パターン番号
+        """
+        block = self.blocks[source]
+        if self.blocks.get(destination) is block:
+            return
+        self._drop_block(destination)
+        self.blocks[destination] = block
+        self.note_index[destination] = self.note_index[source]
+        self._refs[id(block)] = self._refs.get(id(block), 1) + 1
+
+    def _unshare(self, pattern_idx):
+        """
+        共有中のパターンに書き込む前に、配列と索引をこのパターン専用に複製する
+
+        Args:
+            pattern_idx: パターン番号（音があること）
+
+        Returns:
+            array: 書き込めるセルの配列
+        """
+        block = self.blocks[pattern_idx]
+        if id(block) not in self._refs:
+            return block
+        note_index = self.note_index[pattern_idx]
+        self._drop_block(pattern_idx)
+        block = self.blocks[pattern_idx] = array("b", block)
+        self.note_index[pattern_idx] = dict(note_index)
+        return block
+
+    def is_shared(self, pattern_idx):
+        """
+        パターンが他のパターンと配列を共有しているかを判定する
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            bool: 共有していればTrue
+        """
+        block = self.blocks.get(pattern_idx)
+        return block is not None and id(block) in self._refs
+
+    def block_key(self, pattern_idx):
+        """
+        パターンの配列を識別する値を返す（読み込みはしない）
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            int: 配列を共有しているパターン同士で同じ値。音がないか未読み込みの場合はNone
+        """
+        block = self.blocks.get(pattern_idx)
+        return None if block is None else id(block)
+
+    def block_bytes(self):
+        """
+        読み込み済みのセルの配列が使うバイト数を返す（共有している配列は1回だけ数える）
+
+        Returns:
+            int: バイト数
+        """
+        return sum(len(block) for block in {id(block): block for block in self.blocks.values()}.values())
+
+    def deduplicate(self):
+        """
+        読み込み済みのパターンのうち内容が同じものを1つの配列に共有させる（変更回数は変えない）
+
+        Returns:
+            int: 新たに共有させたパターン数
+        """
+        seen = {}
+        shared = 0
+        for pattern_idx in sorted(self.blocks):
+            source = seen.setdefault(self.blocks[pattern_idx].tobytes(), pattern_idx)
+            if source != pattern_idx and self.blocks[source] is not self.blocks[pattern_idx]:
+                self._share(source, pattern_idx)
+                shared += 1
+        return shared
+
+    def _rebuild_index(self, pattern_idx):
+        """
+        パターンの音符位置の索引を作り直す
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        index = {}
+        length = self.length(pattern_idx)
+        for i, pitch in enumerate(self.blocks.get(pattern_idx, ())):
+            if pitch != EMPTY:
+                track_idx, step_idx = divmod(i, length)
+                key = (step_idx, pitch % 12)
+                index[key] = index.get(key, 0) | (1 << track_idx)
+        self.note_index[pattern_idx] = index
+        self._release_if_empty(pattern_idx)
+        self.versions[pattern_idx] = self.versions.get(pattern_idx, 0) + 1
+
+    def _index_remove(self, pattern_idx, track_idx, step_idx, pitch):
+        """
+        索引から音符を取り除く
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+            step_idx: ステップ位置
+            pitch: 取り除く音高
+        """
+        index = self.note_index[pattern_idx]
+        key = (step_idx, pitch % 12)
+        mask = index[key] & ~(1 << track_idx)
+        if mask:
+            index[key] = mask
+        else:
+            del index[key]
+
+    def note_positions(self, pattern_idx):
+        """
+        パターン内の音符がある位置を返す
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            dict: (ステップ, 音階インデックス) -> 音符があるトラックのビットマスク（読み取り専用）
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        return self.note_index.get(pattern_idx, _NO_NOTES)
+
+    def version(self, pattern_idx):
+        """
+        パターンの変更回数を返す
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            int: 変更のたびに増える値
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        return self.versions.get(pattern_idx, 0)
+
+    def length(self, pattern_idx):
+        """
+        パターンの長さを返す
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            int: ステップ数
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        return self.lengths.get(pattern_idx, self.step_count)
+
+    def _set_length_value(self, pattern_idx, length):
+        """
+        パターンの長さを記録する（既定の長さは記録しない）
+
+        Args:
+            pattern_idx: パターン番号
+            length: ステップ数
+        """
+        if length == self.lengths.get(pattern_idx, self.step_count):
+            return
+        if length == self.step_count:
+            del self.lengths[pattern_idx]
+        else:
+            self.lengths[pattern_idx] = length
+        self.length_version += 1
+
+    def set_length(self, pattern_idx, length):
+        """
+        パターンの長さを変更する（短くした場合ははみ出した音を消す）
+
+        Args:
+            pattern_idx: パターン番号
+            length: ステップ数（1以上max_step_count以下）
+
+        Raises:
+            ValueError: 長さが範囲外の場合
+        """
+        if not 1 <= length <= self.max_step_count:
+            raise ValueError(f"pattern length out of range: {length}")
+        old_length = self.length(pattern_idx)
+        if length == old_length:
+            return
+        self._record_block(pattern_idx, True, length)
+        self._record_length(pattern_idx, length)
+        block = self.blocks.get(pattern_idx)
+        self._set_length_value(pattern_idx, length)
+        if block is not None:
+            resized = array("b", [EMPTY]) * (self.track_count * length)
+            copied = min(length, old_length)
+            for track_idx in range(self.track_count):
+                resized[track_idx * length : track_idx * length + copied] = block[
+                    track_idx * old_length : track_idx * old_length + copied
+                ]
+            self._drop_block(pattern_idx)
+            self.blocks[pattern_idx] = resized
+            self._rebuild_index(pattern_idx)
+        self._touch(pattern_idx)
+
+    def set_track_count(self, track_count):
+        """
+        トラック数を変更する（減らした場合は外れたトラックの音を消す。編集履歴には通知しない）
+        共有中の配列は1回だけ作り直し、作り直した配列を同じパターン同士で共有し続ける
+
+        Args:
+            track_count: トラック数
+        """
+        if track_count == self.track_count:
+            return
+        self.load_all()
+        kept = min(self.track_count, track_count)
+        self.track_count = track_count
+        # 元の配列のid -> (元の配列, 作り直した配列を持つパターン番号)（元の配列を残してidの再利用を防ぐ）
+        resized = {}
+        for pattern_idx in sorted(self.blocks):
+            block = self.blocks[pattern_idx]
+            if id(block) in resized:
+                source = resized[id(block)][1]
+                if source in self.blocks:
+                    self.blocks[pattern_idx] = self.blocks[source]
+                    self.note_index[pattern_idx] = self.note_index[source]
+                else:
+                    del self.blocks[pattern_idx]
+                    self.note_index.pop(pattern_idx, None)
+            else:
+                length = self.length(pattern_idx)
+                resized[id(block)] = (block, pattern_idx)
+                self.blocks[pattern_idx] = block[: kept * length] + array("b", [EMPTY]) * ((track_count - kept) * length)
+                self._rebuild_index(pattern_idx)
+            self._touch(pattern_idx)
+        counts = Counter(id(block) for block in self.blocks.values())
+        self._refs = {key: count for key, count in counts.items() if count > 1}
+
+    def track_has_notes(self, track_idx):
+        """
+        いずれかのパターンのトラックに音があるかを判定する
+
+        Args:
+            track_idx: トラック番号
+
+        Returns:
+            bool: 音があればTrue
+        """
+        self.load_all()
+        bit = 1 << track_idx
+        return any(mask & bit for index in self.note_index.values() for mask in index.values())
+
+    def used_patterns(self):
+        """
+        音があるか、既定以外の長さのパターン番号を返す（保存が必要なパターン）
+
+        Returns:
+            list: パターン番号（昇順）
+        """
+        return sorted(self.blocks.keys() | self.lengths.keys() | self._pending)
+
+    @staticmethod
+    def cell_to_pitch(step_data):
+        """
+        (音階名, オクターブ, ...)形式のセルを音高に変換する
+
+        Args:
+            step_data: セルのタプルまたはNone
+
+        Returns:
+            int: 音高、空のセルはEMPTY
+        """
+        if step_data is None or step_data[0] is None:
+            return EMPTY
+        return step_data[1] * 12 + NOTE_NAMES.index(step_data[0])
+
+    @staticmethod
+    def pitch_to_cell(pitch, track_idx):
+        """
+        音高を(音階名, オクターブ, トラック番号)形式のセルに変換する
+
+        Args:
+            pitch: 音高
+            track_idx: トラック番号
+
+        Returns:
+            tuple: セルのタプル、空のセルはNone
+        """
+        if pitch == EMPTY:
+            return None
+        octave, note_idx = divmod(pitch, 12)
+        return (NOTE_NAMES[note_idx], octave, track_idx)
+
+    def __len__(self):
+        return self.pattern_count
+
+    def __getitem__(self, pattern_idx):
+        if not 0 <= pattern_idx < self.pattern_count:
+            raise IndexError(pattern_idx)
+        return PatternView(self, pattern_idx)
+
+    def __iter__(self):
+        for pattern_idx in range(self.pattern_count):
+            yield PatternView(self, pattern_idx)
+
+    def get_pitch(self, pattern_idx, track_idx, step_idx):
+        """
+        セルの音高を取得する
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+            step_idx: ステップ位置
+
+        Returns:
+            int: 音高、空のセルはEMPTY
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        block = self.blocks.get(pattern_idx)
+        if block is None:
+            return EMPTY
+        return block[track_idx * self.lengths.get(pattern_idx, self.step_count) + step_idx]
+
+    def set_pitch(self, pattern_idx, track_idx, step_idx, pitch):
+        """
+        セルの音高を設定する
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+            step_idx: ステップ位置
+            pitch: 音高、EMPTYで消去
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        length = self.lengths.get(pattern_idx, self.step_count)
+        block = self.blocks.get(pattern_idx)
+        if block is None:
+            if pitch == EMPTY:
+                return
+            # 最初の書き込みで配列を確保する
+            block = self.blocks[pattern_idx] = array("b", [EMPTY]) * (self.track_count * length)
+            self.note_index[pattern_idx] = {}
+        i = track_idx * length + step_idx
+        old_pitch = block[i]
+        if old_pitch == pitch:
+            return
+        if self._refs and id(block) in self._refs:
+            block = self._unshare(pattern_idx)
+        block[i] = pitch
+        if self.recorder is not None:
+            self.recorder.record_cell(pattern_idx, track_idx, step_idx, old_pitch, pitch)
+
+        # 索引の更新
+        if old_pitch != EMPTY:
+            self._index_remove(pattern_idx, track_idx, step_idx, old_pitch)
+        if pitch != EMPTY:
+            index = self.note_index[pattern_idx]
+            key = (step_idx, pitch % 12)
+            index[key] = index.get(key, 0) | (1 << track_idx)
+        else:
+            self._release_if_empty(pattern_idx)
+        self._touch(pattern_idx)
+
+    def track_pitches(self, pattern_idx, track_idx):
+        """
+        1トラック分の音高をまとめて取得する
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+
+        Returns:
+            array: 音高の配列（コピー）
+        """
+        length = self.length(pattern_idx)
+        block = self.blocks.get(pattern_idx)
+        if block is None:
+            return array("b", [EMPTY]) * length
+        return block[track_idx * length : (track_idx + 1) * length]
+
+    def pattern_pitches(self, pattern_idx):
+        """
+        1パターン分の音高をまとめて取得する（トラック順に連結）
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            array: 音高の配列（コピー）
+        """
+        length = self.length(pattern_idx)
+        block = self.blocks.get(pattern_idx)
+        if block is None:
+            return array("b", [EMPTY]) * (self.track_count * length)
+        return array("b", block)
+
+    def clear_track(self, pattern_idx, track_idx):
+        """
+        1トラック分のセルを消去する
+
+        Args:
+            pattern_idx: パターン番号
+            track_idx: トラック番号
+        """
+        length = self.length(pattern_idx)
+        block = self.blocks.get(pattern_idx)
+        if block is None:
+            return
+        start = track_idx * length
+        if block[start : start + length].count(EMPTY) == length:
+            return
+        block = self._unshare(pattern_idx)
+        for step_idx, pitch in enumerate(block[start : start + length]):
+            if pitch != EMPTY:
+                self._index_remove(pattern_idx, track_idx, step_idx, pitch)
+                if self.recorder is not None:
+                    self.recorder.record_cell(pattern_idx, track_idx, step_idx, pitch, EMPTY)
+        block[start : start + length] = array("b", [EMPTY]) * length
+        self._release_if_empty(pattern_idx)
+        self._touch(pattern_idx)
+
+    def clear_pattern(self, pattern_idx):
+        """
+        1パターン分のセルを消去する（配列を解放し、長さは既定に戻す）
+
+        Args:
+            pattern_idx: パターン番号
+        """
+        self._record_block(pattern_idx, True)
+        self._record_length(pattern_idx, self.step_count)
+        self._pending.discard(pattern_idx)
+        self._drop_block(pattern_idx)
+        self._set_length_value(pattern_idx, self.step_count)
+        self._touch(pattern_idx)
+
+    def clear_all(self):
+        """全パターンを消去する（使用中だったパターンだけを処理する）"""
+        for pattern_idx in self.used_patterns():
+            self.versions[pattern_idx] = self.versions.get(pattern_idx, 0) + 1
+        self.blocks.clear()
+        self._refs.clear()
+        if self.lengths:
+            self.lengths.clear()
+            self.length_version += 1
+        self.note_index.clear()
+        self._pending.clear()
+        self._loader = None
+        self._loaded = {}
+
+    def copy_pattern(self, source, destination):
+        """
+        パターンをコピーする（長さも含む。セルは複製せず配列を共有する）
+
+        Args:
+            source: コピー元パターン番号
+            destination: コピー先パターン番号
+        """
+        self.ensure_loaded(source)
+        self._record_copy(source, destination)
+        self._pending.discard(destination)
+        self._set_length_value(destination, self.length(source))
+        if source in self.blocks:
+            self._share(source, destination)
+        else:
+            self._drop_block(destination)
+        self._touch(destination)
+
+    def is_empty(self, pattern_idx):
+        """
+        パターンが空かどうかを判定する
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            bool: 全セルが空ならTrue
+        """
+        if pattern_idx in self._pending:
+            self.ensure_loaded(pattern_idx)
+        return pattern_idx not in self.blocks
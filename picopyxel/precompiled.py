@@ -0,0 +1,16 @@
+"""
+バイトコード読み込みモジュール - パッケージに同梱したコンパイル済みのモジュール（.pyc）をソースより先に読み込ませる
+
+deploy.shはbytecode/<キャッシュタグ>/に各モジュールの.pycを作成してパッケージに含める
+（pyxel packageは__pycache__を含めず、展開したディレクトリでは毎回コンパイルし直すため）
+実行中のPythonと同じバージョンの.pycがない場合は何もせず、通常どおりソースから読み込む
+"""
+
+import os
+import sys
+
+# 同梱したバイトコードのディレクトリ（実行中のPythonのバージョンごと）
+BYTECODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bytecode", str(sys.implementation.cache_tag))
+
+if os.path.isdir(BYTECODE_DIR) and BYTECODE_DIR not in sys.path:
+    sys.path.insert(0, BYTECODE_DIR)
@@ -0,0 +1,349 @@
+"""
+プロジェクトファイルモジュール - バイナリ形式(.ppx)のプロジェクト保存と遅延読み込みを担当
+
+ファイル構成（リトルエンディアン、バージョン4）:
+    ヘッダー    : マジック"PPXL", バージョン, テンポ, トラック数, 既定のステップ数, インデックス件数, ソング長, インデックス位置
+    トラック音量: トラック数 × 1バイト
+    トラック音色: トラック数 × 1バイト（音色の文字"t"/"s"/"p"/"n"、バージョン4以降）
+    優先度      : トラック数 × 1バイト（符号付き、バージョン4以降）
+    パターン    : トラック数 × 長さバイトのブロック（音高、空のセルは-1）
+    インデックス: 件数 × 8バイト（パターン番号, 長さ, ブロック位置。位置0は音のないパターン）
+    ソング      : ソング長 × 2バイト（パターン番号）
+    繰り返し    : ソング長 × 1バイト（ソング位置ごとの繰り返し回数、バージョン3以降）
+
+インデックスには音があるか既定以外の長さのパターンだけを記録する（空のパターンはファイルに含めない）
+内容が同じパターンは1つのブロックを共有する（インデックスの位置が同じになる）
+バージョン1（全パターン分の位置を並べたインデックスと16ステップ固定のブロック）も読み込める
+"""
+
+import mmap
+import os
+import struct
+from collections import Counter
+
+from sequencer import Sequencer
+
+# ファイル識別子とバージョン
+MAGIC = b"PPXL"
+FORMAT_VERSION = 4
+
+# ヘッダー形式
+HEADER = struct.Struct("<4sHHBBHII")
+
+# ヘッダーの後に並ぶトラックごとのバイト数（音量, 音色, 優先度）
+TRACK_FIELDS = 3
+
+# インデックスの1件（パターン番号, 長さ, ブロック位置）
+INDEX_ENTRY = struct.Struct("<HHI")
+
+# バージョン1のステップ数
+V1_STEP_COUNT = 16
+
+
+class ProjectFile:
+    """
+    バイナリ形式のプロジェクトファイルを扱うクラス
+    読み込み時はファイルをメモリマップし、各パターンは最初に参照されたときにデコードする
+    保存時は変更されたパターンのブロックとファイル末尾のインデックス・ソングだけを書き換える
+    """
+
+    def __init__(self, filename):
+        """
+        プロジェクトファイルの初期化
+
+        Args:
+            filename: プロジェクトファイル名
+        """
+        self.filename = filename
+        self._file = None
+        self._mmap = None
+        # パターン番号 -> (長さ, ブロック位置)（位置0は音のないパターン）
+        self.index = {}
+        # インデックス領域の位置（パターンブロックの末尾）
+        self.tail_offset = 0
+        # 書き換えで使われなくなったブロックのバイト数
+        self.wasted = 0
+        # ファイルのレイアウト（バージョン, トラック数, 既定のステップ数）
+        self.layout = None
+
+    def _blocks_offset(self, track_count, version=FORMAT_VERSION):
+        """
+        パターンブロックの開始位置を返す
+
+        Args:
+            track_count: トラック数
+            version: ファイルのバージョン
+
+        Returns:
+            int: ファイル先頭からのバイト数
+        """
+        return HEADER.size + track_count * (TRACK_FIELDS if version >= 4 else 1)
+
+    def load(self, sequencer=None):
+        """
+        ヘッダーとインデックスだけを読み込み、パターンは遅延読み込みにする
+
+        Args:
+            sequencer: 復元先のSequencerインスタンス。Noneの場合は新規作成
+
+        Returns:
+            Sequencer: 読み込んだSequencerインスタンス
+
+        Raises:
+            ValueError: ファイル形式が正しくない場合
+        """
+        self.close()
+        self._open_map()
+        mm = self._mmap
+
+        magic, version, tempo, track_count, step_count, entry_count, song_length, offset = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or not 1 <= version <= FORMAT_VERSION or not 1 <= track_count <= Sequencer.MAX_TRACK_COUNT:
+            self.close()
+            raise ValueError(f"unsupported project file: {self.filename}")
+
+        if sequencer is None:
+            sequencer = Sequencer(track_count=track_count)
+        store = sequencer.patterns
+        if step_count != store.step_count:
+            self.close()
+            raise ValueError(f"unsupported track layout: {track_count} tracks x {step_count} steps")
+        if track_count != sequencer.TRACK_COUNT:
+            # 復元先のトラック数をファイルに合わせる（パターンは置き換えるので先に消去して読み込みを省く）
+            store.clear_all()
+            sequencer.set_track_count(track_count)
+
+        sequencer.tempo = tempo
+        sequencer.track_volumes = list(mm[HEADER.size : HEADER.size + track_count])
+        if version >= 4:
+            tones_offset = HEADER.size + track_count
+            sequencer.track_tones = list(mm[tones_offset : tones_offset + track_count].decode("ascii"))
+            sequencer.track_priorities = list(struct.unpack_from(f"<{track_count}b", mm, tones_offset + track_count))
+        if version == 1:
+            # バージョン1: ブロックの前に全パターン分の位置が並ぶ
+            positions = struct.unpack_from(f"<{entry_count}I", mm, self._blocks_offset(track_count, version))
+            self.index = {pattern_idx: (V1_STEP_COUNT, position) for pattern_idx, position in enumerate(positions) if position}
+            song_offset = offset
+        else:
+            self.index = {}
+            for i in range(entry_count):
+                pattern_idx, length, position = INDEX_ENTRY.unpack_from(mm, offset + i * INDEX_ENTRY.size)
+                self.index[pattern_idx] = (length, position)
+            song_offset = offset + entry_count * INDEX_ENTRY.size
+        self.tail_offset = offset
+        self.wasted = 0
+        self.layout = (version, track_count, step_count)
+        sequencer.song_sequence = list(struct.unpack_from(f"<{song_length}H", mm, song_offset))
+        if version >= 3:
+            repeats_offset = song_offset + song_length * 2
+            sequencer.song_repeats = list(mm[repeats_offset : repeats_offset + song_length])
+        else:
+            sequencer.song_repeats = [1] * song_length
+
+        # パターンは最初に参照されたときにメモリマップからデコードする
+        store.clear_all()
+        store.attach_loader(
+            self._read_block,
+            [pattern_idx for pattern_idx in self.index if pattern_idx < store.pattern_count],
+        )
+        store.dirty.clear()
+
+        sequencer.compiler.mark_all_dirty()
+        sequencer.song_version += 1
+        sequencer.history.reset()
+        sequencer.project_file = self
+        return sequencer
+
+    def _open_map(self):
+        """ファイルを開いて読み取り専用でメモリマップする"""
+        self._file = open(self.filename, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_block(self, pattern_idx):
+        """
+        パターンのブロックをメモリマップから取り出す
+
+        Args:
+            pattern_idx: パターン番号
+
+        Returns:
+            tuple: (長さ, トラック数 × 長さバイトのデータ)。音のないパターンのデータは空
+        """
+        length, position = self.index[pattern_idx]
+        if not position:
+            return length, b""
+        return length, self._mmap[position : position + self.layout[1] * length]
+
+    def save(self, sequencer, full=False):
+        """
+        プロジェクトを保存する
+        同じレイアウトのファイルを読み込み済みの場合は、変更されたパターンのブロックとインデックス・ソングだけを書き換える
+        使われなくなったブロックがファイルの半分を超えたら全体を書き直して詰める
+
+        Args:
+            sequencer: 保存するSequencerインスタンス
+            full: Trueの場合はファイル全体を書き直す
+        """
+        store = sequencer.patterns
+        layout = (FORMAT_VERSION, store.track_count, store.step_count)
+        if full or self.layout != layout or self.wasted * 2 > self.tail_offset or not os.path.exists(self.filename):
+            self._save_full(sequencer)
+        else:
+            self._save_dirty(sequencer)
+        store.dirty.clear()
+        sequencer.project_file = self
+
+    def _write_header(self, f, sequencer):
+        """
+        ヘッダーとトラックの音量・音色・優先度を書き込む
+
+        Args:
+            f: 書き込み先のファイル
+            sequencer: 保存するSequencerインスタンス
+        """
+        store = sequencer.patterns
+        f.seek(0)
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                sequencer.tempo,
+                store.track_count,
+                store.step_count,
+                len(self.index),
+                len(sequencer.song_sequence),
+                self.tail_offset,
+            )
+        )
+        f.write(bytes(sequencer.track_volumes))
+        f.write("".join(sequencer.track_tones).encode("ascii"))
+        f.write(
+            struct.pack(f"<{store.track_count}b", *(max(-128, min(127, priority)) for priority in sequencer.track_priorities))
+        )
+
+    def _write_tail(self, f, sequencer):
+        """
+        インデックス、ソング、繰り返し回数を書き込み、ファイル末尾を切り詰める
+
+        Args:
+            f: 書き込み先のファイル
+            sequencer: 保存するSequencerインスタンス
+        """
+        f.seek(self.tail_offset)
+        f.write(
+            b"".join(
+                INDEX_ENTRY.pack(pattern_idx, length, position)
+                for pattern_idx, (length, position) in sorted(self.index.items())
+            )
+        )
+        f.write(struct.pack(f"<{len(sequencer.song_sequence)}H", *sequencer.song_sequence))
+        f.write(bytes(sequencer.song_repeat(position) for position in range(len(sequencer.song_sequence))))
+        f.truncate()
+
+    def _save_full(self, sequencer):
+        """
+        ファイル全体を書き直す（一時ファイルに書いてから置き換える）
+
+        Args:
+            sequencer: 保存するSequencerインスタンス
+        """
+        store = sequencer.patterns
+        store.load_all()
+        self.close()
+
+        store.deduplicate()
+
+        offset = self._blocks_offset(store.track_count)
+        self.index = {}
+        blocks = []
+        # 配列 -> 書き込んだブロック位置（共有しているパターンは同じブロックを指す）
+        positions = {}
+        for pattern_idx in store.used_patterns():
+            length = store.length(pattern_idx)
+            if store.is_empty(pattern_idx):
+                self.index[pattern_idx] = (length, 0)
+                continue
+            key = store.block_key(pattern_idx)
+            if key in positions:
+                self.index[pattern_idx] = (length, positions[key])
+                continue
+            positions[key] = offset
+            self.index[pattern_idx] = (length, offset)
+            blocks.append(store.pattern_pitches(pattern_idx).tobytes())
+            offset += store.track_count * length
+        self.tail_offset = offset
+        self.wasted = 0
+        self.layout = (FORMAT_VERSION, store.track_count, store.step_count)
+
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "wb") as f:
+            self._write_header(f, sequencer)
+            f.write(b"".join(blocks))
+            self._write_tail(f, sequencer)
+        os.replace(tmp_filename, self.filename)
+
+    def _save_dirty(self, sequencer):
+        """
+        変更されたパターンのブロックだけを書き換える
+        長さが同じブロックはその場で上書きし、新しいブロックや長さが変わったブロックはインデックスの位置に追加する
+        他のパターンと共有しているブロックは上書きせず、内容が同じパターンのブロックがあればその位置を指す
+        書き込み中はメモリマップを閉じ、書き込み後に開き直す（まだ読み込んでいないパターンのブロックは動かさない）
+
+        Args:
+            sequencer: 保存するSequencerインスタンス
+        """
+        store = sequencer.patterns
+        store.deduplicate()
+        # ブロック位置 -> 指しているパターン数
+        refs = Counter(position for _, position in self.index.values() if position)
+        # 配列 -> 保存済みのブロック位置（変更されていない読み込み済みのパターンと、今回書いたパターン）
+        positions = {}
+        for pattern_idx, (_, position) in self.index.items():
+            key = store.block_key(pattern_idx)
+            if position and key is not None and pattern_idx not in store.dirty:
+                positions[key] = position
+        # マップしたまま切り詰めるとWindowsでは失敗し、他の環境でも切り詰めた範囲を読むとプロセスが落ちる
+        mapped = self._mmap is not None
+        self.close()
+        with open(self.filename, "r+b") as f:
+            for pattern_idx in sorted(store.dirty):
+                length = store.length(pattern_idx)
+                old_length, position = self.index.pop(pattern_idx, (length, 0))
+                if position:
+                    refs[position] -= 1
+                    if refs[position]:
+                        # 他のパターンも指しているブロックは残す
+                        position = 0
+                    elif old_length != length or store.is_empty(pattern_idx) or store.block_key(pattern_idx) in positions:
+                        self.wasted += store.track_count * old_length
+                        position = 0
+                if store.is_empty(pattern_idx):
+                    # 音のないパターンは既定以外の長さのときだけ記録する
+                    if length != store.step_count:
+                        self.index[pattern_idx] = (length, 0)
+                    continue
+                key = store.block_key(pattern_idx)
+                if key in positions:
+                    self.index[pattern_idx] = (length, positions[key])
+                    refs[positions[key]] += 1
+                    continue
+                if not position:
+                    position = self.tail_offset
+                    self.tail_offset += store.track_count * length
+                self.index[pattern_idx] = (length, position)
+                positions[key] = position
+                refs[position] += 1
+                f.seek(position)
+                f.write(store.pattern_pitches(pattern_idx).tobytes())
+            self._write_tail(f, sequencer)
+            self._write_header(f, sequencer)
+        if mapped:
+            self._open_map()
+
+    def close(self):
+        """メモリマップとファイルを閉じる"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
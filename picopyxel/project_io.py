@@ -0,0 +1,178 @@
+"""
+プロジェクト入出力モジュール - Sequencerの状態をファイルに保存・読み込みする
+"""
+
+import json
+import os
+
+from midi_io import export_midi, import_midi
+from project_file import ProjectFile
+from sequencer import Sequencer
+
+# プロジェクトファイル（JSON形式）のバージョン
+# 2: patternsを使用中のパターンだけの辞書（パターン番号 -> 長さとトラック）に変更
+# 3: ソング位置ごとの繰り返し回数song_repeatsを追加
+# 4: トラックごとの音色track_tonesと優先度track_prioritiesを追加（トラック数はtrack_volumesの長さ）
+# 5: 前のパターンと内容が同じパターンはtracksの代わりにsame_as（パターン番号）を保存
+PROJECT_VERSION = 5
+
+# バイナリ形式のプロジェクトファイルの拡張子
+BINARY_EXTENSION = ".ppx"
+
+# Standard MIDI Fileの拡張子
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+# load_projectで読み込めるファイルの拡張子
+PROJECT_EXTENSIONS = (".json", BINARY_EXTENSION) + MIDI_EXTENSIONS
+
+
+def sequencer_to_dict(sequencer):
+    """
+    Sequencerの状態を辞書に変換する
+
+    Args:
+        sequencer: 変換するSequencerインスタンス
+
+    Returns:
+        dict: JSONに変換可能な辞書
+    """
+    store = sequencer.patterns
+    patterns = {}
+    # セルの内容 -> 最初に保存したパターン番号
+    first_patterns = {}
+    for pattern_idx in store.used_patterns():
+        length = store.length(pattern_idx)
+        source = first_patterns.setdefault(store.pattern_pitches(pattern_idx).tobytes(), pattern_idx)
+        if source != pattern_idx:
+            patterns[str(pattern_idx)] = {"length": length, "same_as": source}
+            continue
+        patterns[str(pattern_idx)] = {
+            "length": length,
+            "tracks": [
+                [None if step_data is None else [step_data[0], step_data[1]] for step_data in track]
+                for track in store[pattern_idx]
+            ],
+        }
+    return {
+        "version": PROJECT_VERSION,
+        "tempo": sequencer.tempo,
+        "track_volumes": list(sequencer.track_volumes),
+        "track_tones": list(sequencer.track_tones),
+        "track_priorities": list(sequencer.track_priorities),
+        "song_sequence": list(sequencer.song_sequence),
+        "song_repeats": [sequencer.song_repeat(position) for position in range(len(sequencer.song_sequence))],
+        "patterns": patterns,
+    }
+
+
+def sequencer_from_dict(data, sequencer=None):
+    """
+    辞書からSequencerの状態を復元する
+
+    Args:
+        data: sequencer_to_dictで作成した辞書（バージョン1のパターンのリスト形式も可）
+        sequencer: 復元先のSequencerインスタンス。Noneの場合はデータのトラック数で新規作成し、指定した場合はトラック数をデータに合わせる
+
+    Returns:
+        Sequencer: 復元したSequencerインスタンス
+
+    Raises:
+        ValueError: データのトラック数が範囲外の場合
+    """
+    track_count = len(data["track_volumes"])
+    if sequencer is None:
+        sequencer = Sequencer(track_count=track_count)
+    elif track_count != sequencer.TRACK_COUNT:
+        # 復元先のトラック数をデータに合わせる（パターンは置き換えるので先に消去して読み込みを省く）
+        sequencer.patterns.clear_all()
+        sequencer.set_track_count(track_count)
+    sequencer.tempo = data["tempo"]
+    sequencer.track_volumes = list(data["track_volumes"])
+    if "track_tones" in data:
+        sequencer.track_tones = list(data["track_tones"])
+        sequencer.track_priorities = list(data["track_priorities"])
+    sequencer.song_sequence = list(data["song_sequence"])
+    sequencer.song_repeats = list(data.get("song_repeats", [1] * len(sequencer.song_sequence)))
+    patterns = data["patterns"]
+    if isinstance(patterns, list):
+        # バージョン1: 全パターンを16ステップのリストで保存
+        patterns = {str(pattern_idx): {"length": 16, "tracks": tracks} for pattern_idx, tracks in enumerate(patterns)}
+
+    store = sequencer.patterns
+    store.clear_all()
+    copies = []
+    for key, pattern in patterns.items():
+        pattern_idx = int(key)
+        if not 0 <= pattern_idx < sequencer.PATTERN_COUNT:
+            continue
+        if "same_as" in pattern:
+            copies.append((pattern["same_as"], pattern_idx))
+            continue
+        length = pattern["length"]
+        store.set_length(pattern_idx, length)
+        for track_idx, track in enumerate(pattern["tracks"][: sequencer.TRACK_COUNT]):
+            for step_idx, step_data in enumerate(track[:length]):
+                if step_data is not None:
+                    store[pattern_idx][track_idx][step_idx] = (step_data[0], step_data[1], track_idx)
+    # 同じ内容のパターンは配列を共有する（same_asのない古いファイルも内容で共有させる）
+    for source, pattern_idx in copies:
+        store.copy_pattern(source, pattern_idx)
+    store.deduplicate()
+    sequencer.compiler.mark_all_dirty()
+    sequencer.song_version += 1
+    sequencer.history.reset()
+    return sequencer
+
+
+def save_project(sequencer, filename):
+    """
+    プロジェクトをファイルに保存する
+    拡張子が.ppxの場合はバイナリ形式で保存し、同じファイルへの再保存では変更されたパターンだけを書き換える
+    別の.ppxファイルに保存した場合は、それまでのプロジェクトファイルを閉じて保存先に切り替える
+    拡張子が.mid/.midiの場合はソングをStandard MIDI Fileに書き出す
+    内容が同じパターンはメモリ上でも配列を共有させ、ファイルには1回だけ書く
+
+    Args:
+        sequencer: 保存するSequencerインスタンス
+        filename: 保存先ファイル名
+    """
+    sequencer.patterns.deduplicate()
+    if filename.endswith(MIDI_EXTENSIONS):
+        export_midi(sequencer, filename)
+        return
+
+    if filename.endswith(BINARY_EXTENSION):
+        previous = sequencer.project_file
+        project_file = previous
+        if project_file is None or os.path.abspath(project_file.filename) != os.path.abspath(filename):
+            project_file = ProjectFile(filename)
+        project_file.save(sequencer)
+        # 別名で保存した場合、読み込み元のファイル（保存時にすべてのパターンを読み込み済み）を閉じる
+        if previous is not None and previous is not project_file:
+            previous.close()
+        return
+
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(sequencer_to_dict(sequencer), f, ensure_ascii=False)
+
+
+def load_project(filename, sequencer=None):
+    """
+    プロジェクトをファイルから読み込む
+    拡張子が.ppxの場合はバイナリ形式として読み込み、パターンは最初に参照されたときにデコードする
+    拡張子が.mid/.midiの場合はStandard MIDI Fileをパターンとソングに変換して読み込む
+
+    Args:
+        filename: 読み込むファイル名
+        sequencer: 復元先のSequencerインスタンス。Noneの場合は新規作成
+
+    Returns:
+        Sequencer: 読み込んだSequencerインスタンス
+    """
+    if filename.endswith(BINARY_EXTENSION):
+        return ProjectFile(filename).load(sequencer)
+    if filename.endswith(MIDI_EXTENSIONS):
+        return import_midi(filename, sequencer)
+
+    with open(filename, encoding="utf-8") as f:
+        return sequencer_from_dict(json.load(f), sequencer)
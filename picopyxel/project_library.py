@@ -0,0 +1,303 @@
+"""
+プロジェクトライブラリモジュール - ディレクトリ内のプロジェクトの一覧（ディスク上の索引）と、開いたSequencerのLRUキャッシュを担当
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+from project_io import PROJECT_EXTENSIONS, load_project, save_project
+from sequencer import Sequencer
+
+# 索引ファイル名（ライブラリのディレクトリに作成）
+INDEX_FILENAME = ".picopyxel_library.json"
+
+# 索引の形式のバージョン（項目の内容を変えたら上げて作り直させる）
+INDEX_VERSION = 1
+
+# サムネイルに含めるステップ数
+THUMBNAIL_STEPS = 16
+
+
+class ProjectLibrary:
+    """
+    ディレクトリ内のプロジェクトを管理するクラス
+    プロジェクトごとのメタデータ（名前、テンポ、パターン数、ソング長、先頭パターンのサムネイル）を索引ファイルに保存し、
+    ファイルの更新日時とサイズが変わったものだけを読み直す
+    最近開いたSequencerはメモリ使用量の見積もりがmax_bytesに収まる範囲でLRUキャッシュに残し、再度開くときはファイルを読まない
+    """
+
+    # キャッシュのメモリ上限の既定値
+    DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+
+    # Sequencer 1つあたりの固定の見積もりバイト数（パターンデータ以外）
+    SEQUENCER_BYTES = 32 * 1024
+
+    def __init__(self, directory, sequencer_factory=Sequencer, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        ライブラリの初期化（索引ファイルがあれば読み込む）
+
+        Args:
+            directory: プロジェクトのディレクトリ
+            sequencer_factory: 読み込み先のSequencerを作る関数（引数なし）
+            max_bytes: キャッシュするSequencerのメモリ上限（見積もり）
+        """
+        self.directory = directory
+        self.sequencer_factory = sequencer_factory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+        # プロジェクト名 -> メタデータ
+        self.entries = self._load_index()
+        # プロジェクト名 -> (Sequencer, 見積もりバイト数, 読み込み・保存時の状態)（末尾ほど最近使用）
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        # 最後に開いたプロジェクト（アプリで編集中のため追い出さない）
+        self.active = None
+        # 統計
+        self.hits = 0
+        self.misses = 0
+
+    # 索引
+
+    def _load_index(self):
+        """
+        索引ファイルを読み込む
+
+        Returns:
+            dict: プロジェクト名 -> メタデータ。ファイルがないか形式が違う場合は空
+        """
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return {}
+        return data.get("projects", {})
+
+    def save_index(self):
+        """索引ファイルを書き込む（一時ファイルに書いてから置き換える）"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "projects": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def path(self, name):
+        """
+        プロジェクトのファイルパスを返す
+
+        Args:
+            name: プロジェクト名（ファイル名）
+
+        Returns:
+            str: ファイルパス
+        """
+        return os.path.join(self.directory, name)
+
+    def names(self):
+        """
+        索引にあるプロジェクト名を返す
+
+        Returns:
+            list: プロジェクト名（名前順）
+        """
+        return sorted(self.entries)
+
+    def refresh(self):
+        """
+        ディレクトリを走査して索引を更新する
+        更新日時かサイズが変わったプロジェクトだけを読み込み（読み込んだSequencerはキャッシュに入れる）、消えたものは索引から除く
+
+        Returns:
+            list: 読み込めなかったプロジェクトの(名前, エラーメッセージ)
+        """
+        names = {name for name in os.listdir(self.directory) if name.endswith(PROJECT_EXTENSIONS) and not name.startswith(".")}
+        changed = False
+        errors = []
+        for name in list(self.entries):
+            if name not in names:
+                del self.entries[name]
+                self._evict(name, save=False)
+                changed = True
+
+        for name in sorted(names):
+            entry = self.entries.get(name)
+            stat = os.stat(self.path(name))
+            if entry is not None and (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            # ファイルが変わった場合はキャッシュも読み直す
+            self._evict(name, save=False)
+            try:
+                self._load(name)
+            except (OSError, ValueError, KeyError) as e:
+                self.entries.pop(name, None)
+                errors.append((name, str(e)))
+            changed = True
+
+        if changed:
+            self.save_index()
+        return errors
+
+    def _update_entry(self, name, sequencer):
+        """
+        Sequencerの内容から索引の項目を作る（ファイルは読まない）
+
+        Args:
+            name: プロジェクト名
+            sequencer: プロジェクトを読み込んだSequencerインスタンス
+        """
+        store = sequencer.patterns
+        first_pattern = sequencer.song_sequence[0] if sequencer.song_sequence else 0
+        stat = os.stat(self.path(name))
+        self.entries[name] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "name": os.path.splitext(name)[0],
+            "tempo": sequencer.tempo,
+            "pattern_count": len(store.used_patterns()),
+            "song_length": len(sequencer.song_sequence),
+            "thumbnail": [
+                list(store.track_pitches(first_pattern, track_idx)[:THUMBNAIL_STEPS])
+                for track_idx in range(sequencer.TRACK_COUNT)
+            ],
+        }
+
+    # キャッシュ
+
+    def _state(self, sequencer):
+        """
+        保存が必要かを判定するためのSequencerの状態を返す
+
+        Args:
+            sequencer: Sequencerインスタンス
+
+        Returns:
+            tuple: ソング・パターン・テンポ・トラック設定の変更で変わる値
+        """
+        store = sequencer.patterns
+        return (
+            sequencer.song_version,
+            store.length_version,
+            sum(store.versions.values()),
+            sequencer.tempo,
+            tuple(sequencer.track_volumes),
+            tuple(sequencer.track_tones),
+            tuple(sequencer.track_priorities),
+        )
+
+    def _estimate_bytes(self, sequencer):
+        """
+        Sequencerのメモリ使用量を見積もる
+
+        Args:
+            sequencer: Sequencerインスタンス
+
+        Returns:
+            int: 見積もりバイト数
+        """
+        store = sequencer.patterns
+        return self.SEQUENCER_BYTES + store.block_bytes() + 16 * len(sequencer.song_sequence) + sequencer.history.bytes
+
+    def _load(self, name):
+        """
+        プロジェクトをファイルから読み込み、索引とキャッシュに登録する
+
+        Args:
+            name: プロジェクト名
+
+        Returns:
+            Sequencer: 読み込んだSequencerインスタンス
+        """
+        sequencer = load_project(self.path(name), self.sequencer_factory())
+        self.misses += 1
+        self._update_entry(name, sequencer)
+        self._insert(name, sequencer)
+        return sequencer
+
+    def _insert(self, name, sequencer):
+        """
+        Sequencerをキャッシュに入れ、上限を超えた分を古いものから追い出す（入れたものと開いているものは残す）
+
+        Args:
+            name: プロジェクト名
+            sequencer: Sequencerインスタンス
+        """
+        size = self._estimate_bytes(sequencer)
+        self.cache[name] = (sequencer, size, self._state(sequencer))
+        self.cache_bytes += size
+        for old_name in list(self.cache):
+            if self.cache_bytes <= self.max_bytes:
+                break
+            if old_name not in (name, self.active):
+                self._evict(old_name)
+
+    def _evict(self, name, save=True):
+        """
+        Sequencerをキャッシュから追い出す（変更があればファイルに保存する）
+
+        Args:
+            name: プロジェクト名
+            save: Falseの場合は変更があっても保存しない（ファイル側が変わった場合など）
+        """
+        cached = self.cache.pop(name, None)
+        if cached is None:
+            return
+        sequencer, size, state = cached
+        self.cache_bytes -= size
+        if save and self._state(sequencer) != state:
+            save_project(sequencer, self.path(name))
+            self._update_entry(name, sequencer)
+            self.save_index()
+        if sequencer.project_file is not None:
+            sequencer.project_file.close()
+
+    def is_cached(self, name):
+        """
+        Sequencerがキャッシュにあるかを判定する
+
+        Args:
+            name: プロジェクト名
+
+        Returns:
+            bool: キャッシュにあればTrue
+        """
+        return name in self.cache
+
+    def open(self, name):
+        """
+        プロジェクトを開く（キャッシュにあればファイルを読まずに返す）
+
+        Args:
+            name: プロジェクト名
+
+        Returns:
+            Sequencer: プロジェクトのSequencerインスタンス
+        """
+        cached = self.cache.get(name)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(name)
+            sequencer = cached[0]
+        else:
+            sequencer = self._load(name)
+            self.save_index()
+        self.active = name
+        return sequencer
+
+    def save(self, name):
+        """
+        キャッシュにあるプロジェクトをファイルに保存し、索引を更新する
+
+        Args:
+            name: プロジェクト名
+        """
+        sequencer, size, _ = self.cache[name]
+        save_project(sequencer, self.path(name))
+        self.cache[name] = (sequencer, size, self._state(sequencer))
+        self._update_entry(name, sequencer)
+        self.save_index()
+
+    def close(self):
+        """キャッシュにあるプロジェクトをすべて追い出す（変更があれば保存する）"""
+        for name in list(self.cache):
+            self._evict(name)
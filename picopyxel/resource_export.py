@@ -0,0 +1,217 @@
+"""
+リソース書き出しモジュール - ソングをPyxelのサウンド・ミュージックに変換し、リソースファイル(.pyxres)に書き出す
+
+書き出したファイルはゲーム側で一度pyxel.loadすれば、pyxel.playmだけで再生できる（毎フレームのPython処理は不要）
+内容が同じソングからは常に同じバイト列を生成し、既存のファイルと同じ場合は書き換えない
+
+使い方:
+    python picopyxel/resource_export.py <プロジェクトファイル> <出力.pyxres> [-m ミュージック番号]
+"""
+
+import argparse
+import io
+import os
+import sys
+import zipfile
+
+from pattern_store import EMPTY
+from project_io import load_project
+
+# リソースファイル内のファイル名と形式のバージョン
+RESOURCE_NAME = "pyxel_resource.toml"
+RESOURCE_FORMAT_VERSION = 3
+
+# Pyxelのサウンド数とミュージック数
+SOUND_COUNT = 64
+MUSIC_COUNT = 8
+
+# ZIPに記録する更新日時（内容が同じなら同じバイト列にするため固定）
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# 音色の番号（Pyxelのtones）
+TONE_NUMBERS = {"t": 0, "s": 1, "p": 2, "n": 3}
+
+# 空きスロットに書くサウンド（Pyxelの既定の速度）
+EMPTY_SOUND = ((), (), (), (), 30)
+
+
+def song_sounds(sequencer):
+    """
+    ソング（ソングが空なら現在のパターン）をPyxelのサウンドとミュージックの内容に変換する
+    パターン × トラックごとのサウンドを内容で重複排除し、ソング順に0番から割り当てる
+    サウンド数が足りない場合はトラックごとにソング全体を1つのサウンドにつなげる
+
+    Args:
+        sequencer: 変換するSequencerインスタンス
+
+    Returns:
+        tuple: (サウンドのリスト, チャンネルごとのサウンド番号のリスト)。
+            サウンドは(notes, tones, volumes, effects, speed)で、各値はPyxelのリソースと同じ整数
+
+    Raises:
+        ValueError: トラック数がチャンネル数を超える場合
+    """
+    if sequencer.TRACK_COUNT > sequencer.CHANNEL_COUNT:
+        raise ValueError(f"too many tracks for a music: {sequencer.TRACK_COUNT} > {sequencer.CHANNEL_COUNT}")
+    if sequencer.song_sequence:
+        pattern_order = sequencer.song_timeline().sound_patterns()
+    else:
+        pattern_order = [sequencer.current_pattern]
+    subdivision, speed = sequencer.compiler.step_layout(sequencer.tempo)
+    rests = (EMPTY,) * (subdivision - 1)
+    store = sequencer.patterns
+
+    # (パターン, トラック) -> ノートの並び
+    track_notes = {}
+    for pattern_idx in dict.fromkeys(pattern_order):
+        for track_idx in range(sequencer.TRACK_COUNT):
+            notes = []
+            for pitch in store.track_pitches(pattern_idx, track_idx):
+                notes.append(pitch)
+                notes.extend(rests)
+            track_notes[pattern_idx, track_idx] = tuple(notes)
+
+    def sound(track_idx, notes):
+        return (
+            notes,
+            (TONE_NUMBERS[sequencer.track_tones[track_idx]],),
+            (sequencer.track_volumes[track_idx],),
+            (0,),
+            speed,
+        )
+
+    sounds = {}
+    seqs = [[] for _ in range(sequencer.TRACK_COUNT)]
+    for pattern_idx in pattern_order:
+        for track_idx, seq in enumerate(seqs):
+            key = sound(track_idx, track_notes[pattern_idx, track_idx])
+            seq.append(sounds.setdefault(key, len(sounds)))
+
+    if len(sounds) > SOUND_COUNT:
+        # 異なるサウンドがスロットに収まらない場合はトラックごとに1つにつなげる
+        sounds = {}
+        for track_idx, seq in enumerate(seqs):
+            notes = tuple(note for pattern_idx in pattern_order for note in track_notes[pattern_idx, track_idx])
+            sounds[sound(track_idx, notes)] = track_idx
+            seqs[track_idx] = [track_idx]
+    return list(sounds), seqs
+
+
+def _toml_list(values):
+    """
+    整数の並びをTOMLの配列の文字列にする
+
+    Args:
+        values: 整数の並び（入れ子も可）
+
+    Returns:
+        str: TOMLの配列
+    """
+    return "[" + ", ".join(_toml_list(value) if isinstance(value, (list, tuple)) else str(value) for value in values) + "]"
+
+
+def resource_toml(sequencer, music_idx=0):
+    """
+    リソースファイルの内容（TOML）を作る
+    pyxel.loadは空でない配列でサウンド・ミュージックの全スロットを置き換えるため、
+    ソングのサウンドを0番から並べて残りを空のサウンドで埋め、ミュージックも全8個を書く（music_idx番以外は空）
+    画像とタイルマップは空の配列にする（Pyxelの読み込みに必要で、空ならゲーム側の内容は変わらない）
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+        music_idx: ソングを設定するミュージック番号
+
+    Returns:
+        str: pyxel_resource.tomlの内容
+
+    Raises:
+        ValueError: ミュージック番号が範囲外の場合、またはトラック数がチャンネル数を超える場合
+    """
+    if not 0 <= music_idx < MUSIC_COUNT:
+        raise ValueError(f"music index out of range: {music_idx}")
+    sounds, seqs = song_sounds(sequencer)
+    sounds += [EMPTY_SOUND] * (SOUND_COUNT - len(sounds))
+
+    lines = [f"format_version = {RESOURCE_FORMAT_VERSION}", "images = []", "tilemaps = []"]
+    for notes, tones, volumes, effects, speed in sounds:
+        lines += [
+            "",
+            "[[sounds]]",
+            f"notes = {_toml_list(notes)}",
+            f"tones = {_toml_list(tones)}",
+            f"volumes = {_toml_list(volumes)}",
+            f"effects = {_toml_list(effects)}",
+            f"speed = {speed}",
+        ]
+    for idx in range(MUSIC_COUNT):
+        lines += ["", "[[musics]]", f"seqs = {_toml_list(seqs if idx == music_idx else [])}"]
+    return "\n".join(lines) + "\n"
+
+
+def resource_bytes(sequencer, music_idx=0):
+    """
+    リソースファイル（ZIP）のバイト列を作る（日時と圧縮方法を固定し、同じ内容なら同じバイト列にする）
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+        music_idx: ソングを設定するミュージック番号
+
+    Returns:
+        bytes: .pyxresファイルの内容
+    """
+    info = zipfile.ZipInfo(RESOURCE_NAME, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr(info, resource_toml(sequencer, music_idx), compresslevel=9)
+    return buffer.getvalue()
+
+
+def export_pyxres(sequencer, filename, music_idx=0):
+    """
+    ソングをリソースファイルに書き出す（既存のファイルと内容が同じ場合は書き換えない）
+
+    Args:
+        sequencer: 書き出すSequencerインスタンス
+        filename: 出力ファイル名
+        music_idx: ソングを設定するミュージック番号
+
+    Returns:
+        bool: ファイルを書き換えた場合はTrue
+    """
+    data = resource_bytes(sequencer, music_idx)
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            if f.read() == data:
+                return False
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filename, filename)
+    return True
+
+
+def main(argv=None):
+    """
+    コマンドラインのエントリーポイント
+
+    Args:
+        argv: コマンドライン引数。Noneの場合はsys.argvを使用
+
+    Returns:
+        int: 終了コード
+    """
+    parser = argparse.ArgumentParser(description="picopyxelのソングをPyxelのリソースファイルに書き出す")
+    parser.add_argument("project", help="プロジェクトファイル（.json / .ppx / .mid）")
+    parser.add_argument("output", help="出力する.pyxresファイル")
+    parser.add_argument("-m", "--music", type=int, default=0, help="ソングを設定するミュージック番号（既定は0）")
+    args = parser.parse_args(argv)
+
+    written = export_pyxres(load_project(args.project), args.output, args.music)
+    print(f"{'written' if written else 'unchanged'}: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,12 +2,22 @@
 シーケンサーモジュール - 音楽シーケンスの管理と再生を担当
 """
 
-import pyxel
+from time import perf_counter
+
+from backend import PyxelBackend
+from frame_profiler import FrameProfiler
+from edit_history import EditHistory
+from pattern_compiler import PatternCompiler
+from pattern_store import EMPTY, PatternStore
+from song_timeline import SongTimeline
+from sound_bank import SoundBank
+from step_clock import FrameClock, StepScheduler
+from voice_allocator import VoiceAllocator
 
 
 class Sequencer:
     """
-    16ステップのシーケンサークラス
+    16ステップ（パターンごとに32・64ステップにも変更可能）のシーケンサークラス
     音階データの管理と再生を行う
     バージョン2.0: 4トラック、パターン管理、ソングモード対応
     """
@@ -42,35 +52,65 @@ class Sequencer:
     MIN_VOLUME = 0
     MAX_VOLUME = 7
 
-    # トラック数
+    # 優先度の範囲（チャンネルが足りないときは大きいほど優先して鳴らす）
+    MIN_PRIORITY = 0
+    MAX_PRIORITY = 9
+
+    # トラック数（既定値。コンストラクタで変更できる）
     TRACK_COUNT = 4
+    MAX_TRACK_COUNT = 16
+
+    # Pyxelのチャンネル数（トラック数がこれを超える場合はボイス割り当てで共有する）
+    CHANNEL_COUNT = 4
+
+    # パターン数（音のないパターンはメモリを使わない）
+    PATTERN_COUNT = 256
+
+    # 選択できるパターンの長さ（ステップ数、先頭が既定）
+    PATTERN_LENGTHS = (16, 32, 64)
 
-    # パターン数
-    PATTERN_COUNT = 16
+    # ソングの各位置の最大繰り返し回数
+    MAX_SONG_REPEAT = 16
 
-    # トラックごとの固定音色
+    # トラックごとの既定の音色（5トラック目以降は繰り返す）
     TRACK_SOUND_TYPES = ["t", "s", "p", "n"]  # Triangle, Square, Pulse, Noise
 
-    def __init__(self):
-        """シーケンサーの初期化"""
-        # 4トラック対応
-        self.tracks = [
-            [None for _ in range(16)]
-            for _ in range(self.TRACK_COUNT)  # 各トラック16ステップ
-        ]
-        self.track_volumes = [5, 5, 5, 5]  # 各トラックの音量（0-7）
+    def __init__(self, clock=None, backend=None, track_count=None):
+        """
+        シーケンサーの初期化
+
+        Args:
+            clock: ステップ進行に使う時計（FrameClock、MonotonicClock、FakeClockなど）。Noneの場合はFrameClock
+            backend: 音を鳴らすバックエンド（PyxelBackend、HeadlessBackend）。Noneの場合はPyxelBackend
+            track_count: 論理トラック数（1-16）。Noneの場合はTRACK_COUNT。CHANNEL_COUNTを超える分はチャンネルを共有する
+
+        Raises:
+            ValueError: トラック数が範囲外の場合
+        """
+        if track_count is not None:
+            if not 1 <= track_count <= self.MAX_TRACK_COUNT:
+                raise ValueError(f"track count out of range: {track_count}")
+            self.TRACK_COUNT = track_count
+        # 音声の呼び出し先
+        self.backend = backend or PyxelBackend()
+        self.track_volumes = [5] * self.TRACK_COUNT  # 各トラックの音量（0-7）
+        # 各トラックの音色と、チャンネルが足りないときの優先度（大きいほど優先）
+        self.track_tones = [self.TRACK_SOUND_TYPES[i % len(self.TRACK_SOUND_TYPES)] for i in range(self.TRACK_COUNT)]
+        self.track_priorities = [0] * self.TRACK_COUNT
         self.current_track = 0  # 現在編集中のトラック
 
-        # パターン管理
-        self.patterns = [
-            [[None for _ in range(16)] for _ in range(self.TRACK_COUNT)]
-            for _ in range(self.PATTERN_COUNT)  # 最大16パターン
-        ]
+        # パターン管理（音のあるパターンだけ配列を確保、patterns[パターン][トラック][ステップ]でも参照可能）
+        self.patterns = PatternStore(self.PATTERN_COUNT, self.TRACK_COUNT, self.PATTERN_LENGTHS[0], max(self.PATTERN_LENGTHS))
         self.current_pattern = 0  # 現在編集中のパターン
 
         # ソングモード
         self.song_sequence = []  # パターン番号のリスト
+        self.song_repeats = []  # ソング位置ごとの繰り返し回数（足りない位置は1回）
         self.song_position = 0  # 現在再生中のソング位置
+        self.song_step = 0  # ソング先頭からの再生中の絶対ステップ
+        # ソングの各位置の開始ステップの索引と、作成時の(ソング変更回数, パターン長の変更回数)
+        self.timeline = SongTimeline()
+        self._timeline_key = None
         self.song_mode = False  # ソングモード（True）かパターンモード（False）か
 
         # 現在再生中のステップ位置
@@ -79,8 +119,38 @@ class Sequencer:
         self.playing = False
         # テンポ（BPM）
         self.tempo = 120
-        # 前回のフレーム時間（テンポ計算用）
-        self.last_frame_time = 0
+        # ステップ進行のスケジューラー（テンポ計算用）
+        self.scheduler = StepScheduler(clock if clock is not None else FrameClock(backend=self.backend))
+        # 単音再生用のサウンドスロット割り当て（同じ音は設定済みのスロットを再利用）
+        self.sound_bank = SoundBank(0, PatternCompiler.FIRST_SLOT, self.backend)
+        # ステップごとの再生で音をチャンネルに割り当てる（奪った音・鳴らせなかった音を数える）
+        self.voices = VoiceAllocator(self.CHANNEL_COUNT)
+        # ボイス割り当てに使う再生したステップの通し番号と、優先度順のトラックの並び
+        self._voice_step = 0
+        self._track_order = None
+        # 試聴専用のチャンネル（最初の試聴のときにバックエンドに用意させる）
+        self._preview_channel = None
+        # 試聴の統計（鳴らした回数、入力から再生までの直近と最大の遅延（秒））
+        self.audition_count = 0
+        self.audition_latency = 0.0
+        self.audition_latency_max = 0.0
+        # パターンとソングをPyxelのミュージックに変換するコンパイラー
+        self.compiler = PatternCompiler(self)
+        # Trueの場合はコンパイルしたミュージックをオーディオスレッドで再生する
+        self.use_music_engine = True
+        # ミュージック再生中かどうか（Falseの場合はステップごとにPythonから再生）
+        self._music_active = False
+        # 再生中のミュージックの元になった状態とパターン番号
+        self._music_source = None
+        self._music_patterns = []
+        # ソングシーケンスの変更回数（ミュージックの再変換判定用）
+        self.song_version = 0
+        # 処理時間の計測（PicoPixelと共有する。既定は無効）
+        self.profiler = FrameProfiler()
+        # 編集履歴（元に戻す・やり直す、変更の差分だけを記録する）
+        self.history = EditHistory(self)
+        # 読み込み・保存に使ったプロジェクトファイル（バイナリ形式の差分保存用）
+        self.project_file = None
         # 現在選択中のオクターブ
         self.current_octave = 4
         # 現在選択中の音階（デフォルトはC）
@@ -96,30 +166,183 @@ class Sequencer:
         if not self.playing:
             return
 
-        # テンポに基づいてステップを進める
+        if self._music_active:
+            self._update_music()
+            return
+
+        # テンポに基づいて進めるべきステップ数を取得
         # 60 BPM = 1秒に1ステップ
         # 120 BPM = 0.5秒に1ステップ
-        step_time = 60 / self.tempo  # 秒単位のステップ時間
+        steps = self.scheduler.advance(self.tempo)
+        if steps == 0:
+            return
 
-        # 現在の時間
-        current_time = pyxel.frame_count / 30  # 30FPSと仮定
+        # フレーム落ちで遅れた分もまとめて進める（追いつき）
+        for _ in range(steps):
+            self._advance_step()
 
-        # ステップを進めるべき時間かチェック
-        if current_time - self.last_frame_time >= step_time:
-            self.last_frame_time = current_time
+        # 現在のステップの音を鳴らす（追いついた途中のステップは鳴らさない）
+        self.profiler.lap(FrameProfiler.SEQUENCER)
+        self.play_current_step()
+        self.profiler.lap(FrameProfiler.SOUND)
 
-            # 次のステップへ
-            self.current_step = (self.current_step + 1) % 16
+    def _advance_step(self):
+        """再生位置を1ステップ進める"""
+        # ソングモードの場合はソング全体の絶対ステップを進め、タイムラインから位置を求める
+        if self.song_mode and self.song_sequence:
+            self._seek_song(self.song_step + 1)
+            return
 
-            # パターンの終わりに達した場合の処理
-            if self.song_mode and self.current_step == 0:
-                # ソングモードの場合、次のパターンへ
-                self.song_position = (self.song_position + 1) % len(self.song_sequence) if self.song_sequence else 0
-                if self.song_sequence:
-                    self.current_pattern = self.song_sequence[self.song_position]
+        # 次のステップへ
+        self.current_step = (self.current_step + 1) % self.patterns.length(self.current_pattern)
+        if self.song_mode:
+            self.song_position = 0
+
+    def song_repeat(self, position):
+        """
+        ソング位置の繰り返し回数を返す
+
+        Args:
+            position: ソング位置
+
+        Returns:
+            int: 繰り返し回数
+        """
+        return self.song_repeats[position] if position < len(self.song_repeats) else 1
+
+    def _song_entries(self, start=0, stop=None):
+        """
+        ソングの(パターン番号, 長さ, 繰り返し回数)を順に返す
+
+        Args:
+            start: 最初のソング位置
+            stop: 最後のソング位置の次。Noneの場合は末尾まで
+        """
+        for position in range(start, len(self.song_sequence) if stop is None else stop):
+            pattern_idx = self.song_sequence[position]
+            yield pattern_idx, self.patterns.length(pattern_idx), self.song_repeat(position)
+
+    def song_timeline(self):
+        """
+        ソングのタイムラインを返す（ソングかパターンの長さが変わっていれば作り直す）
 
-            # 現在のステップの音を鳴らす
-            self.play_current_step()
+        Returns:
+            SongTimeline: ソングの各位置の開始ステップの索引
+        """
+        if self._timeline_key != (self.song_version, self.patterns.length_version):
+            self.timeline.build(self._song_entries())
+            self._timeline_key = (self.song_version, self.patterns.length_version)
+        return self.timeline
+
+    def _update_timeline(self, position, count, new_count):
+        """
+        ソングの編集をタイムラインに反映する（最新のタイムラインなら変更位置以降だけを作り直す）
+
+        Args:
+            position: 編集したソング位置
+            count: 取り除いた位置の数
+            new_count: 追加した位置の数
+        """
+        current = self._timeline_key == (self.song_version, self.patterns.length_version)
+        self.song_version += 1
+        if current:
+            old_total = self.timeline.total_steps
+            self.timeline.splice(position, count, self._song_entries(position, position + new_count))
+            self._timeline_key = (self.song_version, self.patterns.length_version)
+            if self.playing and position < self.song_position:
+                # 再生中の位置より前の編集では、同じ箇所を再生し続けるよう絶対ステップをずらす
+                self.song_position += new_count - count
+                self.song_step += self.timeline.total_steps - old_total
+
+    def _seek_song(self, step):
+        """
+        ソングの絶対ステップに再生位置を合わせる
+
+        Args:
+            step: ソング先頭からの絶対ステップ（ソングの長さを超えた分は先頭に戻る）
+        """
+        timeline = self.song_timeline()
+        located = timeline.locate(step)
+        if located is None:
+            return
+        self.song_position, _, self.current_pattern, self.current_step = located
+        self.song_step = step % timeline.total_steps
+
+    def _current_music_source(self):
+        """
+        再生すべきミュージックを識別する値を返す
+
+        Returns:
+            tuple: ソング再生中は(True, ソング変更回数)、パターン再生中は(False, パターン番号)
+        """
+        if self.song_mode and self.song_sequence:
+            return (True, self.song_version)
+        return (False, self.current_pattern)
+
+    def _start_music(self, start_step=0):
+        """
+        パターンまたはソングをコンパイルしてミュージック再生を開始する
+
+        Args:
+            start_step: 再生を始めるステップ（ソング再生ではソング先頭からの絶対ステップ）
+
+        Returns:
+            bool: ミュージック再生を開始できた場合True
+        """
+        source = self._current_music_source()
+        # ソングは繰り返しを展開した並びにする
+        pattern_indices = self.song_timeline().sound_patterns() if source[0] else [self.current_pattern]
+        try:
+            music_idx = self.compiler.compile_music(
+                PatternCompiler.SONG_MUSIC if source[0] else PatternCompiler.PATTERN_MUSIC, pattern_indices
+            )
+        except ValueError:
+            # サウンドスロットが足りない場合はステップごとの再生に切り替える
+            self._music_active = False
+            self._music_source = None
+            self.backend.stop()
+            self.scheduler.start()
+            return False
+
+        self.backend.playm(music_idx, sec=start_step * self.compiler.step_seconds(self.tempo), loop=True)
+
+        self._music_active = True
+        self._music_source = source
+        self._music_patterns = pattern_indices
+        return True
+
+    def _update_music(self):
+        """ミュージック再生中の再生位置を取得し、編集があれば反映する"""
+        if self._music_source != self._current_music_source() or self.compiler.is_stale(self._music_patterns):
+            # 編集内容を反映して現在位置から再生し直す
+            self.profiler.lap(FrameProfiler.SEQUENCER)
+            started = self._start_music(self._next_step())
+            self.profiler.lap(FrameProfiler.SOUND)
+            if not started:
+                return
+
+        # 再生位置の取得（チャンネル0は休符のみのパターンでも常に再生されている）
+        pos = self.backend.play_pos(0)
+        if pos is None:
+            return
+        sound_index, sec = pos
+        step = int(sec / self.compiler.step_seconds(self.tempo))
+        if self._music_source[0]:
+            timeline = self.song_timeline()
+            self._seek_song(timeline.sound_step(sound_index % timeline.total_sounds) + step)
+        else:
+            self.current_step = step % self.patterns.length(self.current_pattern)
+
+    def _next_step(self):
+        """
+        現在の再生位置の次のステップを返す（再生し直すときの開始位置）
+
+        Returns:
+            int: ソング再生ではソング先頭からの絶対ステップ、パターン再生ではパターン内のステップ
+        """
+        if self._current_music_source()[0]:
+            return (self.song_step + 1) % self.song_timeline().total_steps
+        return (self.current_step + 1) % self.pattern_length()
 
     def toggle_play(self):
         """再生/停止を切り替える"""
@@ -128,14 +351,57 @@ class Sequencer:
         if self.playing:
             # 再生開始時は最初のステップから
             self.current_step = 0
-            self.last_frame_time = pyxel.frame_count / 30
+            self.scheduler.start()
+            self.voices.reset()
 
             # ソングモードの場合は最初のパターンから
             if self.song_mode:
                 self.song_position = 0
+                self.song_step = 0
                 if self.song_sequence:
                     self.current_pattern = self.song_sequence[0]
 
+            if self.use_music_engine:
+                self._start_music()
+        elif self._music_active:
+            self.backend.stop()
+            self._music_active = False
+            self._music_source = None
+
+    def play_from(self, step):
+        """
+        指定した位置から再生を始める（再生中なら位置を移動する）
+
+        Args:
+            step: ソングモードではソング先頭からの絶対ステップ、パターンモードではパターン内のステップ
+        """
+        if not self.playing:
+            self.playing = True
+            self.scheduler.start()
+
+        if self.song_mode and self.song_sequence:
+            self._seek_song(step)
+            start_step = self.song_step
+        else:
+            self.current_step = step % self.pattern_length()
+            start_step = self.current_step
+
+        if self.use_music_engine and self._start_music(start_step):
+            return
+        # ステップごとの再生では指定した位置の音をすぐに鳴らす
+        self.play_current_step()
+
+    def play_from_position(self, position, repeat=0):
+        """
+        ソング位置の先頭から再生を始める
+
+        Args:
+            position: ソング位置
+            repeat: 繰り返し回目
+        """
+        if 0 <= position < len(self.song_sequence):
+            self.play_from(self.song_timeline().position_step(position, repeat))
+
     def input_note(self, step_idx, track_idx=None, note=None):
         """
         指定したステップに音階を入力する
@@ -148,73 +414,155 @@ class Sequencer:
         if track_idx is None:
             track_idx = self.current_track
 
-        if 0 <= step_idx < 16 and 0 <= track_idx < self.TRACK_COUNT:
+        if 0 <= step_idx < self.pattern_length() and 0 <= track_idx < self.TRACK_COUNT:
             if note is None:
-                if self.current_note is None:
-                    # 音を消去
-                    self.patterns[self.current_pattern][track_idx][step_idx] = None
-                else:
-                    # 現在選択中の音階を入力（トラックごとに固定の音色を使用）
-                    self.patterns[self.current_pattern][track_idx][step_idx] = (
-                        self.current_note,
-                        self.current_octave,
-                        track_idx,  # トラックインデックスを音色タイプとして使用
-                    )
-            else:
-                # 指定された音階を入力（トラックごとに固定の音色を使用）
-                self.patterns[self.current_pattern][track_idx][step_idx] = (note, self.current_octave, track_idx)
+                # 現在選択中の音階を入力（Noneの場合は音を消去）
+                note = self.current_note
+            # 音色はトラックごとに固定のため、音高だけを記録する
+            pitch = EMPTY if note is None else self.current_octave * 12 + self.NOTE_MAP[note]
+            self.patterns.set_pitch(self.current_pattern, track_idx, step_idx, pitch)
+            self.compiler.mark_dirty(self.current_pattern)
+            self.history.commit("input_note")
+
+    def note_positions(self, pattern_idx=None):
+        """
+        パターン内の音符がある位置を返す（編集のたびに差分で更新される索引）
 
-    def play_current_step(self):
-        """現在のステップの音を再生する"""
-        # 現在のパターンの全トラックを処理
-        for track_idx in range(self.TRACK_COUNT):
-            step_data = self.patterns[self.current_pattern][track_idx][self.current_step]
+        Args:
+            pattern_idx: パターン番号。Noneの場合は現在のパターン
+
+        Returns:
+            dict: (ステップ, 音階インデックス) -> 音符があるトラックのビットマスク
+        """
+        if pattern_idx is None:
+            pattern_idx = self.current_pattern
+        return self.patterns.note_positions(pattern_idx)
+
+    def pattern_length(self, pattern_idx=None):
+        """
+        パターンの長さを返す
 
-            if step_data is not None:
-                note, octave, sound_type_idx = step_data
+        Args:
+            pattern_idx: パターン番号。Noneの場合は現在のパターン
+
+        Returns:
+            int: ステップ数
+        """
+        if pattern_idx is None:
+            pattern_idx = self.current_pattern
+        return self.patterns.length(pattern_idx)
+
+    def change_pattern_length(self, delta):
+        """
+        現在のパターンの長さをPATTERN_LENGTHSの中で切り替える（短くした場合ははみ出した音を消す）
 
-                # 音階をPyxel音源の値に変換
-                pyxel_note = self.NOTE_MAP[note]
+        Args:
+            delta: 変更量（+1または-1）
+
+        Returns:
+            int: 変更後のステップ数
+        """
+        length = self.pattern_length()
+        index = self.PATTERN_LENGTHS.index(length) if length in self.PATTERN_LENGTHS else 0
+        index = max(0, min(len(self.PATTERN_LENGTHS) - 1, index + delta))
+        self.patterns.set_length(self.current_pattern, self.PATTERN_LENGTHS[index])
+        self.compiler.mark_dirty(self.current_pattern)
+        self.history.commit("change_pattern_length")
+        return self.PATTERN_LENGTHS[index]
+
+    def track_order(self):
+        """
+        優先度の高い順のトラック番号を返す（同じ優先度ではトラック番号順。優先度が変わったときだけ並べ直す）
 
-                if pyxel_note is not None:
-                    # 音階を正しいノート名に変換
-                    note_names = ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]
-                    note_name = f"{note_names[pyxel_note]}{octave}"
+        Returns:
+            list: トラック番号
+        """
+        if self._track_order is None or self._track_order[0] != self.track_priorities:
+            order = sorted(range(self.TRACK_COUNT), key=lambda track_idx: -self.track_priorities[track_idx])
+            self._track_order = (list(self.track_priorities), order)
+        return self._track_order[1]
 
-                    # トラックごとに固定の音色を使用
-                    sound_type = self.TRACK_SOUND_TYPES[track_idx]
+    def play_current_step(self):
+        """現在のステップの音を再生する"""
+        # 空のパターンや、長さを超えた位置（短いパターンに切り替えた直後）では何もしない
+        if self.patterns.is_empty(self.current_pattern) or self.current_step >= self.pattern_length():
+            return
 
-                    # トラックの音量を取得
-                    volume = str(self.track_volumes[track_idx])
+        # 優先度の高い順に音のあるトラックを集める
+        pitches = {}
+        for track_idx in self.track_order():
+            pitch = self.patterns.get_pitch(self.current_pattern, track_idx, self.current_step)
+            if pitch != EMPTY:
+                pitches[track_idx] = pitch
+
+        # 音をチャンネルに割り当てて再生する（トラック数がチャンネル数以下なら各トラックは別のチャンネルで鳴る）
+        # 単音は0.125秒（speed 15）鳴るため、テンポが120を超えると次のステップまで鳴り続ける
+        hold = -(-self.tempo // 120)
+        for channel, track_idx in self.voices.allocate(pitches, self.track_priorities, self._voice_step, hold):
+            octave, pyxel_note = divmod(pitches[track_idx], 12)
+
+            # 音色・音量が同じ音は設定済みのスロットを再利用する
+            slot = self.sound_bank.get_note_slot(
+                pyxel_note,
+                octave,
+                self.track_tones[track_idx],
+                self.track_volumes[track_idx],
+            )
+            self.backend.play(channel, slot)
+        self._voice_step += 1
+
+    def audition(self, pitch=None, track_idx=None, input_time=None):
+        """
+        音を試聴する（入力と同じフレームで鳴らす）
+        音色・音量が同じ音は設定済みのスロットを再利用し、キーを押すたびにサウンドを作らない
 
-                    # サウンド設定
-                    pyxel.sounds[track_idx].set(
-                        note_name,  # note (c0, c#0, d0, etc.)
-                        sound_type,  # tone (s: square, v: vibrato, f: fade, n: noise)
-                        volume,  # volume
-                        "n",  # effect
-                        15,  # speed
-                    )
+        Args:
+            pitch: 音高（オクターブ * 12 + 音階）。Noneの場合は現在選択中のオクターブと音階
+            track_idx: 音色と音量に使うトラック番号。Noneの場合は現在選択中のトラック
+            input_time: 入力を読み取った時刻（perf_counter）。指定すると再生までの遅延を記録する
 
-                    # サウンド再生（各トラックは別のチャンネルで再生）
-                    pyxel.play(track_idx, track_idx)
+        Returns:
+            int: 鳴らしたチャンネル番号
+        """
+        if pitch is None:
+            pitch = self.current_octave * 12 + self.NOTE_MAP[self.current_note]
+        if track_idx is None:
+            track_idx = self.current_track
+        # ミュージックやトラックの音が使うチャンネルとは別の専用チャンネルで鳴らす（再生中の音を止めない）
+        if self._preview_channel is None:
+            self._preview_channel = self.backend.preview_channel()
+        channel = self._preview_channel
+
+        octave, pyxel_note = divmod(pitch, 12)
+        slot = self.sound_bank.get_note_slot(pyxel_note, octave, self.track_tones[track_idx], self.track_volumes[track_idx])
+        if input_time is not None:
+            self.audition_latency = perf_counter() - input_time
+            self.audition_latency_max = max(self.audition_latency_max, self.audition_latency)
+        self.backend.play(channel, slot)
+        self.audition_count += 1
+        return channel
 
     def clear_step(self, step_idx, track_idx=None):
         """指定したステップの音を消去する"""
         if track_idx is None:
             track_idx = self.current_track
 
-        if 0 <= step_idx < 16 and 0 <= track_idx < self.TRACK_COUNT:
-            self.patterns[self.current_pattern][track_idx][step_idx] = None
+        if 0 <= step_idx < self.pattern_length() and 0 <= track_idx < self.TRACK_COUNT:
+            self.patterns.set_pitch(self.current_pattern, track_idx, step_idx, EMPTY)
+            self.compiler.mark_dirty(self.current_pattern)
+            self.history.commit("clear_step")
 
     def clear_all(self):
         """現在のパターンの現在のトラックをクリアする"""
-        self.patterns[self.current_pattern][self.current_track] = [None for _ in range(16)]
+        self.patterns.clear_track(self.current_pattern, self.current_track)
+        self.compiler.mark_dirty(self.current_pattern)
+        self.history.commit("clear_all")
 
     def clear_pattern(self):
         """現在のパターンの全トラックをクリアする"""
-        for track_idx in range(self.TRACK_COUNT):
-            self.patterns[self.current_pattern][track_idx] = [None for _ in range(16)]
+        self.patterns.clear_pattern(self.current_pattern)
+        self.compiler.mark_dirty(self.current_pattern)
+        self.history.commit("clear_pattern")
 
     def change_track(self, delta):
         """
@@ -236,8 +584,88 @@ class Sequencer:
         self.track_volumes[self.current_track] = max(
             self.MIN_VOLUME, min(self.MAX_VOLUME, self.track_volumes[self.current_track] + delta)
         )
+        self.compiler.mark_all_dirty()
         return self.track_volumes[self.current_track]
 
+    def change_track_tone(self, delta):
+        """
+        現在のトラックの音色をTRACK_SOUND_TYPESの中で切り替える
+
+        Args:
+            delta: 変更量（+1または-1）
+
+        Returns:
+            str: 変更後の音色
+        """
+        tone = self.track_tones[self.current_track]
+        index = self.TRACK_SOUND_TYPES.index(tone) if tone in self.TRACK_SOUND_TYPES else 0
+        self.track_tones[self.current_track] = self.TRACK_SOUND_TYPES[(index + delta) % len(self.TRACK_SOUND_TYPES)]
+        self.compiler.mark_all_dirty()
+        return self.track_tones[self.current_track]
+
+    def change_track_priority(self, delta):
+        """
+        現在のトラックの優先度を変更する（トラック数がチャンネル数を超えるときに使う）
+
+        Args:
+            delta: 変更量（+1または-1）
+
+        Returns:
+            int: 変更後の優先度
+        """
+        self.track_priorities[self.current_track] = max(
+            self.MIN_PRIORITY, min(self.MAX_PRIORITY, self.track_priorities[self.current_track] + delta)
+        )
+        return self.track_priorities[self.current_track]
+
+    def set_track_count(self, track_count):
+        """
+        トラック数を変更する（減らした場合は外れたトラックの音と設定を消す）
+        再生中は停止し、編集履歴は消去する（トラック数の変更は元に戻せない）
+
+        Args:
+            track_count: トラック数（1-MAX_TRACK_COUNT）
+
+        Raises:
+            ValueError: トラック数が範囲外の場合
+        """
+        if not 1 <= track_count <= self.MAX_TRACK_COUNT:
+            raise ValueError(f"track count out of range: {track_count}")
+        old_count = self.TRACK_COUNT
+        if track_count == old_count:
+            return
+        if self.playing:
+            self.toggle_play()
+        self.TRACK_COUNT = track_count
+        added = range(old_count, track_count)
+        self.track_volumes = self.track_volumes[:track_count] + [5] * len(added)
+        self.track_tones = self.track_tones[:track_count] + [
+            self.TRACK_SOUND_TYPES[i % len(self.TRACK_SOUND_TYPES)] for i in added
+        ]
+        self.track_priorities = self.track_priorities[:track_count] + [0] * len(added)
+        self.current_track = min(self.current_track, track_count - 1)
+        self.patterns.set_track_count(track_count)
+        self._track_order = None
+        self.voices.reset()
+        self.compiler.mark_all_dirty()
+        self.history.reset()
+
+    def change_track_count(self, delta):
+        """
+        末尾にトラックを追加する、または末尾のトラックを削除する（音が残っているトラックは削除しない）
+
+        Args:
+            delta: 変更量（+1または-1）
+
+        Returns:
+            int: 変更後のトラック数
+        """
+        track_count = max(1, min(self.MAX_TRACK_COUNT, self.TRACK_COUNT + delta))
+        if any(self.patterns.track_has_notes(track_idx) for track_idx in range(track_count, self.TRACK_COUNT)):
+            return self.TRACK_COUNT
+        self.set_track_count(track_count)
+        return self.TRACK_COUNT
+
     def change_pattern(self, delta):
         """
         編集するパターンを変更する
@@ -257,20 +685,88 @@ class Sequencer:
             destination: コピー先パターン番号
         """
         if 0 <= source < self.PATTERN_COUNT and 0 <= destination < self.PATTERN_COUNT:
-            # ディープコピーを行う
-            for track_idx in range(self.TRACK_COUNT):
-                for step_idx in range(16):
-                    self.patterns[destination][track_idx][step_idx] = self.patterns[source][track_idx][step_idx]
+            # 配列のスライスとしてコピーする
+            self.patterns.copy_pattern(source, destination)
+            self.compiler.mark_dirty(destination)
+            self.history.commit("copy_pattern")
+
+    def _fill_song_repeats(self):
+        """繰り返し回数のリストをソングシーケンスと同じ長さにそろえる"""
+        del self.song_repeats[len(self.song_sequence) :]
+        self.song_repeats.extend([1] * (len(self.song_sequence) - len(self.song_repeats)))
 
-    def add_pattern_to_song(self, pattern_idx):
+    def _insert_song_entry(self, position, pattern_idx, repeat):
+        """
+        ソングの指定位置にパターンを挿入する（編集履歴に記録する）
+
+        Args:
+            position: 挿入する位置
+            pattern_idx: パターン番号
+            repeat: 繰り返し回数
+        """
+        self._fill_song_repeats()
+        self.song_sequence.insert(position, pattern_idx)
+        self.song_repeats.insert(position, repeat)
+        self._update_timeline(position, 0, 1)
+        self.history.record(EditHistory.OP_SONG_INSERT, position, pattern_idx, repeat)
+
+    def _remove_song_entry(self, position):
+        """
+        ソングの指定位置を削除する（編集履歴に記録する）
+
+        Args:
+            position: 削除する位置
+        """
+        self._fill_song_repeats()
+        pattern_idx = self.song_sequence.pop(position)
+        repeat = self.song_repeats.pop(position)
+        self._update_timeline(position, 1, 0)
+        self.history.record(EditHistory.OP_SONG_REMOVE, position, pattern_idx, repeat)
+
+    def _set_song_repeat(self, position, repeat):
+        """
+        ソング位置の繰り返し回数を設定する（編集履歴に記録する）
+
+        Args:
+            position: ソング位置
+            repeat: 繰り返し回数
+        """
+        self._fill_song_repeats()
+        old_repeat = self.song_repeats[position]
+        if repeat != old_repeat:
+            self.song_repeats[position] = repeat
+            self._update_timeline(position, 1, 1)
+            self.history.record(EditHistory.OP_SONG_REPEAT, position, old_repeat, repeat)
+
+    def _replace_song(self, sequence, repeats):
+        """
+        ソング全体を置き換える（編集履歴に記録する）
+
+        Args:
+            sequence: パターン番号の並び
+            repeats: 繰り返し回数の並び
+        """
+        self._fill_song_repeats()
+        self.history.record(
+            EditHistory.OP_SONG_REPLACE, tuple(self.song_sequence), tuple(self.song_repeats), tuple(sequence), tuple(repeats)
+        )
+        self.song_sequence = list(sequence)
+        self.song_repeats = list(repeats)
+        self.song_position = 0
+        self.song_step = 0
+        self.song_version += 1
+
+    def add_pattern_to_song(self, pattern_idx, repeat=1):
         """
         ソングにパターンを追加する
 
         Args:
             pattern_idx: 追加するパターン番号
+            repeat: 繰り返し回数
         """
         if 0 <= pattern_idx < self.PATTERN_COUNT:
-            self.song_sequence.append(pattern_idx)
+            self._insert_song_entry(len(self.song_sequence), pattern_idx, max(1, min(self.MAX_SONG_REPEAT, repeat)))
+            self.history.commit("add_pattern_to_song")
 
     def remove_pattern_from_song(self, position):
         """
@@ -280,13 +776,44 @@ class Sequencer:
             position: 削除する位置
         """
         if 0 <= position < len(self.song_sequence):
-            self.song_sequence.pop(position)
+            self._remove_song_entry(position)
+            self.history.commit("remove_pattern_from_song")
+
+    def change_song_repeat(self, position, delta):
+        """
+        ソング位置の繰り返し回数を変更する
+
+        Args:
+            position: ソング位置
+            delta: 変更量（+1または-1）
+
+        Returns:
+            int: 変更後の繰り返し回数
+        """
+        if not 0 <= position < len(self.song_sequence):
+            return 1
+        self._set_song_repeat(position, max(1, min(self.MAX_SONG_REPEAT, self.song_repeat(position) + delta)))
+        self.history.commit("change_song_repeat")
+        return self.song_repeats[position]
+
+    def clear_song(self):
+        """ソングシーケンスを空にする"""
+        if self.song_sequence:
+            self._replace_song((), ())
+            self.history.commit("clear_song")
+        self.song_position = 0
+        self.song_step = 0
 
     def toggle_song_mode(self):
         """
         ソングモードとパターンモードを切り替える
+        再生中にソングモードにしたときは、ソング内の位置を現在のソング位置とステップに合わせる
         """
         self.song_mode = not self.song_mode
+        if self.song_mode and self.song_sequence and self.playing:
+            position = min(self.song_position, len(self.song_sequence) - 1)
+            step = min(self.current_step, self.patterns.length(self.song_sequence[position]) - 1)
+            self._seek_song(self.song_timeline().position_step(position) + step)
         return self.song_mode
 
     def change_octave(self, delta):
@@ -299,8 +826,6 @@ class Sequencer:
         self.current_octave = max(self.MIN_OCTAVE, min(self.MAX_OCTAVE, self.current_octave + delta))
         return self.current_octave
 
-    # 音色タイプはトラックごとに固定されるため、この関数は不要になります
-
     def change_note(self, delta):
         """
         音階を変更する
@@ -324,4 +849,5 @@ class Sequencer:
         new_tempo = self.tempo + (delta * self.TEMPO_STEP)
         # 範囲内に収める
         self.tempo = max(self.MIN_TEMPO, min(self.MAX_TEMPO, new_tempo))
+        self.compiler.mark_all_dirty()
         return self.tempo
@@ -0,0 +1,183 @@
+"""
+ソングタイムラインモジュール - ソングの各位置の開始ステップを前計算し、任意の位置へのシークを定数時間で行う
+"""
+
+from array import array
+from math import gcd
+
+
+class SongTimeline:
+    """
+    ソングシーケンス（パターン番号、長さ、繰り返し回数の並び）の累積ステップ位置を保持するクラス
+    ソング全体を全エントリの長さ（長さ × 繰り返し回数）の最大公約数ごとのバケットに区切り、
+    バケットごとのソング位置を記録しておくことで、絶対ステップから再生位置を定数時間で求める
+    末尾への追加は追加した分だけ、途中の変更・削除は変更位置以降だけを作り直す
+    """
+
+    def __init__(self):
+        """タイムラインの初期化"""
+        # ソング位置ごとのパターン番号、長さ、繰り返し回数
+        self.patterns = array("H")
+        self.lengths = array("H")
+        self.repeats = array("H")
+        # ソング位置ごとの開始ステップと開始サウンド番号（繰り返しを展開した並びでの番号）
+        self.starts = array("I")
+        self.sound_starts = array("I")
+        # ソング全体のステップ数とサウンド数
+        self.total_steps = 0
+        self.total_sounds = 0
+        # バケットのステップ数とバケットごとのソング位置
+        self.bucket_steps = 0
+        self.buckets = array("H")
+        # サウンド番号ごとのソング位置
+        self.sound_positions = array("H")
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def build(self, entries):
+        """
+        タイムラインを作り直す
+
+        Args:
+            entries: (パターン番号, 長さ, 繰り返し回数)の並び
+        """
+        self.truncate(0)
+        for pattern_idx, length, repeat in entries:
+            self.append(pattern_idx, length, repeat)
+
+    def append(self, pattern_idx, length, repeat=1):
+        """
+        末尾にエントリを追加する
+
+        Args:
+            pattern_idx: パターン番号
+            length: パターンの長さ（ステップ数）
+            repeat: 繰り返し回数
+        """
+        position = len(self.patterns)
+        span = length * repeat
+        self.patterns.append(pattern_idx)
+        self.lengths.append(length)
+        self.repeats.append(repeat)
+        self.starts.append(self.total_steps)
+        self.sound_starts.append(self.total_sounds)
+        self.total_steps += span
+        self.total_sounds += repeat
+        self.sound_positions.extend(array("H", [position]) * repeat)
+
+        bucket_steps = gcd(self.bucket_steps, span)
+        if bucket_steps != self.bucket_steps:
+            # バケットを細かくする必要がある場合は全体を区切り直す
+            self.bucket_steps = bucket_steps
+            self._rebuild_buckets()
+        else:
+            self.buckets.extend(array("H", [position]) * (span // bucket_steps))
+
+    def _rebuild_buckets(self):
+        """バケットごとのソング位置を作り直す"""
+        self.buckets = array("H")
+        for position, length in enumerate(self.lengths):
+            span = length * self.repeats[position]
+            self.buckets.extend(array("H", [position]) * (span // self.bucket_steps))
+
+    def truncate(self, position):
+        """
+        指定位置以降のエントリを取り除く
+
+        Args:
+            position: 残す先頭からのエントリ数
+        """
+        if position >= len(self.patterns):
+            return
+        if position == 0:
+            self.total_steps = self.total_sounds = self.bucket_steps = 0
+        else:
+            self.total_steps = self.starts[position]
+            self.total_sounds = self.sound_starts[position]
+        for values in (self.patterns, self.lengths, self.repeats, self.starts, self.sound_starts):
+            del values[position:]
+        del self.sound_positions[self.total_sounds :]
+        if self.bucket_steps:
+            del self.buckets[self.total_steps // self.bucket_steps :]
+        else:
+            self.buckets = array("H")
+
+    def splice(self, position, count, entries=()):
+        """
+        指定位置のエントリを置き換える（変更位置以降だけを作り直す）
+
+        Args:
+            position: 置き換える位置
+            count: 取り除くエントリ数
+            entries: 代わりに入れる(パターン番号, 長さ, 繰り返し回数)の並び
+        """
+        rest = list(zip(self.patterns[position + count :], self.lengths[position + count :], self.repeats[position + count :]))
+        self.truncate(position)
+        for pattern_idx, length, repeat in list(entries) + rest:
+            self.append(pattern_idx, length, repeat)
+
+    def locate(self, step):
+        """
+        ソング先頭からの絶対ステップに対応する再生位置を返す（ソングの長さを超えた分は先頭に戻る）
+
+        Args:
+            step: 絶対ステップ
+
+        Returns:
+            tuple: (ソング位置, 繰り返し回目, パターン番号, パターン内のステップ)。空のソングではNone
+        """
+        if not self.total_steps:
+            return None
+        step %= self.total_steps
+        position = self.buckets[step // self.bucket_steps]
+        repeat, step_idx = divmod(step - self.starts[position], self.lengths[position])
+        return position, repeat, self.patterns[position], step_idx
+
+    def locate_time(self, seconds, step_seconds):
+        """
+        ソング先頭からの秒数に対応する再生位置を返す
+
+        Args:
+            seconds: 秒数
+            step_seconds: 1ステップの秒数
+
+        Returns:
+            tuple: locate()と同じ
+        """
+        return self.locate(int(seconds / step_seconds))
+
+    def position_step(self, position, repeat=0):
+        """
+        ソング位置の開始ステップを返す
+
+        Args:
+            position: ソング位置
+            repeat: 繰り返し回目
+
+        Returns:
+            int: 絶対ステップ
+        """
+        return self.starts[position] + repeat * self.lengths[position]
+
+    def sound_step(self, sound_index):
+        """
+        繰り返しを展開した並びのサウンド番号の開始ステップを返す
+
+        Args:
+            sound_index: サウンド番号
+
+        Returns:
+            int: 絶対ステップ
+        """
+        position = self.sound_positions[sound_index]
+        return self.position_step(position, sound_index - self.sound_starts[position])
+
+    def sound_patterns(self):
+        """
+        繰り返しを展開したパターン番号の並びを返す（ミュージックの変換用）
+
+        Returns:
+            list: サウンド番号順のパターン番号
+        """
+        return [self.patterns[position] for position in self.sound_positions]
@@ -0,0 +1,130 @@
+"""
+サウンドバンクモジュール - Pyxelのサウンドスロット（0-63）の割り当てとキャッシュを担当
+"""
+
+from collections import OrderedDict
+
+from backend import PyxelBackend
+
+
+class SoundBank:
+    """
+    Pyxelのサウンドスロットを音の内容ごとに割り当てるクラス
+    同じ内容の音は設定済みのスロットを再利用し、空きがない場合は最も長く使われていないスロットを再割り当てする
+    """
+
+    # Pyxelのサウンドスロット数
+    SOUND_COUNT = 64
+
+    # Pyxelのノート名（音階インデックス順）
+    NOTE_NAMES = ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]
+
+    def __init__(self, first_slot=0, slot_count=SOUND_COUNT, backend=None):
+        """
+        サウンドバンクの初期化
+
+        Args:
+            first_slot: 管理する先頭のスロット番号
+            slot_count: 管理するスロット数
+            backend: 音を設定するバックエンド。Noneの場合はPyxelBackend
+        """
+        self.backend = backend or PyxelBackend()
+        self.first_slot = first_slot
+        self.slot_count = slot_count
+        # キー -> スロット番号（末尾ほど最近使用）
+        self.slots = OrderedDict()
+        # 未使用スロット（若い番号から使う）
+        self.free_slots = list(range(first_slot + slot_count - 1, first_slot - 1, -1))
+        # キャッシュ統計
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_note_slot(self, pitch, octave, tone, volume, effect="n", speed=15):
+        """
+        単音のサウンドスロットを取得する
+
+        Args:
+            pitch: 音階インデックス（0-11）
+            octave: オクターブ（0-4）
+            tone: 音色（"t", "s", "p", "n"）
+            volume: 音量（0-7）
+            effect: エフェクト（"n", "s", "v", "f"）
+            speed: 再生速度
+
+        Returns:
+            int: 音が設定済みのスロット番号
+        """
+        key = (pitch, octave, tone, volume, effect, speed)
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.hits += 1
+            self.slots.move_to_end(key)
+            return slot
+
+        slot = self._allocate(key)
+        self.backend.set_sound(slot, f"{self.NOTE_NAMES[pitch]}{octave}", tone, str(volume), effect, speed)
+        return slot
+
+    def get_slot(self, notes, tones, volumes, effects, speed):
+        """
+        複数音のサウンドスロットを取得する
+
+        Args:
+            notes: ノート文字列（"c4r d4"など）
+            tones: 音色文字列
+            volumes: 音量文字列
+            effects: エフェクト文字列
+            speed: 再生速度
+
+        Returns:
+            int: 音が設定済みのスロット番号
+        """
+        key = (notes, tones, volumes, effects, speed)
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.hits += 1
+            self.slots.move_to_end(key)
+            return slot
+
+        slot = self._allocate(key)
+        self.backend.set_sound(slot, notes, tones, volumes, effects, speed)
+        return slot
+
+    def _allocate(self, key):
+        """
+        キャッシュミス時にスロットを確保する
+
+        Args:
+            key: 登録するキー
+
+        Returns:
+            int: 確保したスロット番号
+        """
+        self.misses += 1
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            # 最も長く使われていないスロットを再利用
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+        self.slots[key] = slot
+        return slot
+
+    def clear(self):
+        """キャッシュを破棄して全スロットを未使用に戻す"""
+        self.slots.clear()
+        self.free_slots = list(range(self.first_slot + self.slot_count - 1, self.first_slot - 1, -1))
+
+    @property
+    def hit_rate(self):
+        """
+        キャッシュヒット率
+
+        Returns:
+            float: ヒット率（0.0-1.0）
+        """
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
@@ -0,0 +1,193 @@
+"""
+ステップクロックモジュール - テンポに基づくステップ進行タイミングの計算を担当
+"""
+
+import time
+
+from backend import PyxelBackend
+
+
+class FrameClock:
+    """
+    バックエンドのframe_countを基準にした時計
+    フレーム落ちが起きると実時間より遅れる
+    """
+
+    def __init__(self, fps=30, backend=None):
+        """
+        フレームクロックの初期化
+
+        Args:
+            fps: 想定するフレームレート
+            backend: フレーム数を取得するバックエンド。Noneの場合はPyxelBackend
+        """
+        self.fps = fps
+        self.backend = backend or PyxelBackend()
+
+    def now(self):
+        """
+        現在時刻を返す
+
+        Returns:
+            float: 秒単位の時刻
+        """
+        return self.backend.frame_count / self.fps
+
+
+class MonotonicClock:
+    """
+    time.monotonicを基準にした時計
+    フレーム落ちの影響を受けない
+    """
+
+    def now(self):
+        """
+        現在時刻を返す
+
+        Returns:
+            float: 秒単位の時刻
+        """
+        return time.monotonic()
+
+
+class FakeClock:
+    """
+    テスト用の手動で進める時計
+    """
+
+    def __init__(self, start=0.0):
+        """
+        フェイククロックの初期化
+
+        Args:
+            start: 開始時刻（秒）
+        """
+        self.time = start
+
+    def now(self):
+        """
+        現在時刻を返す
+
+        Returns:
+            float: 秒単位の時刻
+        """
+        return self.time
+
+    def advance(self, seconds):
+        """
+        時刻を進める
+
+        Args:
+            seconds: 進める秒数
+        """
+        self.time += seconds
+
+
+class StepScheduler:
+    """
+    端数を持ち越すステップスケジューラー
+    ステップ発火時の超過分を次のステップに繰り越すため、テンポが遅れない
+    フレーム落ちで複数ステップ分の時間が経過した場合はまとめて追いつく
+    ジッターは各ステップの理想時刻から実際に発火するまでの遅れ、ドリフトは基準の時計での経過時間と発火済みステップの差
+    """
+
+    def __init__(self, clock=None, reference_clock=None):
+        """
+        スケジューラーの初期化
+
+        Args:
+            clock: now()を持つ時計オブジェクト。Noneの場合はFrameClockを使用
+            reference_clock: ドリフトを測る基準の時計（FrameClockに対するMonotonicClockなど）。Noneの場合はclockと同じ
+        """
+        self.clock = clock if clock is not None else FrameClock()
+        self.reference_clock = reference_clock if reference_clock is not None else self.clock
+        # 前回update時の時刻
+        self.last_time = 0.0
+        # 次のステップまでの進捗（ステップ単位の端数、0以上1未満）
+        self.phase = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ジッター・ドリフト計測用のカウンターをリセットする"""
+        # 開始時刻と、基準の時計での開始時刻・直近の時刻
+        self.start_time = self.clock.now()
+        self.reference_start = self.reference_time = self.reference_clock.now()
+        # 発火したステップの長さの合計（テンポどおりなら基準の時計での経過時間と1ステップ未満の差に収まる）
+        self.scheduled_time = 0.0
+        # 発火したステップ数
+        self.steps_fired = 0
+        # 1回のadvanceで2ステップ以上進んだときの追加分（追いつき）
+        self.caught_up_steps = 0
+        # ステップごとの理想時刻からの遅れ（秒）。直近は最後のadvanceで最も遅れたステップ、合計と回数はステップ単位
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.jitter_samples = 0
+
+    def start(self):
+        """再生開始時に呼び出し、端数と計測値を初期化する"""
+        self.last_time = self.clock.now()
+        self.phase = 0.0
+        self.reset_stats()
+        self.start_time = self.last_time
+
+    def advance(self, tempo):
+        """
+        経過時間から進めるべきステップ数を計算する
+
+        Args:
+            tempo: 現在のテンポ（BPM、60 BPM = 1秒に1ステップ）
+
+        Returns:
+            int: 今回進めるべきステップ数
+        """
+        now = self.clock.now()
+        elapsed = now - self.last_time
+        self.last_time = now
+        if elapsed <= 0:
+            return 0
+
+        # 経過時間をステップ単位に換算して端数に加算
+        self.phase += elapsed * tempo / 60
+        steps = int(self.phase)
+        if steps == 0:
+            return 0
+        self.phase -= steps
+
+        # 計測値の更新
+        # 今回発火したステップの理想時刻は新しい順に (phase + i) ステップ分だけ前（i = 0..steps-1）で、追いついたステップほど遅れている
+        step_time = 60 / tempo
+        self.steps_fired += steps
+        self.caught_up_steps += steps - 1
+        self.scheduled_time += steps * step_time
+        self.reference_time = self.reference_clock.now()
+        jitter = (self.phase + steps - 1) * step_time
+        self.last_jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.total_jitter += (steps * self.phase + steps * (steps - 1) / 2) * step_time
+        self.jitter_samples += steps
+        return steps
+
+    @property
+    def mean_jitter(self):
+        """
+        平均ジッター
+
+        Returns:
+            float: 発火したステップごとの理想時刻からの遅れの平均（秒）
+        """
+        if self.jitter_samples == 0:
+            return 0.0
+        return self.total_jitter / self.jitter_samples
+
+    @property
+    def drift(self):
+        """
+        開始からの累積ドリフト
+        基準の時計で測った経過時間から、発火済みステップの長さの合計を引く
+        時計が基準の時計と同じなら端数を繰り越すため1ステップ未満に収まり、時計が遅れる（FrameClockのフレーム落ちなど）と増える
+
+        Returns:
+            float: 最後にステップを発火した時点での、基準の時計での経過時間と発火済みステップの差（秒）
+        """
+        return (self.reference_time - self.reference_start) - self.scheduled_time
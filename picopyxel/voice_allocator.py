@@ -0,0 +1,113 @@
+"""
+ボイス割り当てモジュール - 任意の数の論理トラックの音を、Pyxelの限られたチャンネルに割り当てる
+"""
+
+
+class VoiceAllocator:
+    """
+    ステップごとに鳴らす音をハードウェアチャンネルに割り当てるクラス
+    同じトラックは前回と同じチャンネルを優先して使い、空きがなければ鳴っている音のうち優先度が最も低く古いものを奪う
+    新しい音の優先度が奪える音より高くなければ、その音は鳴らさない
+    奪った音の数（stolen）と鳴らせなかった音の数（dropped）を数える
+    """
+
+    def __init__(self, channel_count=4, first_channel=0):
+        """
+        ボイス割り当ての初期化
+
+        Args:
+            channel_count: 割り当てに使うチャンネル数
+            first_channel: 割り当てに使う先頭のチャンネル番号
+        """
+        self.first_channel = first_channel
+        self.channel_count = channel_count
+        # チャンネルごとの鳴らしているトラック（-1は空き）、優先度、鳴り終わるステップ、鳴らし始めたステップ
+        self.owners = [-1] * channel_count
+        self.priorities = [0] * channel_count
+        self.release_steps = [0] * channel_count
+        self.start_steps = [0] * channel_count
+        # トラック -> 前回使ったチャンネル（0始まりの相対番号。最初はトラックiがチャンネルiを使う）
+        self.track_channels = {i: i for i in range(channel_count)}
+        # 統計
+        self.allocated = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def reset(self):
+        """すべてのチャンネルを空きに戻す（停止時など。統計は残す）"""
+        self.owners = [-1] * self.channel_count
+        self.release_steps = [0] * self.channel_count
+        self.track_channels = {i: i for i in range(self.channel_count)}
+
+    def reset_stats(self):
+        """統計を0に戻す"""
+        self.allocated = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def allocate(self, tracks, priorities, step, hold=1):
+        """
+        1ステップ分の音をチャンネルに割り当てる
+
+        Args:
+            tracks: 音を鳴らすトラック番号の並び（優先度の高い順に並べておくと、同じ優先度では先のトラックが勝つ）
+            priorities: トラック番号 -> 優先度（大きいほど優先）のリスト
+            step: 現在のステップ（単調に増える通し番号）
+            hold: 音が鳴り続けるステップ数
+
+        Returns:
+            list: (チャンネル番号, トラック番号)のリスト（割り当てられた音だけ）
+        """
+        owners = self.owners
+        release_steps = self.release_steps
+        # このステップで割り当て済みのチャンネル（同じステップの音同士では奪わない）
+        claimed = 0
+        result = []
+        for track_idx in tracks:
+            priority = priorities[track_idx]
+            channel = self.track_channels.get(track_idx)
+            if channel is None or claimed >> channel & 1 or (owners[channel] != track_idx and release_steps[channel] > step):
+                channel = self._find_channel(priority, step, claimed)
+                if channel is None:
+                    self.dropped += 1
+                    continue
+
+            if owners[channel] not in (-1, track_idx) and release_steps[channel] > step:
+                # 鳴っている他のトラックの音を奪う
+                self.stolen += 1
+                self.track_channels.pop(owners[channel], None)
+            owners[channel] = track_idx
+            self.priorities[channel] = priority
+            release_steps[channel] = step + hold
+            self.start_steps[channel] = step
+            self.track_channels[track_idx] = channel
+            claimed |= 1 << channel
+            self.allocated += 1
+            result.append((self.first_channel + channel, track_idx))
+        return result
+
+    def _find_channel(self, priority, step, claimed):
+        """
+        空きチャンネル、なければ奪えるチャンネルを探す
+
+        Args:
+            priority: 鳴らす音の優先度
+            step: 現在のステップ
+            claimed: このステップで割り当て済みのチャンネルのビットマスク
+
+        Returns:
+            int: チャンネル（相対番号）。見つからなければNone
+        """
+        victim = None
+        for channel in range(self.channel_count):
+            if claimed >> channel & 1:
+                continue
+            if self.release_steps[channel] <= step:
+                return channel
+            # 優先度が低く、古い音ほど奪う候補にする
+            key = (self.priorities[channel], self.start_steps[channel])
+            if victim is None or key < victim[0]:
+                victim = (key, channel)
+        if victim is not None and victim[0][0] < priority:
+            return victim[1]
+        return None
@@ -1,4 +1,190 @@
 import sys
 import os
+import json
+import time
+
+import pytest
 
 sys.path.insert(0, os.getcwd())
+# picopyxel内のモジュールは同じディレクトリからの import を前提にしているため、パッケージのディレクトリも追加する
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "picopyxel"))
+
+# ベンチマークの基準値ファイル（環境変数PICOPYXEL_UPDATE_BASELINES=1で現在の計測値に書き換える）
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+# 基準値の何倍の中央値で失敗とするか（環境変数PICOPYXEL_BENCHMARK_TOLERANCEを指定したときだけ比較する）
+# 基準値は計測したマシンに依存するため、同じマシンで変更前後を比べるときに使う
+BENCHMARK_TOLERANCE = os.environ.get("PICOPYXEL_BENCHMARK_TOLERANCE")
+
+# 極端に短い処理で計測誤差により失敗しないよう、許容値に足す時間（ミリ秒）
+BENCHMARK_SLACK_MS = 0.01
+
+# RGB30の1フレームの時間（30fps）
+FRAME_BUDGET_MS = 1000 / 30
+
+# 毎フレームの処理のp95に許すフレーム予算の割合の既定値（マシンの速さによらず判定できるよう、予算に対する割合で比べる）
+DEFAULT_BUDGET = 0.1
+
+_results = {}
+
+
+def _percentile(sorted_samples, fraction):
+    """ソート済みの計測値から百分位数を返す"""
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
+
+
+class Benchmark:
+    """
+    1回の呼び出しの時間を繰り返し計測し、百分位数を基準値と比較する
+    """
+
+    def __init__(self, baselines, update):
+        self.baselines = baselines
+        self.update = update
+
+    def __call__(self, name, func, calls=1000, warmup=50, setup=None, budget=DEFAULT_BUDGET):
+        """
+        関数の呼び出し時間を計測する
+
+        Args:
+            name: ベンチマーク名（基準値のキー）
+            func: 計測する関数（引数なし）
+            calls: 計測回数
+            warmup: 計測前に呼び出す回数
+            setup: 毎回の呼び出し前に実行する関数（計測時間に含めない）
+            budget: p95に許すフレーム予算の割合（1.0で1フレーム）
+
+        Returns:
+            dict: 百分位数（ミリ秒）とフレーム予算に占める割合
+        """
+        for _ in range(warmup):
+            if setup is not None:
+                setup()
+            func()
+
+        samples = []
+        perf_counter = time.perf_counter
+        for _ in range(calls):
+            if setup is not None:
+                setup()
+            start = perf_counter()
+            func()
+            samples.append(perf_counter() - start)
+        return self.record(name, samples, budget)
+
+    def record(self, name, samples, budget=DEFAULT_BUDGET):
+        """
+        別の方法で計測した時間（秒）を集計し、フレーム予算（指定時は基準値も）と比較する
+
+        Args:
+            name: ベンチマーク名（基準値のキー）
+            samples: 計測値（秒）のリスト
+            budget: p95に許すフレーム予算の割合（1.0で1フレーム）
+
+        Returns:
+            dict: 百分位数（ミリ秒）とフレーム予算に占める割合
+        """
+        samples = sorted(samples)
+
+        result = {
+            "p50": _percentile(samples, 0.50) * 1000,
+            "p95": _percentile(samples, 0.95) * 1000,
+            "p99": _percentile(samples, 0.99) * 1000,
+            "max": samples[-1] * 1000,
+        }
+        result["budget"] = result["p95"] / FRAME_BUDGET_MS
+        _results[name] = result
+
+        assert result["budget"] <= budget, (
+            f"{name}: p95 {result['p95']:.4f} ms uses {result['budget']:.1%} of a frame (limit {budget:.0%})"
+        )
+
+        baseline = self.baselines.get(name)
+        if self.update:
+            self.baselines[name] = round(result["p50"], 5)
+        elif baseline is not None and BENCHMARK_TOLERANCE is not None:
+            limit = baseline * float(BENCHMARK_TOLERANCE) + BENCHMARK_SLACK_MS
+            assert result["p50"] <= limit, (
+                f"{name}: p50 {result['p50']:.4f} ms exceeds {limit:.4f} ms (baseline {baseline:.4f} ms)"
+            )
+        return result
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", help="処理時間のベンチマークも実行する（既定では実行しない）")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: 処理時間のベンチマーク（--benchmarks、-m benchmark、PICOPYXEL_BENCHMARKS=1で実行）"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """マシンの速さに左右されるベンチマークは、明示的に指定したときだけ実行する"""
+    if (
+        config.getoption("--benchmarks")
+        or os.environ.get("PICOPYXEL_BENCHMARKS") == "1"
+        or "benchmark" in config.option.markexpr
+    ):
+        return
+    selected = [item for item in items if item.get_closest_marker("benchmark") is None]
+    if len(selected) < len(items):
+        config.hook.pytest_deselected(items=[item for item in items if item.get_closest_marker("benchmark") is not None])
+        items[:] = selected
+
+
+@pytest.fixture
+def make_sequencer():
+    """
+    ヘッドレスで動くSequencer（FakeClockとHeadlessBackendを使う）を作る関数を返す
+
+    返す関数の引数:
+        track_count: トラック数（Noneの場合は既定の4トラック）
+        tempo: テンポ（BPM）
+    """
+    from backend import HeadlessBackend
+    from sequencer import Sequencer
+    from step_clock import FakeClock
+
+    def make(track_count=None, tempo=120):
+        sequencer = Sequencer(clock=FakeClock(), backend=HeadlessBackend(), track_count=track_count)
+        sequencer.tempo = tempo
+        return sequencer
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def benchmark_baselines():
+    """ベンチマークの基準値を読み込み、更新指定時はセッション終了時に書き出す"""
+    try:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baselines = json.load(f)
+    except (OSError, ValueError):
+        baselines = {}
+    yield baselines
+    if os.environ.get("PICOPYXEL_UPDATE_BASELINES") == "1":
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+            f.write("\n")
+
+
+@pytest.fixture
+def benchmark(benchmark_baselines):
+    """呼び出し時間を計測するBenchmarkを返す"""
+    return Benchmark(benchmark_baselines, os.environ.get("PICOPYXEL_UPDATE_BASELINES") == "1")
+
+
+def pytest_terminal_summary(terminalreporter):
+    """ベンチマーク結果（ミリ秒、フレーム予算33msに対するp95の割合）を表示する"""
+    if not _results:
+        return
+    terminalreporter.section("benchmarks (ms per call)")
+    terminalreporter.write_line(f"{'name':<40} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'budget':>8}")
+    for name, result in sorted(_results.items()):
+        terminalreporter.write_line(
+            f"{name:<40} {result['p50']:>9.4f} {result['p95']:>9.4f} {result['p99']:>9.4f} "
+            f"{result['max']:>9.4f} {result['budget']:>7.2%}"
+        )
@@ -0,0 +1,65 @@
+"""
+batch_render.pyのテスト（プロジェクトの列挙、並列レンダリング、内容のハッシュによるキャッシュ）
+"""
+
+import os
+import wave
+
+from batch_render import CACHE_FILENAME, batch_render, find_projects, load_cache, main, output_path
+from project_io import save_project
+
+
+def write_project(make_sequencer, path, pitch=40):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, pitch)
+    save_project(sequencer, str(path))
+
+
+def test_find_projects_lists_supported_files_in_name_order(tmp_path):
+    for name in ("b.json", "a.ppx", "c.mid", "notes.txt", ".hidden.json"):
+        (tmp_path / name).write_bytes(b"")
+    names = [os.path.basename(path) for path in find_projects(str(tmp_path))]
+    assert names == ["a.ppx", "b.json", "c.mid"]
+
+
+def test_output_path_replaces_project_extension():
+    assert output_path("/songs/theme.ppx", "/out") == os.path.join("/out", "theme.wav")
+    assert output_path("/songs/theme.midi", "/out") == os.path.join("/out", "theme.wav")
+
+
+def test_renders_every_project_then_skips_unchanged(tmp_path, make_sequencer):
+    write_project(make_sequencer, tmp_path / "a.json")
+    write_project(make_sequencer, tmp_path / "b.ppx")
+    output_dir = tmp_path / "wav"
+
+    result = batch_render(str(tmp_path), str(output_dir), jobs=1)
+    assert (result["rendered"], result["skipped"], result["failed"]) == (2, 0, 0)
+    assert result["audio_seconds"] == 16
+    with wave.open(str(output_dir / "a.wav"), "rb") as wav:
+        assert wav.getnframes() == 8 * wav.getframerate()
+    assert set(load_cache(str(output_dir / CACHE_FILENAME))) == {"a.json", "b.ppx"}
+
+    # 変更のないプロジェクトは書き出さず、変更したものだけ書き出す
+    write_project(make_sequencer, tmp_path / "b.ppx", pitch=41)
+    result = batch_render(str(tmp_path), str(output_dir), jobs=1)
+    assert (result["rendered"], result["skipped"]) == (1, 1)
+
+    # WAVを消したプロジェクトと、--forceの場合は書き出し直す
+    os.remove(output_dir / "a.wav")
+    assert batch_render(str(tmp_path), str(output_dir), jobs=1)["rendered"] == 1
+    assert batch_render(str(tmp_path), str(output_dir), jobs=1, force=True)["rendered"] == 2
+
+
+def test_failed_project_is_reported_and_not_cached(tmp_path, capsys, make_sequencer):
+    write_project(make_sequencer, tmp_path / "good.json")
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+
+    assert main([str(tmp_path), "-j", "1"]) == 1
+    assert "FAILED broken.json" in capsys.readouterr().err
+    assert set(load_cache(str(tmp_path / CACHE_FILENAME))) == {"good.json"}
+    assert not (tmp_path / "broken.wav").exists()
+
+    # 直したプロジェクトだけが次の実行で書き出される
+    write_project(make_sequencer, tmp_path / "broken.json")
+    assert main([str(tmp_path), "-j", "1"]) == 0
+    assert "rendered: 1, skipped: 1, failed: 0" in capsys.readouterr().out
@@ -0,0 +1,322 @@
+"""
+毎フレーム実行される処理と起動時間のベンチマーク（HeadlessBackendでウィンドウなしに実行する）
+
+既定のpytestでは実行しない。python -m pytest --benchmarks（または -m benchmark、PICOPYXEL_BENCHMARKS=1）で実行する
+p95がフレーム予算（33ms）に占める割合が各ベンチマークの上限（既定10%）を超えたら失敗する
+同じマシンで変更前後を比べる場合は、PICOPYXEL_BENCHMARK_TOLERANCE=3 で中央値をtests/benchmark_baselines.jsonの基準値とも比較する
+基準値の更新: PICOPYXEL_UPDATE_BASELINES=1 python -m pytest --benchmarks tests/test_benchmarks.py
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+import pyxel
+
+from backend import HeadlessBackend
+from event_log import EventLog
+from main import PicoPixel
+from midi_io import export_midi, import_midi
+from pattern_store import EMPTY
+from project_io import save_project
+from project_library import ProjectLibrary
+from sequencer import Sequencer
+from step_clock import FakeClock
+
+FPS = 30
+
+pytestmark = pytest.mark.benchmark
+
+
+def fill_patterns(sequencer, density, pattern_count=1, seed=0):
+    """
+    パターンにランダムな音を入力する
+
+    Args:
+        sequencer: 入力先のSequencer
+        density: セルに音を入れる確率（0.0-1.0）
+        pattern_count: 入力するパターン数（先頭から）
+        seed: 乱数の種
+    """
+    rng = random.Random(seed)
+    for pattern_idx in range(pattern_count):
+        for track_idx in range(sequencer.TRACK_COUNT):
+            for step_idx in range(16):
+                if rng.random() < density:
+                    pitch = rng.randrange(60)
+                    sequencer.patterns.set_pitch(pattern_idx, track_idx, step_idx, pitch)
+    sequencer.compiler.mark_all_dirty()
+
+
+def make_sequencer(density=0.0, pattern_count=1, tempo=120, music=False):
+    """ヘッドレスで動くSequencerと時計を作る"""
+    clock = FakeClock()
+    sequencer = Sequencer(clock=clock, backend=HeadlessBackend(fps=FPS))
+    sequencer.tempo = tempo
+    sequencer.use_music_engine = music
+    fill_patterns(sequencer, density, pattern_count)
+    return sequencer, clock
+
+
+def make_app(density=0.0, pattern_count=1):
+    """ヘッドレスで動くPicoPixelを作る"""
+    app = PicoPixel(backend=HeadlessBackend(fps=FPS))
+    fill_patterns(app.sequencer, density, pattern_count)
+    return app
+
+
+@pytest.mark.parametrize("density", [0.0, 1.0], ids=["empty", "dense"])
+def test_sequencer_update_step_max_tempo(benchmark, density):
+    sequencer, clock = make_sequencer(density, tempo=Sequencer.MAX_TEMPO)
+    sequencer.toggle_play()
+    benchmark(f"sequencer_update[step,{density:.0%}]", sequencer.update, setup=lambda: clock.advance(1 / FPS))
+
+
+def test_sequencer_update_music_long_song(benchmark):
+    # 8パターン × 4トラックのサウンドはコンパイル用スロット（48個）に収まる
+    sequencer, _ = make_sequencer(0.5, pattern_count=8, tempo=Sequencer.MAX_TEMPO, music=True)
+    sequencer.song_sequence = [i % 8 for i in range(256)]
+    sequencer.song_mode = True
+    sequencer.toggle_play()
+    assert sequencer._music_active
+    benchmark("sequencer_update[music,song256]", sequencer.update, setup=sequencer.backend.advance)
+
+
+@pytest.mark.parametrize("density", [0.0, 1.0], ids=["empty", "dense"])
+def test_play_current_step(benchmark, density):
+    sequencer, _ = make_sequencer(density)
+
+    def next_step():
+        sequencer.current_step = (sequencer.current_step + 1) % 16
+
+    benchmark(f"play_current_step[{density:.0%}]", sequencer.play_current_step, setup=next_step)
+
+
+def test_play_current_step_worst_case(benchmark):
+    # 16パターン分の異なる音を順に鳴らし、単音用スロットのキャッシュを外し続ける
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+
+    def next_step():
+        sequencer.current_step = (sequencer.current_step + 1) % 16
+        if sequencer.current_step == 0:
+            sequencer.current_pattern = (sequencer.current_pattern + 1) % 16
+
+    benchmark("play_current_step[cache_miss]", sequencer.play_current_step, setup=next_step)
+
+
+def test_play_current_step_voice_stealing(benchmark):
+    # 8トラックを4チャンネルに割り当て、毎ステップ優先度の低い音を奪う・捨てる
+    sequencer = Sequencer(clock=FakeClock(), backend=HeadlessBackend(fps=FPS), track_count=8)
+    sequencer.tempo = Sequencer.MAX_TEMPO
+    sequencer.track_priorities = [track_idx % 3 for track_idx in range(8)]
+    fill_patterns(sequencer, 0.5)
+
+    def next_step():
+        sequencer.current_step = (sequencer.current_step + 1) % 16
+
+    benchmark("play_current_step[8tracks]", sequencer.play_current_step, setup=next_step)
+    assert sequencer.voices.stolen > 0 and sequencer.voices.dropped > 0
+
+
+def test_input_note(benchmark):
+    sequencer, _ = make_sequencer()
+    rng = random.Random(1)
+
+    def pick_note():
+        sequencer.current_note = rng.choice(sequencer.all_notes)
+        sequencer.current_step = rng.randrange(16)
+
+    benchmark("input_note", lambda: sequencer.input_note(sequencer.current_step), setup=pick_note)
+
+
+def test_copy_pattern(benchmark):
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+    benchmark("copy_pattern[dense]", lambda: sequencer.copy_pattern(3, 4))
+
+
+def test_copy_pattern_then_edit(benchmark):
+    # コピーは配列の共有だけで、最初の書き込みで複製する
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+
+    def copy_and_edit():
+        sequencer.copy_pattern(3, 4)
+        sequencer.patterns.set_pitch(4, 0, 0, EMPTY)
+
+    benchmark("copy_pattern[copy_on_write]", copy_and_edit, setup=lambda: sequencer.copy_pattern(5, 4))
+
+
+def test_undo_redo_dense(benchmark):
+    # 密なプロジェクトでも1回の元に戻す・やり直すは変更したセルの数だけで決まる
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+    sequencer.history.reset()
+    for step_idx in range(16):
+        sequencer.input_note(step_idx)
+    state = {"undo": True}
+
+    def undo_or_redo():
+        if state["undo"]:
+            sequencer.history.undo()
+        else:
+            sequencer.history.redo()
+        state["undo"] = not state["undo"]
+
+    benchmark("undo_redo[input_note]", undo_or_redo)
+
+
+def test_song_seek_long_song(benchmark):
+    # 256位置 × 繰り返しのソングで任意の絶対ステップにシークする
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+    for i in range(256):
+        sequencer.add_pattern_to_song(i % 16, repeat=i % 4 + 1)
+    sequencer.song_mode = True
+    total_steps = sequencer.song_timeline().total_steps
+    rng = random.Random(2)
+    benchmark("song_seek[song256]", lambda: sequencer._seek_song(rng.randrange(total_steps)))
+
+
+def test_midi_import_long_song(benchmark, tmp_path):
+    # 16パターン × 256位置の音で埋まったソングを書き出したMIDIファイルを読み込む
+    sequencer, _ = make_sequencer(1.0, pattern_count=16)
+    sequencer.song_sequence = [i % 16 for i in range(256)]
+    filename = str(tmp_path / "song.mid")
+    export_midi(sequencer, filename)
+    target, _ = make_sequencer()
+    benchmark("midi_import[song256]", lambda: import_midi(filename, target), calls=20, warmup=2, budget=10)
+    assert target.song_timeline().sound_patterns() == sequencer.song_sequence
+
+
+@pytest.mark.parametrize("held", [False, True], ids=["idle", "held"])
+def test_input_manager_update(benchmark, held):
+    app = make_app()
+    backend = app.backend
+    if held:
+        # キーを押したままにする（押した最初のフレーム以外は操作が発生しない）
+        backend.script_input(backend.frame_count, [pyxel.KEY_CTRL, pyxel.KEY_LEFT])
+        app.input_manager.update()
+    benchmark(f"input_manager_update[{'held' if held else 'idle'}]", app.input_manager.update, setup=backend.advance)
+
+
+def test_audition_input_to_play(benchmark):
+    # 上下キーで音階を変えるたびに試聴の音を鳴らし、入力の読み取りからpyxel.playまでの遅延を集める
+    app = make_app(0.5)
+    backend = app.backend
+    sequencer = app.sequencer
+    samples = []
+    for i in range(1000):
+        backend.script_input(backend.frame_count, [pyxel.KEY_UP if i % 4 < 2 else pyxel.KEY_DOWN] if i % 2 == 0 else [])
+        count = sequencer.audition_count
+        app.input_manager.update()
+        if sequencer.audition_count > count:
+            samples.append(sequencer.audition_latency)
+        backend.advance()
+    assert len(samples) == 500
+    result = benchmark.record("audition[input_to_play]", samples, budget=1.0)
+    # 入力と同じフレームで鳴らす
+    assert result["max"] < 1000 / FPS
+
+
+@pytest.mark.parametrize("level", [EventLog.INFO, EventLog.DEBUG], ids=["disabled", "enabled"])
+def test_event_log_debug(benchmark, level):
+    # 音階の変更と同じDEBUGレベルのイベント（無効なら比較1回、有効でも文字列にしない）
+    log = EventLog(level=level)
+    benchmark(
+        f"event_log[{'enabled' if level == EventLog.DEBUG else 'disabled'}]", lambda: log.debug("テンポ上げ: {} BPM", 120)
+    )
+    if level == EventLog.DEBUG:
+        assert log.count > log.capacity and log.lines()[-1].endswith("DEBUG   テンポ上げ: 120 BPM")
+    else:
+        assert log.count == 0
+
+
+def test_draw_sequencer_grid_steady(benchmark):
+    app = make_app(1.0)
+    app._draw_sequencer_grid()
+    benchmark("draw_sequencer_grid[steady]", app._draw_sequencer_grid)
+
+
+def test_draw_sequencer_grid_worst_case(benchmark):
+    # トラックを毎回切り替えて全列を描き直させる
+    app = make_app(1.0)
+
+    def next_track():
+        app.sequencer.current_track = (app.sequencer.current_track + 1) % app.sequencer.TRACK_COUNT
+
+    benchmark("draw_sequencer_grid[all_columns]", app._draw_sequencer_grid, setup=next_track)
+
+
+def test_draw_song_sequence_long_song(benchmark):
+    app = make_app()
+    app.sequencer.song_sequence = [i % 16 for i in range(256)]
+    benchmark("draw_song_sequence[song256]", app._draw_song_sequence)
+
+
+def test_draw_song_sequence_scrolled(benchmark):
+    # 表示範囲だけを描画し、ミニマップは転送するだけなので、ソングの長さによらず一定
+    app = make_app()
+    app.sequencer.song_sequence = [i % 256 for i in range(4096)]
+    app.input_manager.song_edit_position = 2000
+    benchmark("draw_song_sequence[song4096]", app._draw_song_sequence)
+
+
+def test_draw_track_settings(benchmark):
+    app = make_app()
+    benchmark("draw_track_settings", app._draw_track_settings)
+
+
+def test_draw_library(benchmark, tmp_path):
+    # 音で埋まったプロジェクト32件のライブラリ
+    for i in range(32):
+        sequencer, _ = make_sequencer(1.0, pattern_count=4)
+        save_project(sequencer, str(tmp_path / f"song{i:02d}.ppx"))
+    app = make_app()
+    app.library = ProjectLibrary(str(tmp_path))
+    app.library.refresh()
+    app.input_manager.library_position = 16
+    benchmark("draw_library[32]", app._draw_library)
+
+
+def test_full_frame_dense_max_tempo(benchmark):
+    app = make_app(1.0, pattern_count=16)
+    app.sequencer.tempo = Sequencer.MAX_TEMPO
+    app.sequencer.toggle_play()
+
+    def frame():
+        app.update()
+        app.draw()
+
+    benchmark("frame[update+draw,dense]", frame, calls=500, setup=app.backend.advance, budget=0.5)
+
+
+# 起動時間の計測（新しいプロセスでmainの読み込み、PicoPixelの初期化、最初のフレームまでの時間を秒で出力する）
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+from backend import HeadlessBackend
+imported = time.perf_counter()
+app = main.PicoPixel(backend=HeadlessBackend(fps=30))
+initialized = time.perf_counter()
+app.backend.step()
+drawn = time.perf_counter()
+print(json.dumps([imported - start, initialized - imported, drawn - initialized]))
+"""
+
+
+def test_startup_to_first_frame(benchmark):
+    # 実機の起動と同じく、毎回新しいインタープリターで計測する（バイトコードのキャッシュは作成済みの状態）
+    package_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "picopyxel")
+    phases = {"import": [], "init": [], "first_frame": [], "total": []}
+    for _ in range(5):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], cwd=package_dir, capture_output=True, text=True, check=True
+        ).stdout
+        timings = json.loads(output.splitlines()[-1])
+        for name, seconds in zip(("import", "init", "first_frame"), timings):
+            phases[name].append(seconds)
+        phases["total"].append(sum(timings))
+    for name, samples in phases.items():
+        # 起動は1回だけなので、1秒（30フレーム）以内を上限にする
+        benchmark.record(f"startup[{name}]", samples, budget=30)
@@ -0,0 +1,104 @@
+"""
+edit_history.pyのテスト（差分だけの記録、元に戻す・やり直す、履歴の上限）
+"""
+
+import pytest
+
+from edit_history import EditHistory
+from pattern_store import EMPTY
+
+
+@pytest.fixture
+def sequencer(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.current_note = "C"
+    sequencer.current_octave = 3
+    return sequencer
+
+
+def test_undo_and_redo_single_note(sequencer):
+    sequencer.input_note(4, track_idx=2)
+    assert sequencer.patterns.get_pitch(0, 2, 4) == 36
+    assert sequencer.history.undo() == "input_note"
+    assert sequencer.patterns.get_pitch(0, 2, 4) == EMPTY
+    assert sequencer.history.redo() == "input_note"
+    assert sequencer.patterns.get_pitch(0, 2, 4) == 36
+    assert sequencer.history.redo() is None
+
+
+def test_entry_records_only_changed_cells(sequencer):
+    for step_idx in range(16):
+        sequencer.input_note(step_idx)
+    history = sequencer.history
+    assert len(history.undo_stack) == 16
+    assert history.undo_stack[-1].size == EditHistory.ENTRY_BYTES + EditHistory.OP_BYTES + 4
+    # パターンの消去は音のある16セルだけを記録する
+    sequencer.clear_pattern()
+    (kind, cells), *_ = history.undo_stack[-1].ops
+    assert (kind, len(cells)) == (EditHistory.OP_CELLS, 16)
+    history.undo()
+    assert sequencer.patterns.track_pitches(0, 0).tolist() == [36] * 16
+
+
+def test_new_edit_clears_redo(sequencer):
+    sequencer.input_note(0)
+    sequencer.history.undo()
+    assert sequencer.history.can_redo()
+    sequencer.input_note(1)
+    assert not sequencer.history.can_redo()
+
+
+def test_undo_restores_pattern_length_and_cut_notes(sequencer):
+    sequencer.change_pattern_length(1)
+    sequencer.input_note(31)
+    sequencer.change_pattern_length(-1)
+    assert sequencer.pattern_length() == 16
+    sequencer.history.undo()
+    assert sequencer.pattern_length() == 32
+    assert sequencer.patterns.get_pitch(0, 0, 31) == 36
+
+
+def test_undo_song_edits(sequencer):
+    sequencer.add_pattern_to_song(3)
+    sequencer.add_pattern_to_song(5)
+    sequencer.change_song_repeat(0, 2)
+    sequencer.remove_pattern_from_song(1)
+    sequencer.clear_song()
+    assert sequencer.song_sequence == []
+    sequencer.history.undo()
+    assert (sequencer.song_sequence, sequencer.song_repeats) == ([3], [3])
+    sequencer.history.undo()
+    sequencer.history.undo()
+    assert (sequencer.song_sequence, sequencer.song_repeats) == ([3, 5], [1, 1])
+    assert sequencer.song_timeline().total_steps == 32
+
+
+def test_undo_switches_back_to_edited_pattern_and_marks_it_dirty(sequencer):
+    sequencer.current_pattern = 7
+    sequencer.input_note(0)
+    sequencer.compiler.compile_pattern(7)
+    sequencer.current_pattern = 0
+    sequencer.history.undo()
+    assert sequencer.current_pattern == 7
+    assert sequencer.compiler.is_stale([7])
+
+
+def test_oldest_entries_are_dropped_over_max_bytes(sequencer):
+    entry_size = EditHistory.ENTRY_BYTES + EditHistory.OP_BYTES + 4
+    sequencer.history.max_bytes = 5 * entry_size
+    for step_idx in range(10):
+        sequencer.input_note(step_idx)
+    history = sequencer.history
+    assert len(history.undo_stack) == 5
+    assert history.bytes == 5 * entry_size
+    while history.undo():
+        pass
+    # 捨てた5回分の入力は残る
+    assert sequencer.patterns.track_pitches(0, 0)[:10].tolist() == [36] * 5 + [EMPTY] * 5
+
+
+def test_reset_forgets_history(sequencer):
+    sequencer.input_note(0)
+    sequencer.history.reset()
+    assert not sequencer.history.can_undo()
+    assert sequencer.history.bytes == 0
@@ -0,0 +1,68 @@
+"""
+event_log.pyのテスト（レベルによる絞り込み、リングバッファ、書き出し）
+"""
+
+import pytest
+
+from event_log import EventLog
+
+
+def test_events_below_level_are_not_recorded():
+    log = EventLog(level=EventLog.INFO)
+    log.debug("note {}", 1)
+    log.info("mode {}", 2)
+    log.warning("failed {}", 3)
+    log.log(EventLog.DEBUG, "ignored")
+    assert [(level, message, args) for _, level, message, args in log.records()] == [
+        (EventLog.INFO, "mode {}", (2,)),
+        (EventLog.WARNING, "failed {}", (3,)),
+    ]
+    log.level = EventLog.OFF
+    log.warning("off")
+    assert log.count == 2
+
+
+def test_arguments_are_formatted_only_when_written():
+    class Spy:
+        formatted = 0
+
+        def __format__(self, spec):
+            Spy.formatted += 1
+            return "spy"
+
+    log = EventLog(level=EventLog.DEBUG)
+    log.debug("value {}", Spy())
+    assert Spy.formatted == 0
+    assert log.lines()[0].split()[1:] == ["DEBUG", "value", "spy"]
+    assert Spy.formatted == 1
+
+
+def test_ring_buffer_keeps_newest_events_in_order():
+    log = EventLog(capacity=3)
+    for i in range(5):
+        log.info("event {}", i)
+    assert [args for _, _, _, args in log.records()] == [(2,), (3,), (4,)]
+    assert log.count == 5
+    log.clear()
+    assert log.records() == []
+
+
+def test_dump_writes_dropped_count_and_lines(tmp_path):
+    log = EventLog(capacity=2)
+    for i in range(3):
+        log.warning("event {}", i)
+    filename = str(tmp_path / "events.log")
+    assert log.dump(filename) == filename
+    lines = (tmp_path / "events.log").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "# 1 older events dropped"
+    assert [line.split(None, 1)[1] for line in lines[1:]] == ["WARNING event 1", "WARNING event 2"]
+    # 書き出しても記録は残る
+    assert log.count == 3
+
+
+def test_parse_level_accepts_names_and_numbers():
+    assert EventLog.parse_level("debug") == EventLog.DEBUG
+    assert EventLog.parse_level("WARNING") == EventLog.WARNING
+    assert EventLog.parse_level("15") == 15
+    with pytest.raises(ValueError):
+        EventLog.parse_level("verbose")
@@ -0,0 +1,106 @@
+"""
+frame_profiler.pyのテスト（リングバッファ、区間の加算、集計、CSVの書き出し、無効時の動作）
+"""
+
+import csv
+
+import pytest
+
+import frame_profiler
+from frame_profiler import FrameProfiler
+
+CAPACITY = 3
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """perf_counterの代わりに手で進める時刻（秒）"""
+    now = [0.0]
+    monkeypatch.setattr(frame_profiler, "perf_counter", lambda: now[0])
+    return now
+
+
+def record_frame(profiler, clock, input_seconds, sound_seconds=0.0):
+    """入力とサウンドの区間を計測した1フレームを記録する"""
+    profiler.begin_frame()
+    clock[0] += input_seconds
+    profiler.lap(FrameProfiler.INPUT)
+    clock[0] += sound_seconds
+    profiler.lap(FrameProfiler.SOUND)
+    profiler.end_frame()
+
+
+def test_calls_do_nothing_until_enabled_and_after_disabled(clock):
+    profiler = FrameProfiler(capacity=CAPACITY)
+    record_frame(profiler, clock, 0.001)
+    assert (profiler.buffer, profiler.frames) == (None, 0)
+    assert profiler.rows() == [] and profiler.stats() == [] and profiler.budget_usage() == 0.0
+
+    profiler.enable()
+    record_frame(profiler, clock, 0.002)
+    profiler.disable()
+    record_frame(profiler, clock, 0.004)
+    assert profiler.frames == 1
+    assert profiler.rows()[0][FrameProfiler.INPUT] == pytest.approx(0.002)
+
+
+def test_laps_of_one_section_add_up(clock):
+    profiler = FrameProfiler(capacity=CAPACITY)
+    profiler.enable()
+    profiler.begin_frame()
+    for seconds in (0.001, 0.002, 0.003):
+        clock[0] += seconds
+        profiler.lap(FrameProfiler.SOUND)
+        clock[0] += 0.010
+        profiler.lap(FrameProfiler.DRAW_GRID)
+    profiler.end_frame()
+    row = profiler.rows()[0]
+    assert row[FrameProfiler.SOUND] == pytest.approx(0.006)
+    assert row[FrameProfiler.DRAW_GRID] == pytest.approx(0.030)
+    assert row[-1] == pytest.approx(0.036)
+
+
+def test_ring_buffer_wraps_and_rows_are_oldest_first(clock):
+    profiler = FrameProfiler(capacity=CAPACITY)
+    profiler.enable()
+    buffer = profiler.buffer
+    for frame in range(CAPACITY + 2):
+        record_frame(profiler, clock, (frame + 1) / 1000)
+    # 記録領域は確保し直さず、古いフレームから上書きする
+    assert profiler.buffer is buffer and len(buffer) == CAPACITY * profiler.width
+    assert profiler.frames == CAPACITY + 2
+    assert [row[FrameProfiler.INPUT] for row in profiler.rows()] == pytest.approx([0.003, 0.004, 0.005])
+
+    # 有効化し直しても記録は消えない
+    profiler.disable()
+    profiler.enable()
+    assert profiler.buffer is buffer and len(profiler.rows()) == CAPACITY
+
+
+def test_stats_and_budget_usage(clock):
+    profiler = FrameProfiler(capacity=CAPACITY)
+    profiler.enable()
+    for input_seconds in (0.002, 0.004, 0.006, 0.008):
+        record_frame(profiler, clock, input_seconds, sound_seconds=0.001)
+    stats = {name: (mean, peak) for name, mean, peak in profiler.stats()}
+    assert list(stats) == list(FrameProfiler.SECTIONS) + ["total"]
+    # 最初のフレームは上書きされている
+    assert stats["input"] == pytest.approx((0.006, 0.008))
+    assert stats["sound"] == pytest.approx((0.001, 0.001))
+    assert stats["draw_grid"] == (0.0, 0.0)
+    assert stats["total"] == pytest.approx((0.007, 0.009))
+    assert profiler.budget_usage() == pytest.approx(0.007 / FrameProfiler.FRAME_BUDGET)
+
+
+def test_dump_csv_numbers_frames_after_wrap(clock, tmp_path):
+    profiler = FrameProfiler(capacity=CAPACITY)
+    profiler.enable()
+    for frame in range(CAPACITY + 2):
+        record_frame(profiler, clock, (frame + 1) / 1000)
+    filename = tmp_path / "profile.csv"
+    profiler.dump_csv(str(filename))
+    with open(filename, newline="", encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    assert header == ["frame", *FrameProfiler.SECTIONS, "total"]
+    assert [int(row[0]) for row in rows] == [2, 3, 4]
+    assert [row[1 + FrameProfiler.INPUT] for row in rows] == ["3.0000", "4.0000", "5.0000"]
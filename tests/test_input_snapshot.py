@@ -0,0 +1,111 @@
+"""
+input_snapshot.pyのテスト（入力のビット割り当て、押下・解放の判定、アナログ軸の閾値）
+"""
+
+from input_snapshot import AXIS_NEGATIVE, AXIS_POSITIVE, InputSnapshot
+
+# テスト用の入力コード
+KEY_A = 1
+KEY_B = 2
+KEY_C = 3
+AXIS_X = 10
+AXIS_Y = 11
+
+THRESHOLD = 100
+
+
+class StubInput:
+    """押されているコードとアナログ軸の値を保持し、呼び出し回数を数えるbtn・btnvの代わり"""
+
+    def __init__(self):
+        self.held = set()
+        self.axes = {}
+        self.calls = 0
+
+    def btn(self, code):
+        self.calls += 1
+        return code in self.held
+
+    def btnv(self, axis):
+        self.calls += 1
+        return self.axes.get(axis, 0)
+
+
+def make_snapshot(bindings):
+    stub = StubInput()
+    return InputSnapshot(bindings, THRESHOLD, btn=stub.btn, btnv=stub.btnv), stub
+
+
+def test_shared_source_uses_one_bit():
+    snapshot, _ = make_snapshot({"enter": (KEY_A, KEY_B), "play": (KEY_A,), "stop": (KEY_C,)})
+    masks = snapshot.action_masks
+    assert masks["play"] & masks["enter"] == masks["play"]
+    assert bin(masks["enter"]).count("1") == 2
+    assert masks["stop"] & masks["enter"] == 0
+    assert snapshot.poll_count == 3
+
+
+def test_pressed_and_released_edges_across_polls():
+    snapshot, stub = make_snapshot({"enter": (KEY_A,), "play": (KEY_A,)})
+    stub.held = {KEY_A}
+    snapshot.poll()
+    assert snapshot.is_pressed("enter") and snapshot.is_pressed("play")
+    assert snapshot.is_held("enter") and not snapshot.is_released("enter")
+
+    # 押し続けている間は押下にならない
+    snapshot.poll()
+    assert not snapshot.is_pressed("enter") and snapshot.is_held("enter")
+
+    stub.held = set()
+    snapshot.poll()
+    assert snapshot.is_released("enter") and snapshot.is_released("play")
+    assert not snapshot.is_held("enter")
+    snapshot.poll()
+    assert not snapshot.is_released("enter")
+
+
+def test_second_source_going_down_while_first_is_held_counts_as_pressed():
+    snapshot, stub = make_snapshot({"enter": (KEY_A, KEY_B)})
+    stub.held = {KEY_A}
+    snapshot.poll()
+    snapshot.poll()
+    assert not snapshot.is_pressed("enter")
+    stub.held = {KEY_A, KEY_B}
+    snapshot.poll()
+    assert snapshot.is_pressed("enter")
+    # 片方を離しても、もう片方が押されていれば解放と押されている状態の両方になる
+    stub.held = {KEY_B}
+    snapshot.poll()
+    assert snapshot.is_released("enter") and snapshot.is_held("enter")
+
+
+def test_axis_direction_uses_analog_threshold():
+    snapshot, stub = make_snapshot({"right": ((AXIS_X, AXIS_POSITIVE),), "left": ((AXIS_X, AXIS_NEGATIVE),)})
+    for value, right, left in (
+        (THRESHOLD - 1, False, False),
+        (THRESHOLD, True, False),
+        (0, False, False),
+        (-THRESHOLD + 1, False, False),
+        (-THRESHOLD, False, True),
+    ):
+        stub.axes[AXIS_X] = value
+        snapshot.poll()
+        assert (snapshot.is_held("right"), snapshot.is_held("left")) == (right, left)
+
+
+def test_poll_count_is_fixed_per_frame():
+    snapshot, stub = make_snapshot(
+        {
+            "enter": (KEY_A, KEY_B),
+            "play": (KEY_A,),
+            "right": ((AXIS_X, AXIS_POSITIVE),),
+            "left": ((AXIS_X, AXIS_NEGATIVE),),
+            "down": ((AXIS_Y, AXIS_POSITIVE),),
+        }
+    )
+    # キー2つとアナログ軸2本（向きが2つある軸も1回だけ読む）
+    assert snapshot.poll_count == 4
+    for held, axes in (({KEY_A}, {}), (set(), {AXIS_X: THRESHOLD}), ({KEY_A, KEY_B}, {AXIS_Y: -THRESHOLD})):
+        stub.held, stub.axes, stub.calls = held, axes, 0
+        snapshot.poll()
+        assert stub.calls == snapshot.poll_count
@@ -0,0 +1,300 @@
+"""
+main.pyのテスト（トラック設定モードの操作と画面の配置、グリッドの差分描画、ソングの表示範囲とミニマップ、プロファイラーの切り替え、イベントログの書き出し）
+"""
+
+import pyxel
+
+from backend import HeadlessBackend
+from main import PicoPixel
+
+
+def make_app(**kwargs):
+    app = PicoPixel(backend=HeadlessBackend(), **kwargs)
+    app.input_manager.mode = app.input_manager.MODE_TRACK_SETTINGS
+    return app
+
+
+def press(app, *keys):
+    """キーを1フレームだけ押し、次のフレームで離して入力を処理する"""
+    backend = app.backend
+    for held in (keys, ()):
+        backend.script_input(backend.frame_count + 1, held)
+        backend.advance()
+        app.input_manager.update()
+
+
+def update_with_key(app, key):
+    """キーを1フレームだけ押し、押したフレームと離したフレームのPicoPixel.updateを実行する"""
+    backend = app.backend
+    for held in ([key], []):
+        backend.script_input(backend.frame_count + 1, held)
+        backend.advance()
+        app.update()
+
+
+def test_track_settings_edit_track_count_tone_and_priority():
+    app = make_app()
+    sequencer = app.sequencer
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_RIGHT)
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_RIGHT)
+    assert sequencer.TRACK_COUNT == 6
+    press(app, pyxel.KEY_RIGHT)
+    assert (sequencer.TRACK_COUNT, sequencer.pattern_length()) == (6, 32)
+
+    sequencer.current_track = 5
+    press(app, pyxel.KEY_RETURN)
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_UP)
+    press(app, pyxel.KEY_UP)
+    assert (sequencer.track_tones[5], sequencer.track_priorities[5], sequencer.track_volumes[5]) == ("p", 1, 6)
+
+    # 音のある末尾のトラックは削除しない
+    sequencer.patterns.set_pitch(0, 5, 0, 30)
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_LEFT)
+    assert sequencer.TRACK_COUNT == 6
+    assert "削除できません" in app.input_manager.log.lines()[-1]
+
+
+def test_track_settings_text_stays_above_status_line(monkeypatch):
+    app = make_app()
+    app.sequencer.set_track_count(8)
+    texts = []
+    monkeypatch.setattr(app.backend, "text", lambda x, y, s, col: texts.append((y, s)))
+    app.draw()
+    status_y = next(y for y, s in texts if s.startswith("Status"))
+    # 文字の高さは5ピクセル
+    assert max(y for y, s in texts if y < status_y) + 5 < status_y
+    assert not any("stolen" in s for _, s in texts)
+
+    texts.clear()
+    app.show_profiler = True
+    app.draw()
+    assert any(s.startswith("stolen 0 dropped 0") for _, s in texts)
+
+
+def test_f4_dumps_event_log_only_to_configured_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = make_app()
+    update_with_key(app, pyxel.KEY_F4)
+    assert list(tmp_path.iterdir()) == []
+    assert "event log dump skipped" in app.event_log.lines()[-1]
+
+    log_file = tmp_path / "logs.txt"
+    app = make_app(log_file=str(log_file))
+    update_with_key(app, pyxel.KEY_F4)
+    assert str(log_file) in log_file.read_text(encoding="utf-8")
+
+
+def test_f3_toggles_profiler():
+    app = make_app()
+    assert not app.profiler.enabled
+    update_with_key(app, pyxel.KEY_F3)
+    assert app.show_profiler and app.profiler.enabled
+    update_with_key(app, pyxel.KEY_F3)
+    assert not app.show_profiler and not app.profiler.enabled
+
+
+def test_f3_keeps_profiler_on_with_profile_csv(tmp_path):
+    app = make_app(profile_csv=str(tmp_path / "profile.csv"))
+    assert app.profiler.enabled
+    update_with_key(app, pyxel.KEY_F3)
+    update_with_key(app, pyxel.KEY_F3)
+    # 表示を消しても、CSVに書き出すための計測は続ける
+    assert not app.show_profiler and app.profiler.enabled
+
+
+def draw_grid(app):
+    """パターン編集画面のグリッドを描き、描き直したセル数を返す"""
+    app._draw_sequencer_grid()
+    return app.grid_cells_redrawn
+
+
+def test_grid_redraws_only_changed_columns():
+    app = make_app()
+    sequencer = app.sequencer
+    full = app.GRID_COLUMNS * 12
+    assert draw_grid(app) == full
+    assert draw_grid(app) == 0
+
+    # 選択中のステップへの入力は1列
+    app.input_manager.selected_step = 2
+    assert draw_grid(app) == 2 * 12
+    sequencer.input_note(2)
+    assert draw_grid(app) == 12
+    assert draw_grid(app) == 0
+
+    # 再生位置の移動は前後の2列
+    sequencer.playing = True
+    sequencer.current_step = 5
+    assert draw_grid(app) == 12
+    sequencer.current_step = 6
+    assert draw_grid(app) == 2 * 12
+
+    # 選択位置の移動は前後の2列
+    app.input_manager.selected_step = 3
+    assert draw_grid(app) == 2 * 12
+    assert draw_grid(app) == 0
+
+
+def test_grid_is_fully_redrawn_on_page_track_and_length_change():
+    app = make_app()
+    sequencer = app.sequencer
+    full = app.GRID_COLUMNS * 12
+    draw_grid(app)
+
+    # パターンの長さが変わるとページ数が変わる
+    sequencer.patterns.set_length(sequencer.current_pattern, 32)
+    assert draw_grid(app) == full
+    assert draw_grid(app) == 0
+
+    app.input_manager.selected_step = 20
+    assert draw_grid(app) == full
+    assert app._grid_page == (1, 2)
+
+    sequencer.current_track = 1
+    assert draw_grid(app) == full
+    assert draw_grid(app) == 0
+
+
+def test_grid_has_no_stale_column_after_switching_sequencer(make_sequencer):
+    app = make_app()
+    app.sequencer.patterns.set_pitch(0, 0, 2, 36)
+    draw_grid(app)
+    assert app._grid_columns[2][1]
+
+    other = make_sequencer()
+    other.patterns.set_pitch(0, 0, 5, 40)
+    app._use_sequencer(other)
+    assert draw_grid(app) == app.GRID_COLUMNS * 12
+    assert app._grid_columns[2][1] == ()
+    assert app._grid_columns[5][1]
+
+
+def make_song_app(song_length):
+    """ソング編集モードで、指定した長さのソングを持つアプリを作る"""
+    app = make_app()
+    app.input_manager.mode = app.input_manager.MODE_SONG_EDIT
+    for position in range(song_length):
+        app.sequencer.add_pattern_to_song(position % 4)
+    return app
+
+
+def draw_song(app):
+    """ソングシーケンスを描き、表示範囲の先頭のソング位置を返す"""
+    app._draw_song_sequence()
+    return app._song_view_first
+
+
+def test_song_edit_keys_move_position_and_change_repeat():
+    app = make_song_app(40)
+    input_manager = app.input_manager
+    page = input_manager.SONG_PAGE_SIZE
+
+    # Ctrl+左右は1ページ分移動し、端で止まる
+    positions = []
+    for key in (pyxel.KEY_RIGHT,) * 3 + (pyxel.KEY_LEFT,) * 3:
+        press(app, pyxel.KEY_CTRL, key)
+        positions.append(input_manager.song_edit_position)
+    assert positions == [page, 2 * page, 39, 39 - page, 39 - 2 * page, 0]
+
+    # Ctrlなしの左右は1つずつ移動し、端で反対側に回る
+    press(app, pyxel.KEY_LEFT)
+    assert input_manager.song_edit_position == 39
+    press(app, pyxel.KEY_HOME)
+    assert input_manager.song_edit_position == 0
+    press(app, pyxel.KEY_END)
+    assert input_manager.song_edit_position == 39
+
+    # ゲームパッドの十字キーも同じ操作になる
+    press(app, pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT)
+    assert input_manager.song_edit_position == 0
+    press(app, pyxel.GAMEPAD1_BUTTON_DPAD_RIGHT)
+    press(app, pyxel.GAMEPAD1_BUTTON_DPAD_LEFT)
+    assert input_manager.song_edit_position == 0
+
+    # 上下は選択位置の繰り返し回数を変え、1回より少なくはならない
+    repeats = []
+    for key in (pyxel.KEY_UP, pyxel.KEY_UP, pyxel.GAMEPAD1_BUTTON_DPAD_UP, pyxel.KEY_DOWN) + (
+        pyxel.GAMEPAD1_BUTTON_DPAD_DOWN,
+    ) * 4:
+        press(app, key)
+        repeats.append(app.sequencer.song_repeat(0))
+    assert repeats == [2, 3, 4, 3, 2, 1, 1, 1]
+    assert app.sequencer.song_repeat(1) == 1
+
+
+def test_song_view_scrolls_to_edit_cursor_or_play_position():
+    app = make_song_app(40)
+    sequencer = app.sequencer
+    assert draw_song(app) == 0
+
+    # 選択位置が表示範囲の下に出たら、見える行まで最小限スクロールする
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_RIGHT)
+    assert draw_song(app) == 8
+    press(app, pyxel.KEY_END)
+    assert draw_song(app) == 24
+
+    # 選択位置が動かなければ、再生位置に合わせる
+    sequencer.song_mode = True
+    sequencer.playing = True
+    sequencer.song_position = 2
+    assert draw_song(app) == 0
+    sequencer.song_position = 3
+    assert draw_song(app) == 0
+
+    # 直前に動いた選択位置を優先する（選択位置の行が下の行になる）
+    press(app, pyxel.KEY_CTRL, pyxel.KEY_LEFT)
+    assert app.input_manager.song_edit_position == 23
+    assert draw_song(app) == 8
+
+
+def test_song_view_does_not_scroll_past_song_end():
+    app = make_song_app(20)
+    press(app, pyxel.KEY_END)
+    # 最後の行（16-19）が下の行になる位置で止まる
+    assert draw_song(app) == 8
+
+    # ソングが短くなったら表示範囲も戻す
+    for _ in range(12):
+        press(app, pyxel.KEY_DELETE)
+    assert (len(app.sequencer.song_sequence), app.input_manager.song_edit_position) == (8, 7)
+    assert draw_song(app) == 0
+
+
+def test_song_minimap_is_rebuilt_only_when_song_changes(monkeypatch):
+    app = make_song_app(40)
+    image = app.backend.image(app.GRID_IMAGE)
+    rebuilt = []
+    draw_rect = image.rect
+    monkeypatch.setattr(
+        image, "rect", lambda x, y, w, h, col: (rebuilt.append(x) if y == app.MINIMAP_V else None, draw_rect(x, y, w, h, col))
+    )
+
+    draw_song(app)
+    assert app._minimap_key == (app.sequencer.song_version, 40)
+    assert rebuilt
+
+    # 選択位置・再生位置の移動やスクロールでは描き直さない
+    rebuilt.clear()
+    press(app, pyxel.KEY_END)
+    draw_song(app)
+    app.sequencer.song_mode = True
+    app.sequencer.playing = True
+    app.sequencer.song_position = 5
+    draw_song(app)
+    assert rebuilt == []
+
+    version = app.sequencer.song_version
+    press(app, pyxel.KEY_RETURN)
+    assert app.sequencer.song_version != version
+    draw_song(app)
+    assert app._minimap_key == (app.sequencer.song_version, 41)
+    assert rebuilt
+
+
+def test_library_load_failure_is_logged(tmp_path, capsys):
+    (tmp_path / "broken.json").write_text("{")
+    app = make_app(library_dir=str(tmp_path))
+    assert capsys.readouterr().out == ""
+    line = app.event_log.lines()[-1]
+    assert "WARNING" in line and "library load failed: broken.json" in line
+    app.library.close()
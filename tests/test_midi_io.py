@@ -0,0 +1,147 @@
+"""
+midi_io.pyのテスト（Standard MIDI Fileの読み込み・書き出しと往復変換）
+"""
+
+import struct
+
+import pytest
+
+import midi_io
+from midi_io import NOTE_OFFSET, export_midi, import_midi, iter_midi_events, midi_note_to_pitch
+
+
+def write_midi(path, tracks, division=96, chunks=None):
+    """
+    トラックの内容（bytes）のリストからMIDIファイルを作る
+
+    Args:
+        path: 出力先
+        tracks: トラックチャンクの内容のリスト
+        division: 4分音符あたりのティック数
+        chunks: 指定した場合はトラックチャンクの代わりに書く(種類, 内容)のリスト
+    """
+    chunks = chunks if chunks is not None else [(b"MTrk", data) for data in tracks]
+    with open(path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 1, sum(1 for kind, _ in chunks if kind == b"MTrk"), division))
+        for kind, data in chunks:
+            f.write(kind + struct.pack(">I", len(data)) + data)
+    return str(path)
+
+
+def test_midi_note_to_pitch_folds_out_of_range_octaves():
+    assert midi_note_to_pitch(NOTE_OFFSET + 33) == 33
+    assert midi_note_to_pitch(0) == 0
+    assert midi_note_to_pitch(NOTE_OFFSET - 1) == 11
+    assert midi_note_to_pitch(127) < 60
+
+
+def test_iter_events_reads_running_status_and_meta(tmp_path):
+    track = (
+        b"\x00\xff\x51\x03\x07\xa1\x20"  # テンポ 500000
+        b"\x00\x90\x3c\x64"  # ノートオン
+        b"\x18\x3e\x64"  # ランニングステータス
+        b"\x81\x00\xf0\x02\x7e\xf7"  # デルタ128のSysEx
+        b"\x00\xff\x2f\x00"
+    )
+    filename = write_midi(tmp_path / "a.mid", [track])
+    events = list(iter_midi_events(filename))
+    assert events[0] == ("header", 1, 1, 96)
+    assert events[1:] == [
+        (0, 0, 0xFF, (0x51, b"\x07\xa1\x20")),
+        (0, 0, 0x90, (0x3C, 0x64)),
+        (0, 24, 0x90, (0x3E, 0x64)),
+        (0, 152, 0xF0, None),
+        (0, 152, 0xFF, (0x2F, b"")),
+    ]
+
+
+def test_data_after_end_of_track_is_skipped(tmp_path, monkeypatch):
+    # バッファに入りきらない長さのチャンクで、トラックの終わりより後ろを読み飛ばす
+    monkeypatch.setattr(midi_io, "BUFFER_SIZE", 16)
+    first = b"\x00\x90\x3c\x64\x00\xff\x2f\x00" + b"\x00\x90\x40\x64" * 8
+    second = b"\x00\x91\x43\x64\x00\xff\x2f\x00"
+    filename = write_midi(tmp_path / "a.mid", [first, second])
+    notes = [event[:3] for event in list(iter_midi_events(filename))[1:] if event[2] != 0xFF]
+    assert notes == [(0, 0, 0x90), (1, 0, 0x91)]
+
+
+def test_unknown_chunks_and_smpte(tmp_path):
+    filename = write_midi(tmp_path / "a.mid", [], chunks=[(b"XFIH", b"junk"), (b"MTrk", b"\x00\x90\x3c\x64\x00\xff\x2f\x00")])
+    assert len(list(iter_midi_events(filename))) == 3
+    with pytest.raises(ValueError):
+        list(iter_midi_events(write_midi(tmp_path / "b.mid", [b""], division=0xE728)))
+    (tmp_path / "c.mid").write_bytes(b"RIFF" + bytes(10))
+    with pytest.raises(ValueError):
+        list(iter_midi_events(str(tmp_path / "c.mid")))
+
+
+def test_import_quantizes_notes_and_keeps_highest(tmp_path, make_sequencer):
+    track = (
+        b"\x00\xff\x51\x03\x1e\x84\x80"  # 4分音符30 BPM = 1分あたり120ステップ
+        b"\x00\x90\x3c\x64"  # ステップ0
+        b"\x00\x90\x3e\x64"  # 同じステップのより高い音
+        b"\x1a\x80\x3c\x00"  # ノートオフ（tick 26）
+        b"\x00\x90\x40\x64"  # tick 26はステップ1に量子化
+        b"\x00\x99\x24\x64"  # ドラム
+        b"\x00\xff\x2f\x00"
+    )
+    sequencer = import_midi(write_midi(tmp_path / "a.mid", [track]), make_sequencer())
+    drum = sequencer.track_tones.index("n")
+    assert sequencer.patterns.get_pitch(0, 0, 0) == 0x3E - NOTE_OFFSET
+    assert sequencer.patterns.get_pitch(0, 0, 1) == 0x40 - NOTE_OFFSET
+    assert sequencer.patterns.get_pitch(0, drum, 1) == 0x24 - NOTE_OFFSET
+    assert sequencer.tempo == 120
+    assert sequencer.song_sequence == [0]
+
+
+def test_import_does_not_record_edit_history(tmp_path, make_sequencer):
+    sequencer = make_sequencer()
+    track = b"".join(b"\x00\x90" + bytes([0x30 + i, 0x64]) + b"\x18\x80" + bytes([0x30 + i, 0]) for i in range(16))
+    ops = []
+    sequencer.history.record_cell = lambda *args: ops.append(args)
+    import_midi(write_midi(tmp_path / "a.mid", [track + b"\x00\xff\x2f\x00"]), sequencer)
+    assert ops == []
+    assert sequencer.patterns.recorder is sequencer.history
+    assert not sequencer.history.can_undo()
+
+
+def test_export_import_round_trip_keeps_trailing_rests(tmp_path, make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 24)
+    sequencer.patterns.set_pitch(0, 1, 15, 30)
+    sequencer.song_sequence = [0, 5]
+    sequencer.song_repeats = [1, 1]
+    filename = str(tmp_path / "song.mid")
+    export_midi(sequencer, filename)
+
+    loaded = import_midi(filename, make_sequencer())
+    assert loaded.song_sequence == [0, 1]
+    assert loaded.patterns.is_empty(1)
+    assert loaded.patterns.pattern_pitches(0) == sequencer.patterns.pattern_pitches(0)
+    assert loaded.tempo == sequencer.tempo
+
+
+def test_export_repeats_and_end_of_track_at_song_end(tmp_path, make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(2, 0, 3, 24)
+    sequencer.song_sequence = [2]
+    sequencer.song_repeats = [3]
+    filename = str(tmp_path / "song.mid")
+    export_midi(sequencer, filename)
+    events = list(iter_midi_events(filename))[1:]
+    ends = {track_idx: tick for track_idx, tick, status, data in events if status == 0xFF and data[0] == 0x2F}
+    assert set(ends.values()) == {3 * 16 * 24}
+    assert len(ends) == sequencer.TRACK_COUNT + 1
+    assert [tick for _, tick, status, _ in events if status == 0x90] == [3 * 24, 19 * 24, 35 * 24]
+
+
+def test_muted_track_notes_are_exported(tmp_path, make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 1, 2, 24)
+    sequencer.track_volumes[1] = 0
+    filename = str(tmp_path / "song.mid")
+    export_midi(sequencer, filename)
+    note_ons = [data for _, _, status, data in iter_midi_events(filename) if status & 0xF0 == 0x90]
+    assert note_ons == [(24 + NOTE_OFFSET, 1)]
+    # 読み込みでは最初に出てきたチャンネルが最初のトラックになる
+    assert import_midi(filename, make_sequencer()).patterns.get_pitch(0, 0, 2) == 24
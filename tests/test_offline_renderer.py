@@ -0,0 +1,108 @@
+"""
+offline_renderer.pyのテスト（WAVの書き出しと、アプリの再生と同じボイス割り当て）
+"""
+
+import random
+import wave
+from array import array
+
+import pytest
+
+from offline_renderer import OfflineRenderer, render_to_wav
+from pattern_compiler import PYXEL_NOTE_NAMES
+from sequencer import Sequencer
+
+
+def samples(pcm):
+    return array("h", pcm)
+
+
+def test_empty_pattern_renders_silence_of_pattern_length(make_sequencer):
+    sequencer = make_sequencer()
+    pcm = OfflineRenderer(sequencer).render()
+    # 120 BPMで16ステップ = 8秒
+    assert len(pcm) == 2 * 8 * OfflineRenderer.SAMPLE_RATE
+    assert not any(samples(pcm))
+
+
+def test_note_sounds_for_note_length_then_silence(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 1, 0, 4 * 12)  # 矩形波のC4
+    renderer = OfflineRenderer(sequencer)
+    step_sec, note_sec, _ = renderer.timing()
+    pcm = samples(renderer.render())
+    note_samples = round(note_sec * renderer.sample_rate)
+    assert any(pcm[:note_samples])
+    assert not any(pcm[note_samples:])
+    # 音量5の矩形波はチャンネルゲインの5/7の振幅
+    expected = int(OfflineRenderer.CHANNEL_GAIN * 5 / Sequencer.MAX_VOLUME * 32767)
+    assert max(abs(sample) for sample in pcm[:note_samples]) == pytest.approx(expected, abs=1)
+
+
+def test_volume_zero_track_is_silent(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 40)
+    sequencer.track_volumes[0] = 0
+    assert not any(samples(OfflineRenderer(sequencer).render()))
+
+
+def test_start_step_skips_earlier_steps(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 4, 40)
+    renderer = OfflineRenderer(sequencer)
+    full = renderer.render()
+    step_bytes = len(full) // 16
+    assert renderer.render(start_step=4) == full[4 * step_bytes :]
+
+
+def test_song_repeats_are_expanded(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(1, 0, 0, 40)
+    sequencer.song_sequence = [0, 1]
+    sequencer.song_repeats = [1, 3]
+    assert len(OfflineRenderer(sequencer).render()) == 2 * 4 * 8 * OfflineRenderer.SAMPLE_RATE
+
+
+@pytest.mark.parametrize("tempo", [120, 240])
+def test_more_tracks_than_channels_match_live_voice_allocation(tempo, make_sequencer):
+    # 8トラックの音をアプリのステップごとの再生と同じく4チャンネルに割り当て、奪われた音・鳴らせない音も同じにする
+    sequencer = make_sequencer(track_count=8, tempo=tempo)
+    sequencer.track_priorities = [track_idx % 3 for track_idx in range(8)]
+    rng = random.Random(3)
+    for track_idx in range(8):
+        for step_idx in range(16):
+            if rng.random() < 0.6:
+                sequencer.patterns.set_pitch(0, track_idx, step_idx, rng.randrange(60))
+
+    live = []
+    backend = sequencer.backend
+    for step_idx in range(16):
+        sequencer.current_step = step_idx
+        count = len(backend.play_log)
+        sequencer.play_current_step()
+        played = set()
+        for _, _, _, slot in backend.play_log[count:]:
+            notes, tone, volume, _, _ = backend.sounds[slot]
+            played.add((tone, notes, int(volume)))
+        live.append(played)
+    assert sequencer.voices.dropped > 0
+
+    renderer = OfflineRenderer(sequencer)
+    rendered = [
+        {(tone, PYXEL_NOTE_NAMES[pitch], volume) for tone, pitch, volume, offset, _ in segments if offset == 0}
+        for _, segments in renderer._step_segments()
+    ]
+    assert rendered == live
+    # ステップごとの再生では1ステップは60/テンポ秒
+    assert renderer.timing()[0] == 60 / tempo
+
+
+def test_write_wav_header(tmp_path, make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 40)
+    filename = str(tmp_path / "song.wav")
+    seconds = render_to_wav(sequencer, filename, sample_rate=11025)
+    assert seconds == 8
+    with wave.open(filename, "rb") as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, 11025)
+        assert wav.getnframes() == 8 * 11025
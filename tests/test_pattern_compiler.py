@@ -0,0 +1,94 @@
+"""
+pattern_compiler.pyのテスト（パターン・ソングからPyxelのサウンド・ミュージックへの変換）
+"""
+
+import pytest
+
+from pattern_compiler import PatternCompiler
+
+
+@pytest.mark.parametrize("tempo", [60, 97, 120, 150, 240])
+def test_step_layout_keeps_tempo_within_tolerance(tempo, make_sequencer):
+    compiler = make_sequencer().compiler
+    subdivision, speed = compiler.step_layout(tempo)
+    assert 1 <= subdivision <= PatternCompiler.MAX_SUBDIVISION
+    assert compiler.step_seconds(tempo) == pytest.approx(60 / tempo, rel=PatternCompiler.MAX_TEMPO_ERROR)
+
+
+def test_step_layout_prefers_single_note_length_at_120(make_sequencer):
+    # 1ステップ60ティックは速度15（単音再生と同じ長さ）の4分割
+    assert make_sequencer().compiler.step_layout(120) == (4, 15)
+
+
+def test_compile_pattern_writes_notes_and_rests_per_track(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 1, 0, 4 * 12)  # C4
+    sequencer.patterns.set_pitch(0, 1, 2, 3 * 12 + 9)  # A3
+    channels = sequencer.compiler.compile_pattern(0)
+    assert len(channels) == sequencer.TRACK_COUNT
+    notes, tones, volumes, effects, speed = channels[1]
+    steps = [notes.split()[i * 4] for i in range(16)]
+    assert steps[:4] == ["c4", "r", "a3", "r"]
+    assert set(steps[4:]) == {"r"}
+    assert (tones, volumes, effects, speed) == ("s", "5", "n", 15)
+
+
+def test_compiled_pattern_is_cached_until_marked_dirty(make_sequencer):
+    sequencer = make_sequencer()
+    compiler = sequencer.compiler
+    first = compiler.compile_pattern(0)
+    assert compiler.compile_pattern(0) is first
+    sequencer.input_note(0)
+    assert compiler.is_stale([0])
+    second = compiler.compile_pattern(0)
+    assert second is not first
+    assert not compiler.is_stale([0])
+
+
+def test_mark_all_dirty_recompiles_after_volume_change(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.compiler.compile_pattern(0)
+    sequencer.change_track_volume(1)
+    assert sequencer.compiler.compile_pattern(0)[0][2] == "6"
+
+
+def test_compile_song_chains_patterns_and_shares_identical_sounds(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(1, 0, 0, 50)
+    sequencer.song_sequence = [0, 1, 0]
+    music_idx = sequencer.compiler.compile_song()
+    seqs = sequencer.backend.musics[music_idx]
+    assert len(seqs) == sequencer.TRACK_COUNT
+    assert all(len(seq) == 3 for seq in seqs)
+    # 同じパターンは同じスロット、内容の違うトラック0のパターン1だけ別のスロット
+    assert seqs[0][0] == seqs[0][2] != seqs[0][1]
+    assert seqs[1][0] == seqs[1][1]
+    assert all(
+        PatternCompiler.FIRST_SLOT <= slot < PatternCompiler.FIRST_SLOT + PatternCompiler.SLOT_COUNT for slot in seqs[0]
+    )
+
+
+def test_compile_music_rejects_more_tracks_than_channels(make_sequencer):
+    with pytest.raises(ValueError):
+        make_sequencer(track_count=5).compiler.compile_pattern_loop(0)
+
+
+def test_compile_music_rejects_too_many_distinct_sounds(make_sequencer):
+    sequencer = make_sequencer()
+    for pattern_idx in range(13):
+        for track_idx in range(4):
+            sequencer.patterns.set_pitch(pattern_idx, track_idx, 0, pattern_idx)
+    with pytest.raises(ValueError):
+        sequencer.compiler.compile_music(PatternCompiler.SONG_MUSIC, list(range(13)))
+
+
+def test_playback_uses_music_engine_and_follows_play_position(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 40)
+    sequencer.toggle_play()
+    assert sequencer._music_active
+    assert sequencer.backend.play_log[-1][1] == "playm"
+    # 30フレーム（1秒）で120 BPMの2ステップ進む
+    sequencer.backend.advance(30)
+    sequencer.update()
+    assert sequencer.current_step == 2
@@ -0,0 +1,198 @@
+"""
+pattern_store.pyのテスト（型付き配列でのセルの保持、従来形式のビュー、長さの変更、パターンの共有）
+"""
+
+import pytest
+
+from pattern_store import EMPTY, PatternStore
+
+
+def make_store():
+    return PatternStore(8, 4, step_count=16, max_step_count=64)
+
+
+def test_empty_patterns_use_no_memory():
+    store = make_store()
+    assert store.get_pitch(3, 2, 5) == EMPTY
+    assert store.is_empty(3)
+    assert store.blocks == {}
+    assert store.used_patterns() == []
+
+
+def test_first_note_allocates_signed_char_block_and_last_note_releases_it():
+    store = make_store()
+    store.set_pitch(1, 2, 5, 40)
+    block = store.blocks[1]
+    assert block.typecode == "b"
+    assert len(block) == 4 * 16
+    assert block[2 * 16 + 5] == 40
+    assert store.used_patterns() == [1]
+    store.set_pitch(1, 2, 5, EMPTY)
+    assert store.is_empty(1)
+    assert 1 not in store.blocks
+
+
+def test_views_read_and_write_legacy_cells():
+    store = make_store()
+    store[0][1][3] = ("A", 3, 1)
+    assert store.get_pitch(0, 1, 3) == 3 * 12 + 9
+    assert store[0][1][3] == ("A", 3, 1)
+    assert store[0][1][4] is None
+    assert len(store[0]) == 4
+    assert len(list(store[0][1])) == 16
+    store[0][1][3] = None
+    assert store.is_empty(0)
+    with pytest.raises(IndexError):
+        store[0][1][16]
+    with pytest.raises(IndexError):
+        store[8]
+
+
+def test_note_index_tracks_steps_and_tracks():
+    store = make_store()
+    store.set_pitch(0, 0, 2, 12)  # C1
+    store.set_pitch(0, 3, 2, 24)  # C2
+    assert store.note_positions(0) == {(2, 0): 0b1001}
+    store.set_pitch(0, 0, 2, 13)
+    assert store.note_positions(0) == {(2, 0): 0b1000, (2, 1): 0b0001}
+    store.clear_track(0, 3)
+    assert store.note_positions(0) == {(2, 1): 0b0001}
+
+
+def test_version_and_dirty_change_on_every_edit():
+    store = make_store()
+    store.set_pitch(2, 0, 0, 5)
+    version = store.version(2)
+    store.set_pitch(2, 0, 0, 5)
+    assert store.version(2) == version
+    store.set_pitch(2, 0, 0, 6)
+    assert store.version(2) > version
+    assert store.dirty == {2}
+
+
+def test_set_length_keeps_notes_and_drops_overflow():
+    store = make_store()
+    store.set_pitch(0, 1, 3, 10)
+    store.set_pitch(0, 1, 15, 11)
+    store.set_length(0, 32)
+    assert store.length(0) == 32
+    assert (store.get_pitch(0, 1, 3), store.get_pitch(0, 1, 15), store.get_pitch(0, 1, 31)) == (10, 11, EMPTY)
+    store.set_length(0, 8)
+    assert store.track_pitches(0, 1).tolist() == [EMPTY] * 3 + [10] + [EMPTY] * 4
+    assert store.note_positions(0) == {(3, 10): 0b10}
+    with pytest.raises(ValueError):
+        store.set_length(0, 65)
+
+
+def test_pattern_with_only_a_custom_length_is_still_used():
+    store = make_store()
+    store.set_length(5, 64)
+    assert store.used_patterns() == [5]
+    assert store.is_empty(5)
+    store.clear_pattern(5)
+    assert store.used_patterns() == []
+
+
+def test_lazy_loader_runs_on_first_access_only():
+    store = make_store()
+    calls = []
+
+    def loader(pattern_idx):
+        calls.append(pattern_idx)
+        return 16, bytes([0xFF] * 63 + [7])
+
+    store.attach_loader(loader, [4])
+    assert store.used_patterns() == [4]
+    assert calls == []
+    assert store.get_pitch(4, 3, 15) == 7
+    assert store.get_pitch(4, 0, 0) == EMPTY
+    store.get_pitch(4, 3, 15)
+    assert calls == [4]
+
+
+def test_clear_all_frees_every_pattern():
+    store = make_store()
+    store.set_pitch(0, 0, 0, 1)
+    store.set_length(1, 32)
+    store.clear_all()
+    assert store.used_patterns() == []
+    assert store.blocks == {}
+    assert store.length(1) == 16
+
+
+def test_copy_shares_block_until_first_write():
+    store = make_store()
+    store.set_pitch(0, 1, 2, 30)
+    store.copy_pattern(0, 1)
+    store.copy_pattern(0, 2)
+    assert store.blocks[1] is store.blocks[0] and store.blocks[2] is store.blocks[0]
+    assert store.note_positions(1) is store.note_positions(0)
+    assert store._refs == {id(store.blocks[0]): 3}
+    assert store.block_bytes() == 4 * 16
+
+    # 書き込んだパターンだけが配列と索引を複製する
+    store.set_pitch(1, 1, 2, 31)
+    assert store.blocks[1] is not store.blocks[0]
+    assert (store.get_pitch(0, 1, 2), store.get_pitch(1, 1, 2), store.get_pitch(2, 1, 2)) == (30, 31, 30)
+    assert store.note_positions(0) == {(2, 6): 0b10}
+    assert store.is_shared(0) and store.is_shared(2) and not store.is_shared(1)
+    assert store.block_bytes() == 2 * 4 * 16
+
+
+def test_dropping_a_shared_pattern_keeps_the_others():
+    store = make_store()
+    store.set_pitch(0, 0, 0, 10)
+    store.copy_pattern(0, 1)
+    store.clear_pattern(0)
+    assert store.get_pitch(1, 0, 0) == 10
+    assert not store.is_shared(1)
+    assert store._refs == {}
+    # 空のパターンのコピーはコピー先の配列を外す
+    store.copy_pattern(0, 1)
+    assert store.is_empty(1)
+
+
+def test_deduplicate_shares_equal_blocks():
+    store = make_store()
+    for pattern_idx in (0, 3, 5):
+        store.set_pitch(pattern_idx, 2, 4, 20)
+    store.set_pitch(6, 2, 4, 21)
+    versions = dict(store.versions)
+    assert store.deduplicate() == 2
+    assert store.block_key(3) == store.block_key(0) == store.block_key(5)
+    assert store.block_key(6) != store.block_key(0)
+    assert store.versions == versions
+    assert store.deduplicate() == 0
+
+
+def test_lazy_loaded_equal_blocks_are_shared():
+    store = make_store()
+    data = bytes([0xFF] * 63 + [7])
+    store.attach_loader(lambda pattern_idx: (16, data), [1, 2])
+    store.ensure_loaded(1)
+    store.ensure_loaded(2)
+    assert store.is_shared(1) and store.blocks[1] is store.blocks[2]
+
+
+def test_set_track_count_keeps_notes_and_sharing():
+    store = make_store()
+    store.set_length(1, 32)
+    store.set_pitch(1, 0, 31, 20)
+    store.set_pitch(1, 3, 0, 30)
+    store.copy_pattern(1, 2)
+    store.set_pitch(3, 3, 4, 40)
+
+    store.set_track_count(6)
+    assert len(store.blocks[1]) == 6 * 32
+    assert (store.get_pitch(1, 0, 31), store.get_pitch(1, 3, 0), store.get_pitch(1, 5, 0)) == (20, 30, EMPTY)
+    assert store.is_shared(2) and store.blocks[2] is store.blocks[1]
+    store.set_pitch(2, 5, 1, 50)
+    assert store.track_has_notes(5)
+    assert store.get_pitch(1, 5, 1) == EMPTY
+
+    # 減らすと外れたトラックの音は消え、音のなくなったパターンは配列を解放する
+    store.set_track_count(3)
+    assert store.get_pitch(1, 0, 31) == 20
+    assert store.is_empty(3)
+    assert not store.track_has_notes(3)
+    assert len(store.blocks[2]) == 3 * 32
@@ -0,0 +1,146 @@
+"""
+project_file.pyのテスト（バイナリ形式の遅延読み込み、変更したパターンだけの書き換え、別名保存）
+"""
+
+import os
+
+import pytest
+
+from project_file import HEADER, ProjectFile
+from project_io import load_project, save_project
+
+
+def make_project(make_sequencer, pattern_count=4):
+    sequencer = make_sequencer()
+    sequencer.tempo = 180
+    for pattern_idx in range(pattern_count):
+        sequencer.patterns.set_pitch(pattern_idx, pattern_idx % 4, pattern_idx, 10 + pattern_idx)
+    sequencer.song_sequence = list(range(pattern_count))
+    sequencer.song_repeats = [2] * pattern_count
+    return sequencer
+
+
+def test_load_decodes_patterns_on_first_access(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    save_project(make_project(make_sequencer), filename)
+    sequencer = load_project(filename, make_sequencer())
+    store = sequencer.patterns
+    assert store.blocks == {}
+    assert (sequencer.tempo, sequencer.song_sequence, sequencer.song_repeats) == (180, [0, 1, 2, 3], [2, 2, 2, 2])
+    assert store.get_pitch(2, 2, 2) == 12
+    assert list(store.blocks) == [2]
+    sequencer.project_file.close()
+
+
+def test_resave_rewrites_only_changed_pattern_in_place(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    save_project(make_project(make_sequencer), filename)
+    sequencer = load_project(filename, make_sequencer())
+    project_file = sequencer.project_file
+    size = os.path.getsize(filename)
+    index = dict(project_file.index)
+
+    sequencer.patterns.set_pitch(1, 0, 0, 30)
+    save_project(sequencer, filename)
+    assert sequencer.project_file is project_file
+    assert project_file.index == index
+    assert os.path.getsize(filename) == size
+    # 書き込み後もまだ読み込んでいないパターンを読める
+    assert sequencer.patterns.get_pitch(3, 3, 3) == 13
+
+    loaded = load_project(filename, make_sequencer())
+    assert loaded.patterns.get_pitch(1, 0, 0) == 30
+    assert loaded.patterns.get_pitch(1, 1, 1) == 11
+    loaded.project_file.close()
+    project_file.close()
+
+
+def test_resave_with_longer_pattern_appends_block_and_remaps(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    save_project(make_project(make_sequencer), filename)
+    sequencer = load_project(filename, make_sequencer())
+    project_file = sequencer.project_file
+    tail_offset = project_file.tail_offset
+
+    sequencer.patterns.set_length(0, 64)
+    sequencer.patterns.set_pitch(0, 3, 63, 50)
+    save_project(sequencer, filename)
+    assert project_file.index[0] == (64, tail_offset)
+    assert project_file.wasted == 4 * 16
+    assert project_file._mmap is not None
+    assert len(project_file._mmap) == os.path.getsize(filename)
+    assert sequencer.patterns.get_pitch(2, 2, 2) == 12
+
+    loaded = load_project(filename, make_sequencer())
+    assert loaded.patterns.length(0) == 64
+    assert loaded.patterns.get_pitch(0, 3, 63) == 50
+    loaded.project_file.close()
+    project_file.close()
+
+
+def test_identical_patterns_share_one_block(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    sequencer = make_project(make_sequencer, pattern_count=1)
+    sequencer.copy_pattern(0, 7)
+    save_project(sequencer, filename)
+    project_file = sequencer.project_file
+    assert project_file.index[0][1] == project_file.index[7][1] != 0
+    assert os.path.getsize(filename) < HEADER.size + 4 + 2 * 4 * 16
+
+    loaded = load_project(filename, make_sequencer())
+    assert loaded.patterns.get_pitch(0, 0, 0) == loaded.patterns.get_pitch(7, 0, 0) == 10
+    assert loaded.patterns.block_key(7) == loaded.patterns.block_key(0)
+    loaded.project_file.close()
+
+
+def test_save_as_switches_to_new_file_and_closes_previous(tmp_path, make_sequencer):
+    first = str(tmp_path / "first.ppx")
+    second = str(tmp_path / "second.ppx")
+    save_project(make_project(make_sequencer), first)
+    sequencer = load_project(first, make_sequencer())
+    previous = sequencer.project_file
+
+    save_project(sequencer, second)
+    assert sequencer.project_file is not previous
+    assert sequencer.project_file.filename == second
+    assert previous._mmap is None and previous._file is None
+    # 読み込んでいなかったパターンも新しいファイルに書かれている
+    loaded = load_project(second, make_sequencer())
+    assert [loaded.patterns.get_pitch(i, i % 4, i) for i in range(4)] == [10, 11, 12, 13]
+    loaded.project_file.close()
+
+
+def test_track_settings_are_resaved_in_place(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    save_project(make_project(make_sequencer), filename)
+    sequencer = load_project(filename, make_sequencer())
+    size = os.path.getsize(filename)
+    sequencer.current_track = 1
+    sequencer.change_track_tone(1)
+    sequencer.change_track_priority(3)
+    save_project(sequencer, filename)
+    assert os.path.getsize(filename) == size
+
+    loaded = load_project(filename, make_sequencer())
+    assert (loaded.track_tones, loaded.track_priorities) == (["t", "p", "p", "n"], [0, 3, 0, 0])
+    loaded.project_file.close()
+    sequencer.project_file.close()
+
+
+def test_rejects_other_files_and_track_layouts(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.ppx")
+    with open(filename, "wb") as f:
+        f.write(b"RIFF" + bytes(HEADER.size))
+    with pytest.raises(ValueError):
+        ProjectFile(filename).load(make_sequencer())
+
+    # ヘッダーのトラック数（0）と既定のステップ数（32）を書き換えたファイル
+    for offset, value in ((8, 0), (9, 32)):
+        save_project(make_project(make_sequencer), filename)
+        with open(filename, "r+b") as f:
+            f.seek(offset)
+            f.write(bytes([value]))
+        project_file = ProjectFile(filename)
+        with pytest.raises(ValueError):
+            project_file.load(make_sequencer())
+        assert project_file._mmap is None
@@ -0,0 +1,129 @@
+"""
+project_io.pyのテスト（JSON・バイナリ形式の保存と読み込み、古い形式の読み込み）
+"""
+
+import json
+
+import pytest
+
+from project_io import PROJECT_VERSION, load_project, save_project, sequencer_from_dict, sequencer_to_dict
+from sequencer import Sequencer
+
+
+def make_project(make_sequencer, track_count=None):
+    sequencer = make_sequencer(track_count)
+    sequencer.tempo = 150
+    sequencer.track_volumes[1] = 3
+    sequencer.track_tones[2] = "n"
+    sequencer.track_priorities[3] = 2
+    sequencer.patterns.set_pitch(0, 0, 0, 40)
+    sequencer.patterns.set_pitch(0, 1, 3, 12)
+    sequencer.patterns.set_length(2, 32)
+    sequencer.patterns.set_pitch(2, 3, 31, 59)
+    sequencer.song_sequence = [0, 2, 0]
+    sequencer.song_repeats = [1, 4, 2]
+    return sequencer
+
+
+def assert_same_project(loaded, original):
+    assert loaded.TRACK_COUNT == original.TRACK_COUNT
+    assert loaded.tempo == original.tempo
+    assert loaded.track_volumes == original.track_volumes
+    assert loaded.track_tones == original.track_tones
+    assert loaded.track_priorities == original.track_priorities
+    assert loaded.song_sequence == original.song_sequence
+    assert loaded.song_repeats == original.song_repeats
+    assert loaded.patterns.used_patterns() == original.patterns.used_patterns()
+    for pattern_idx in original.patterns.used_patterns():
+        assert loaded.patterns.length(pattern_idx) == original.patterns.length(pattern_idx)
+        assert loaded.patterns.pattern_pitches(pattern_idx) == original.patterns.pattern_pitches(pattern_idx)
+
+
+@pytest.mark.parametrize("extension", [".json", ".ppx"])
+def test_save_and_load_round_trip(tmp_path, extension, make_sequencer):
+    original = make_project(make_sequencer)
+    filename = str(tmp_path / f"song{extension}")
+    save_project(original, filename)
+    assert_same_project(load_project(filename, make_sequencer()), original)
+
+
+@pytest.mark.parametrize("extension", [".json", ".ppx"])
+def test_keeps_more_tracks_than_channels(tmp_path, extension, make_sequencer):
+    original = make_project(make_sequencer, track_count=6)
+    original.patterns.set_pitch(0, 5, 7, 30)
+    original.track_tones[4] = "n"
+    original.track_priorities[5] = 3
+    filename = str(tmp_path / f"song{extension}")
+    save_project(original, filename)
+    assert_same_project(load_project(filename, make_sequencer(track_count=6)), original)
+
+
+@pytest.mark.parametrize("extension", [".json", ".ppx"])
+def test_load_adjusts_track_count_of_target_sequencer(tmp_path, extension, make_sequencer):
+    # ライブラリの既定の4トラックのSequencerにも、トラック数の違うプロジェクトを読み込める
+    original = make_project(make_sequencer, track_count=6)
+    original.patterns.set_pitch(1, 5, 0, 30)
+    filename = str(tmp_path / f"song{extension}")
+    save_project(original, filename)
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(3, 0, 0, 10)
+    assert_same_project(load_project(filename, sequencer), original)
+
+    save_project(make_project(make_sequencer), filename)
+    assert_same_project(load_project(filename, sequencer), make_project(make_sequencer))
+
+
+def test_load_rejects_out_of_range_track_count(make_sequencer):
+    data = sequencer_to_dict(make_project(make_sequencer))
+    data["track_volumes"] = [5] * (Sequencer.MAX_TRACK_COUNT + 1)
+    with pytest.raises(ValueError):
+        sequencer_from_dict(data, make_sequencer())
+
+
+def test_identical_patterns_are_written_once_and_shared_after_load(make_sequencer):
+    original = make_project(make_sequencer)
+    original.copy_pattern(0, 5)
+    data = sequencer_to_dict(original)
+    assert data["version"] == PROJECT_VERSION
+    assert data["patterns"]["5"] == {"length": 16, "same_as": 0}
+
+    loaded = sequencer_from_dict(json.loads(json.dumps(data)), make_sequencer())
+    assert loaded.patterns.block_key(5) == loaded.patterns.block_key(0)
+    # 共有中のパターンへの書き込みは、もう一方のパターンを変えない
+    loaded.patterns.set_pitch(5, 0, 0, 41)
+    assert loaded.patterns.get_pitch(0, 0, 0) == 40
+
+
+def test_loads_version_1_pattern_list(make_sequencer):
+    tracks = [[None] * 16 for _ in range(4)]
+    tracks[2][5] = ["E", 3]
+    data = {
+        "version": 1,
+        "tempo": 90,
+        "track_volumes": [5, 5, 5, 5],
+        "song_sequence": [0, 0],
+        "patterns": [tracks] + [[[None] * 16 for _ in range(4)]] * 3,
+    }
+    loaded = sequencer_from_dict(data, make_sequencer())
+    assert loaded.patterns[0][2][5] == ("E", 3, 2)
+    assert loaded.patterns.used_patterns() == [0]
+    assert loaded.song_repeats == [1, 1]
+    # 音色と優先度がない古いファイルは既定値のまま
+    assert loaded.track_tones == ["t", "s", "p", "n"]
+
+
+def test_load_resets_undo_history(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.json")
+    save_project(make_project(make_sequencer), filename)
+    sequencer = make_sequencer()
+    sequencer.input_note(0)
+    assert sequencer.history.can_undo()
+    load_project(filename, sequencer)
+    assert not sequencer.history.can_undo()
+
+
+def test_midi_extension_writes_standard_midi_file(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.mid")
+    save_project(make_project(make_sequencer), filename)
+    with open(filename, "rb") as f:
+        assert f.read(4) == b"MThd"
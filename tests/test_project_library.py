@@ -0,0 +1,109 @@
+"""
+project_library.pyのテスト（ディスク上の索引と、開いたSequencerのLRUキャッシュ）
+"""
+
+import os
+
+from pattern_store import EMPTY
+from project_io import load_project, save_project
+from project_library import INDEX_FILENAME, ProjectLibrary
+
+
+def write_project(make_sequencer, directory, name, pitch=24, tempo=120):
+    sequencer = make_sequencer()
+    sequencer.tempo = tempo
+    sequencer.patterns.set_pitch(0, 0, 0, pitch)
+    sequencer.song_sequence = [0, 0]
+    save_project(sequencer, str(directory / name))
+
+
+def make_library(make_sequencer, directory, max_bytes=ProjectLibrary.DEFAULT_MAX_BYTES):
+    return ProjectLibrary(str(directory), sequencer_factory=make_sequencer, max_bytes=max_bytes)
+
+
+def test_refresh_builds_index_with_metadata(tmp_path, make_sequencer):
+    write_project(make_sequencer, tmp_path, "a.json", tempo=150)
+    write_project(make_sequencer, tmp_path, "b.ppx")
+    (tmp_path / "notes.txt").write_text("")
+    library = make_library(make_sequencer, tmp_path)
+    assert library.refresh() == []
+    assert library.names() == ["a.json", "b.ppx"]
+    entry = library.entries["a.json"]
+    assert (entry["name"], entry["tempo"], entry["pattern_count"], entry["song_length"]) == ("a", 150, 1, 2)
+    assert entry["thumbnail"][0][0] == 24
+    assert (tmp_path / INDEX_FILENAME).exists()
+    library.close()
+
+
+def test_index_is_reused_and_only_changed_files_are_read(tmp_path, make_sequencer):
+    write_project(make_sequencer, tmp_path, "a.json")
+    write_project(make_sequencer, tmp_path, "b.json")
+    make_library(make_sequencer, tmp_path).refresh()
+
+    library = make_library(make_sequencer, tmp_path)
+    assert library.names() == ["a.json", "b.json"]
+    assert library.refresh() == []
+    assert library.misses == 0
+
+    write_project(make_sequencer, tmp_path, "b.json", pitch=30)
+    os.remove(tmp_path / "a.json")
+    library.refresh()
+    assert library.misses == 1
+    assert library.names() == ["b.json"]
+    assert library.entries["b.json"]["thumbnail"][0][0] == 30
+
+
+def test_broken_project_is_reported_and_left_out(tmp_path, make_sequencer):
+    write_project(make_sequencer, tmp_path, "good.json")
+    (tmp_path / "broken.json").write_text("{")
+    library = make_library(make_sequencer, tmp_path)
+    errors = library.refresh()
+    assert [name for name, _ in errors] == ["broken.json"]
+    assert library.names() == ["good.json"]
+
+
+def test_open_hits_cache_until_evicted(tmp_path, make_sequencer):
+    for name in ("a.json", "b.json", "c.json"):
+        write_project(make_sequencer, tmp_path, name)
+    library = make_library(make_sequencer, tmp_path, max_bytes=2 * ProjectLibrary.SEQUENCER_BYTES + 1024)
+    library.refresh()
+    # 上限に収まる2つ（最後に読んだもの）だけが残る
+    assert [library.is_cached(name) for name in ("a.json", "b.json", "c.json")] == [False, True, True]
+    sequencer = library.open("b.json")
+    assert library.open("b.json") is sequencer
+    assert library.hits == 2
+    library.open("a.json")
+    # 開いているb.jsonは残り、最も古いc.jsonが追い出される
+    assert library.is_cached("b.json") and not library.is_cached("c.json")
+
+
+def test_evicting_a_modified_project_saves_it(tmp_path, make_sequencer):
+    for name in ("a.json", "b.json", "c.json"):
+        write_project(make_sequencer, tmp_path, name)
+    library = make_library(make_sequencer, tmp_path, max_bytes=ProjectLibrary.SEQUENCER_BYTES + 1024)
+    library.refresh()
+    sequencer = library.open("a.json")
+    sequencer.input_note(5)
+    # 開いているプロジェクトは次のプロジェクトを開くまで追い出さない
+    library.open("b.json")
+    assert library.is_cached("a.json")
+    library.open("c.json")
+    assert not library.is_cached("a.json")
+    assert load_project(str(tmp_path / "a.json"), make_sequencer()).patterns.get_pitch(0, 0, 5) != EMPTY
+    # 保存後の更新日時を索引に記録しているので、次の走査では読み直さない
+    misses = library.misses
+    library.refresh()
+    assert library.misses == misses
+
+
+def test_save_writes_and_updates_index(tmp_path, make_sequencer):
+    write_project(make_sequencer, tmp_path, "a.ppx")
+    library = make_library(make_sequencer, tmp_path)
+    library.refresh()
+    sequencer = library.open("a.ppx")
+    sequencer.tempo = 200
+    library.save("a.ppx")
+    assert library.entries["a.ppx"]["tempo"] == 200
+    assert make_library(make_sequencer, tmp_path).entries["a.ppx"]["tempo"] == 200
+    library.close()
+    assert load_project(str(tmp_path / "a.ppx"), make_sequencer()).tempo == 200
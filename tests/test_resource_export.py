@@ -0,0 +1,121 @@
+"""
+resource_export.pyのテスト（ソングからPyxelのサウンド・ミュージックへの変換と.pyxresの書き出し）
+"""
+
+import io
+import zipfile
+
+import pytest
+
+from pattern_store import EMPTY
+from project_io import save_project
+from resource_export import (
+    EMPTY_SOUND,
+    MUSIC_COUNT,
+    RESOURCE_FORMAT_VERSION,
+    RESOURCE_NAME,
+    SOUND_COUNT,
+    TONE_NUMBERS,
+    export_pyxres,
+    main,
+    resource_bytes,
+    resource_toml,
+    song_sounds,
+)
+
+
+def make_song(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 24)
+    sequencer.patterns.set_pitch(1, 0, 0, 25)
+    sequencer.song_sequence = [0, 1, 0]
+    sequencer.song_repeats = [2, 1, 1]
+    return sequencer
+
+
+def test_song_sounds_deduplicate_patterns_per_track(make_sequencer):
+    sequencer = make_song(make_sequencer)
+    sounds, seqs = song_sounds(sequencer)
+    # トラック0はパターンごとに2種類、他のトラックは空のサウンド1種類ずつ
+    assert len(sounds) == 2 + 3
+    assert seqs[0] == [0, 0, 4, 0]
+    assert len(set(seqs[1])) == 1
+    notes, tones, volumes, effects, speed = sounds[0]
+    subdivision, expected_speed = sequencer.compiler.step_layout(sequencer.tempo)
+    assert len(notes) == 16 * subdivision
+    assert notes[0] == 24 and set(notes[1:]) == {EMPTY}
+    assert (tones, volumes, effects, speed) == ((TONE_NUMBERS["t"],), (5,), (0,), expected_speed)
+
+
+def test_song_sounds_use_current_pattern_without_song(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.current_pattern = 3
+    sequencer.patterns.set_pitch(3, 2, 1, 40)
+    sounds, seqs = song_sounds(sequencer)
+    assert [len(seq) for seq in seqs] == [1] * 4
+    assert sounds[seqs[2][0]][0][sequencer.compiler.step_layout(120)[0]] == 40
+
+
+def test_too_many_sounds_are_joined_per_track(make_sequencer):
+    sequencer = make_sequencer()
+    for pattern_idx in range(SOUND_COUNT // 4 + 1):
+        for track_idx in range(4):
+            sequencer.patterns.set_pitch(pattern_idx, track_idx, 0, pattern_idx)
+    sequencer.song_sequence = list(range(SOUND_COUNT // 4 + 1))
+    sounds, seqs = song_sounds(sequencer)
+    assert seqs == [[0], [1], [2], [3]]
+    assert len(sounds[0][0]) == len(sequencer.song_sequence) * 16 * sequencer.compiler.step_layout(120)[0]
+
+
+def test_more_tracks_than_channels_are_rejected(make_sequencer):
+    with pytest.raises(ValueError):
+        song_sounds(make_sequencer(track_count=5))
+
+
+def test_toml_fills_every_slot_and_places_song_at_music_index(make_sequencer):
+    # pyxel.loadは全スロットを置き換えるため、ソング以外のスロットは空で書く
+    tomllib = pytest.importorskip("tomllib")
+    data = tomllib.loads(resource_toml(make_song(make_sequencer), music_idx=2))
+    assert data["format_version"] == RESOURCE_FORMAT_VERSION
+    assert data["images"] == [] and data["tilemaps"] == []
+    assert len(data["sounds"]) == SOUND_COUNT
+    assert data["sounds"][4]["notes"] and data["sounds"][5] == {
+        "notes": [],
+        "tones": [],
+        "volumes": [],
+        "effects": [],
+        "speed": EMPTY_SOUND[4],
+    }
+    assert len(data["musics"]) == MUSIC_COUNT
+    assert data["musics"][2]["seqs"][0] == [0, 0, 4, 0]
+    assert [music["seqs"] for idx, music in enumerate(data["musics"]) if idx != 2] == [[]] * (MUSIC_COUNT - 1)
+    with pytest.raises(ValueError):
+        resource_toml(make_song(make_sequencer), music_idx=MUSIC_COUNT)
+
+
+def test_resource_bytes_are_deterministic_zip(make_sequencer):
+    data = resource_bytes(make_song(make_sequencer))
+    assert data == resource_bytes(make_song(make_sequencer))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == [RESOURCE_NAME]
+
+
+def test_export_skips_unchanged_file(tmp_path, make_sequencer):
+    filename = str(tmp_path / "song.pyxres")
+    assert export_pyxres(make_song(make_sequencer), filename)
+    mtime = (tmp_path / "song.pyxres").stat().st_mtime_ns
+    assert not export_pyxres(make_song(make_sequencer), filename)
+    assert (tmp_path / "song.pyxres").stat().st_mtime_ns == mtime
+    sequencer = make_song(make_sequencer)
+    sequencer.tempo = 90
+    assert export_pyxres(sequencer, filename)
+
+
+def test_main_exports_project_file(tmp_path, capsys, make_sequencer):
+    project = str(tmp_path / "song.json")
+    save_project(make_song(make_sequencer), project)
+    output = str(tmp_path / "song.pyxres")
+    assert main([project, output, "-m", "1"]) == 0
+    assert capsys.readouterr().out.startswith("written")
+    assert main([project, output, "-m", "1"]) == 0
+    assert capsys.readouterr().out.startswith("unchanged")
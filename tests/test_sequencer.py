@@ -0,0 +1,112 @@
+"""
+sequencer.pyのテスト（トラック数・音色・優先度の変更、入力した音の試聴）
+"""
+
+import pytest
+
+from pattern_store import EMPTY
+from sequencer import Sequencer
+
+
+def test_set_track_count_resizes_track_settings_and_patterns(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.track_volumes[3] = 2
+    sequencer.patterns.set_pitch(0, 3, 0, 30)
+    sequencer.input_note(1)
+    sequencer.set_track_count(6)
+    assert sequencer.track_volumes == [5, 5, 5, 2, 5, 5]
+    assert sequencer.track_tones == ["t", "s", "p", "n", "t", "s"]
+    assert sequencer.track_priorities == [0] * 6
+    assert sequencer.patterns.track_count == 6
+    assert sequencer.patterns.get_pitch(0, 3, 0) == 30
+    # トラック数の変更は元に戻せないので履歴を消す
+    assert not sequencer.history.can_undo()
+
+    sequencer.current_track = 5
+    sequencer.set_track_count(2)
+    assert (sequencer.current_track, len(sequencer.track_tones)) == (1, 2)
+    assert sequencer.patterns.get_pitch(0, 0, 1) != EMPTY
+    with pytest.raises(ValueError):
+        sequencer.set_track_count(Sequencer.MAX_TRACK_COUNT + 1)
+
+
+def test_set_track_count_stops_playback(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_pitch(0, 0, 0, 30)
+    sequencer.toggle_play()
+    sequencer.set_track_count(5)
+    assert not sequencer.playing
+    # 5トラックはミュージックにできないので、ステップごとの再生になる
+    sequencer.toggle_play()
+    assert sequencer.playing and not sequencer._music_active
+
+
+def test_change_track_count_keeps_tracks_with_notes(make_sequencer):
+    sequencer = make_sequencer()
+    assert sequencer.change_track_count(1) == 5
+    sequencer.patterns.set_pitch(2, 4, 0, 30)
+    assert sequencer.change_track_count(-1) == 5
+    sequencer.patterns.set_pitch(2, 4, 0, EMPTY)
+    assert sequencer.change_track_count(-1) == 4
+    for _ in range(Sequencer.MAX_TRACK_COUNT):
+        sequencer.change_track_count(1)
+    assert sequencer.TRACK_COUNT == Sequencer.MAX_TRACK_COUNT
+
+
+def test_change_track_tone_and_priority(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.current_track = 3
+    sequencer.compiler.compile_pattern(0)
+    assert not sequencer.compiler.is_stale([0])
+    assert sequencer.change_track_tone(1) == "t"
+    assert sequencer.change_track_tone(-1) == "n"
+    assert sequencer.compiler.is_stale([0])
+    assert sequencer.change_track_priority(-1) == Sequencer.MIN_PRIORITY
+    for _ in range(Sequencer.MAX_PRIORITY + 2):
+        sequencer.change_track_priority(1)
+    assert sequencer.track_priorities == [0, 0, 0, Sequencer.MAX_PRIORITY]
+
+
+def fill_all_tracks(sequencer):
+    for track_idx in range(sequencer.TRACK_COUNT):
+        for step_idx in range(16):
+            sequencer.patterns.set_pitch(0, track_idx, step_idx, 24 + track_idx)
+
+
+def test_audition_during_four_track_music_uses_its_own_channel(make_sequencer):
+    sequencer = make_sequencer()
+    backend = sequencer.backend
+    fill_all_tracks(sequencer)
+    sequencer.toggle_play()
+    assert sequencer._music_active
+    music_channels = dict(backend.channels)
+    assert sorted(music_channels) == [0, 1, 2, 3]
+
+    channel = sequencer.audition(30)
+    assert channel == backend.preview_channel() == 4
+    assert backend.play_log[-1][1:3] == ("play", 4)
+    # ミュージックのチャンネルはそのまま鳴り続ける
+    assert {ch: backend.channels[ch] for ch in music_channels} == music_channels
+    assert sequencer.audition_count == 1
+
+
+def test_audition_during_step_playback_does_not_take_track_voices(make_sequencer):
+    sequencer = make_sequencer(track_count=6)
+    fill_all_tracks(sequencer)
+    sequencer.toggle_play()
+    sequencer.play_current_step()
+    stolen, dropped = sequencer.voices.stolen, sequencer.voices.dropped
+    assert sequencer.audition(30) == 4
+    sequencer.play_current_step()
+    assert (sequencer.voices.stolen, sequencer.voices.dropped) == (stolen, dropped + 2)
+    # トラックの音は試聴のチャンネルを使わない
+    assert [entry[2] for entry in sequencer.backend.play_log if entry[1] == "play"].count(4) == 1
+
+
+def test_preview_channel_is_prepared_once(monkeypatch, make_sequencer):
+    sequencer = make_sequencer()
+    calls = []
+    monkeypatch.setattr(sequencer.backend, "preview_channel", lambda: calls.append(1) or 4)
+    sequencer.audition()
+    sequencer.audition()
+    assert calls == [1]
@@ -0,0 +1,90 @@
+"""
+song_timeline.pyのテスト（ソング位置の累積ステップ、シーク、部分的な作り直し）
+"""
+
+import random
+
+from song_timeline import SongTimeline
+
+
+def naive_locate(entries, step):
+    """ソングを先頭から数えて再生位置を求める（比較用）"""
+    total = sum(length * repeat for _, length, repeat in entries)
+    step %= total
+    for position, (pattern_idx, length, repeat) in enumerate(entries):
+        if step < length * repeat:
+            return position, step // length, pattern_idx, step % length
+        step -= length * repeat
+
+
+def test_empty_timeline_locates_nothing():
+    timeline = SongTimeline()
+    assert len(timeline) == 0
+    assert timeline.locate(10) is None
+
+
+def test_starts_and_locate_follow_lengths_and_repeats():
+    timeline = SongTimeline()
+    timeline.build([(3, 16, 1), (5, 32, 2), (3, 16, 1)])
+    assert list(timeline.starts) == [0, 16, 80]
+    assert timeline.total_steps == 96
+    assert timeline.bucket_steps == 16
+    assert timeline.locate(0) == (0, 0, 3, 0)
+    assert timeline.locate(50) == (1, 1, 5, 2)
+    assert timeline.locate(95) == (2, 0, 3, 15)
+    # ソングの長さを超えた分は先頭に戻る
+    assert timeline.locate(96 + 17) == (1, 0, 5, 1)
+    assert timeline.position_step(1, 1) == 48
+
+
+def test_locate_matches_linear_search_for_random_songs():
+    rng = random.Random(5)
+    for _ in range(20):
+        entries = [(rng.randrange(256), rng.choice((16, 32, 64, 12)), rng.randint(1, 4)) for _ in range(rng.randint(1, 30))]
+        timeline = SongTimeline()
+        timeline.build(entries)
+        for step in range(0, timeline.total_steps * 2, 3):
+            assert timeline.locate(step) == naive_locate(entries, step)
+
+
+def test_splice_rebuilds_from_changed_position():
+    entries = [(0, 16, 1), (1, 32, 1), (2, 16, 3)]
+    timeline = SongTimeline()
+    timeline.build(entries)
+    timeline.splice(1, 1, [(7, 64, 2), (8, 16, 1)])
+    expected = [(0, 16, 1), (7, 64, 2), (8, 16, 1), (2, 16, 3)]
+    rebuilt = SongTimeline()
+    rebuilt.build(expected)
+    assert list(timeline.starts) == list(rebuilt.starts)
+    assert timeline.total_steps == rebuilt.total_steps
+    for step in range(timeline.total_steps):
+        assert timeline.locate(step) == naive_locate(expected, step)
+
+    timeline.truncate(1)
+    assert (len(timeline), timeline.total_steps) == (1, 16)
+    assert timeline.sound_patterns() == [0]
+
+
+def test_sounds_expand_repeats():
+    timeline = SongTimeline()
+    timeline.build([(4, 16, 2), (6, 32, 1)])
+    assert timeline.sound_patterns() == [4, 4, 6]
+    assert [timeline.sound_step(i) for i in range(3)] == [0, 16, 32]
+    assert timeline.locate_time(8.25, 0.5) == (0, 1, 4, 0)
+    assert timeline.locate_time(16.25, 0.5) == (1, 0, 6, 0)
+
+
+def test_sequencer_keeps_timeline_in_sync_with_song_edits(make_sequencer):
+    sequencer = make_sequencer()
+    sequencer.patterns.set_length(1, 32)
+    for pattern_idx in (0, 1, 0):
+        sequencer.add_pattern_to_song(pattern_idx)
+    assert sequencer.song_timeline().total_steps == 64
+    sequencer.change_song_repeat(1, 1)
+    assert sequencer.song_timeline().total_steps == 96
+    sequencer.remove_pattern_from_song(0)
+    timeline = sequencer.song_timeline()
+    assert (list(timeline.patterns), list(timeline.starts)) == ([1, 0], [0, 64])
+    # パターンの長さを変えるとタイムラインは作り直される
+    sequencer.patterns.set_length(0, 64)
+    assert sequencer.song_timeline().total_steps == 128
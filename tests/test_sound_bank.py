@@ -0,0 +1,66 @@
+"""
+sound_bank.pyのテスト（スロットの再利用とLRUでの再割り当て）
+"""
+
+from backend import HeadlessBackend
+from sound_bank import SoundBank
+
+
+def make_bank(first_slot=0, slot_count=4):
+    backend = HeadlessBackend()
+    return SoundBank(first_slot, slot_count, backend), backend
+
+
+def test_same_note_reuses_slot_without_setting_sound_again():
+    bank, backend = make_bank()
+    slot = bank.get_note_slot(0, 4, "t", 5)
+    assert backend.sounds[slot] == ("c4", "t", "5", "n", 15)
+    backend.sounds.clear()
+    assert bank.get_note_slot(0, 4, "t", 5) == slot
+    assert backend.sounds == {}
+    assert (bank.hits, bank.misses) == (1, 1)
+    assert bank.hit_rate == 0.5
+
+
+def test_different_tone_or_volume_gets_another_slot():
+    bank, _ = make_bank()
+    slots = {bank.get_note_slot(9, 3, tone, volume) for tone, volume in (("t", 5), ("s", 5), ("t", 7))}
+    assert len(slots) == 3
+
+
+def test_slots_are_allocated_from_first_slot_in_order():
+    bank, _ = make_bank(first_slot=10, slot_count=3)
+    assert [bank.get_note_slot(pitch, 4, "t", 5) for pitch in range(3)] == [10, 11, 12]
+
+
+def test_full_bank_evicts_least_recently_used():
+    bank, backend = make_bank(slot_count=2)
+    first = bank.get_note_slot(0, 4, "t", 5)
+    second = bank.get_note_slot(1, 4, "t", 5)
+    # 最初の音を使い直すと、2番目の音が最も古くなる
+    bank.get_note_slot(0, 4, "t", 5)
+    third = bank.get_note_slot(2, 4, "t", 5)
+    assert third == second
+    assert backend.sounds[third][0] == "d4"
+    assert bank.evictions == 1
+    # 追い出された音は再度設定される
+    assert bank.get_note_slot(1, 4, "t", 5) == first
+    assert bank.misses == 4
+
+
+def test_get_slot_caches_multi_note_sounds():
+    bank, backend = make_bank()
+    slot = bank.get_slot("c4r d4", "t", "5", "n", 30)
+    assert bank.get_slot("c4r d4", "t", "5", "n", 30) == slot
+    assert backend.sounds[slot] == ("c4r d4", "t", "5", "n", 30)
+    assert bank.get_slot("c4r d4", "t", "5", "n", 15) != slot
+
+
+def test_clear_frees_all_slots():
+    bank, _ = make_bank(slot_count=2)
+    bank.get_note_slot(0, 4, "t", 5)
+    bank.get_note_slot(1, 4, "t", 5)
+    bank.clear()
+    assert bank.slots == {}
+    assert bank.get_note_slot(5, 4, "t", 5) == 0
+    assert bank.evictions == 0
@@ -0,0 +1,108 @@
+"""
+step_clock.pyのテスト（StepSchedulerのステップ進行とジッター・ドリフトの計測）
+"""
+
+import pytest
+
+from backend import HeadlessBackend
+from step_clock import FakeClock, FrameClock, StepScheduler
+
+FPS = 30
+
+
+def run_frames(scheduler, clock, frames, tempo, frame_time=1 / FPS):
+    """frames回だけ時計を進めてadvanceを呼び、発火したステップ数の合計を返す"""
+    total = 0
+    for _ in range(frames):
+        clock.advance(frame_time)
+        total += scheduler.advance(tempo)
+    return total
+
+
+def test_fires_steps_at_tempo_without_losing_overshoot():
+    # 120 BPMは0.5秒に1ステップ。30fpsで60秒（浮動小数点の誤差を避けるため1フレーム余分に）進めると、
+    # 端数を繰り越して120ステップちょうどになる
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    assert run_frames(scheduler, clock, 60 * FPS + 1, 120) == 120
+    assert scheduler.steps_fired == 120
+    assert scheduler.caught_up_steps == 0
+
+
+def test_odd_tempo_keeps_long_term_rate():
+    # 1ステップが整数フレームにならないテンポでも、長時間の平均はテンポどおり
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    steps = run_frames(scheduler, clock, 600 * FPS, 97)
+    assert abs(steps - 600 * 97 / 60) < 1
+    assert abs(scheduler.drift) < 60 / 97
+
+
+def test_no_steps_without_elapsed_time():
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    assert scheduler.advance(120) == 0
+    clock.advance(-1)
+    assert scheduler.advance(120) == 0
+
+
+def test_late_frame_catches_up_and_is_reported_as_jitter():
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    run_frames(scheduler, clock, 2 * FPS, 120)
+    steady_jitter = scheduler.max_jitter
+    assert steady_jitter < 1 / FPS + 1e-9
+
+    # 1秒止まったフレーム：2ステップ分をまとめて進め、最初のステップは約1秒遅れて発火する
+    clock.advance(1.0)
+    assert scheduler.advance(120) == 2
+    assert scheduler.caught_up_steps == 1
+    assert scheduler.last_jitter == pytest.approx(0.5, abs=1 / FPS)
+    assert scheduler.max_jitter > steady_jitter
+    # 追いついたのでテンポは保たれ、同じ時計で測ったドリフトは1ステップ未満
+    assert scheduler.steps_fired == 6
+    assert 0 <= scheduler.drift < 0.5
+
+
+def test_mean_jitter_counts_every_fired_step():
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    # 1.25秒で2ステップ発火（理想時刻は0.5秒と1.0秒、遅れは0.75秒と0.25秒）
+    clock.advance(1.25)
+    assert scheduler.advance(120) == 2
+    assert scheduler.jitter_samples == 2
+    assert scheduler.mean_jitter == pytest.approx(0.5)
+    assert scheduler.max_jitter == pytest.approx(0.75)
+
+
+def test_frame_clock_drift_against_reference_clock():
+    # フレーム数で測る時計はフレーム落ちの分だけ実時間より遅れ、基準の時計と比べるとドリフトとして現れる
+    backend = HeadlessBackend(fps=FPS)
+    reference = FakeClock()
+    scheduler = StepScheduler(FrameClock(FPS, backend), reference_clock=reference)
+    scheduler.start()
+    for frame in range(10 * FPS):
+        backend.advance()
+        # 10フレームに1回、描画が遅れて1フレーム分の時間が余分に経過する
+        reference.advance(2 / FPS if frame % 10 == 0 else 1 / FPS)
+        scheduler.advance(120)
+    assert scheduler.steps_fired == 20
+    assert scheduler.drift == pytest.approx(1.0, abs=0.5)
+
+
+def test_start_resets_phase_and_stats():
+    clock = FakeClock()
+    scheduler = StepScheduler(clock)
+    scheduler.start()
+    clock.advance(1.3)
+    scheduler.advance(120)
+    scheduler.start()
+    assert scheduler.phase == 0
+    assert scheduler.steps_fired == 0
+    assert scheduler.max_jitter == 0
+    assert scheduler.drift == 0
@@ -0,0 +1,53 @@
+"""
+voice_allocator.pyのテスト（チャンネルの割り当て、優先度による音の奪い合い、統計）
+"""
+
+from voice_allocator import VoiceAllocator
+
+
+def test_each_track_keeps_its_own_channel():
+    voices = VoiceAllocator(4, first_channel=2)
+    assert voices.allocate([0, 1, 2, 3], [0] * 4, 0) == [(2, 0), (3, 1), (4, 2), (5, 3)]
+    assert voices.allocate([3], [0] * 4, 1) == [(5, 3)]
+    assert (voices.allocated, voices.stolen, voices.dropped) == (5, 0, 0)
+
+
+def test_extra_track_uses_a_released_channel():
+    voices = VoiceAllocator(2)
+    voices.allocate([0], [0] * 3, 0)
+    # トラック2は前回のチャンネルがないので空いているチャンネルを使う
+    assert voices.allocate([2], [0] * 3, 1) == [(0, 2)]
+    # 鳴り終わったチャンネルは元のトラックがまた使う
+    assert voices.allocate([0, 1], [0] * 3, 2) == [(0, 0), (1, 1)]
+
+
+def test_notes_of_the_same_step_never_steal_from_each_other():
+    voices = VoiceAllocator(4)
+    assert len(voices.allocate(range(6), [0] * 6, 0)) == 4
+    assert (voices.stolen, voices.dropped) == (0, 2)
+
+
+def test_higher_priority_steals_lowest_priority_oldest_note():
+    voices = VoiceAllocator(2)
+    priorities = [1, 0, 2, 0]
+    voices.allocate([0], priorities, 0, hold=4)
+    voices.allocate([1], priorities, 1, hold=4)
+    # 優先度の低いトラック1の音を奪う
+    assert voices.allocate([2], priorities, 2) == [(1, 2)]
+    assert voices.stolen == 1
+    assert 1 not in voices.track_channels
+    # 同じ優先度の音は奪えない
+    assert voices.allocate([3], priorities, 2) == []
+    assert voices.dropped == 1
+
+
+def test_reset_frees_channels_and_keeps_stats():
+    voices = VoiceAllocator(1)
+    voices.allocate([0], [0, 1], 0, hold=8)
+    voices.allocate([1], [0, 1], 1)
+    voices.reset()
+    assert voices.owners == [-1]
+    assert voices.stolen == 1
+    assert voices.allocate([0], [0, 1], 2) == [(0, 0)]
+    voices.reset_stats()
+    assert (voices.allocated, voices.stolen, voices.dropped) == (0, 0, 0)